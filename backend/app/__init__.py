@@ -1,6 +1,9 @@
+import logging
+import os
 from flask import Flask
 from flask_cors import CORS
-from datetime import datetime
+
+logger = logging.getLogger(__name__)
 
 def create_app(config_name='default'):
     """Application factory pattern"""
@@ -10,33 +13,41 @@ def create_app(config_name='default'):
     from app.config.config import config
     app.config.from_object(config[config_name])
     
+    # Structured logging goes first so startup messages use it too
+    from app.utils.log import configure_logging
+    configure_logging(app)
+    
+    # orjson for request and response bodies when it is installed
+    from app.utils.json_provider import init_json
+    init_json(app)
+    
+    # Request/DB/SMTP/Razorpay timings and the /metrics endpoint
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+    
     # Initialize CORS
     CORS(app)
     
-    # Test database connection (within app context)
-    with app.app_context():
-        try:
-            from app.database import test_connection
-            if test_connection():
-                print('✓ Database connection successful')
-            else:
-                print('⚠️  WARNING: Database connection failed!')
-        except Exception as e:
-            print(f'⚠️  WARNING: Database not configured: {e}')
+    # Pooled, request-scoped database connections. They are opened on first
+    # use, so nothing at startup waits on SQL Server; /readyz reports it
+    from app.database import init_app as init_db_app
+    init_db_app(app)
     
     # Validate required configuration
     if not app.config['RAZORPAY_KEY_ID'] or not app.config['RAZORPAY_KEY_SECRET']:
-        print('ERROR: Missing required Razorpay credentials in .env file')
+        logger.error('Missing required Razorpay credentials in .env file')
         exit(1)
     
     if not app.config['SMTP_USERNAME'] or not app.config['SMTP_PASSWORD']:
-        print('⚠️  WARNING: SMTP credentials not configured! OTP emails will not work.')
-        print('⚠️  Add SMTP_USERNAME and SMTP_PASSWORD in environment variables.')
+        logger.warning('SMTP credentials not configured, OTP emails will not work. '
+                       'Set SMTP_USERNAME and SMTP_PASSWORD in environment variables.')
     else:
-        print('✓ Email transporter initialized successfully')
-        print(f"SMTP User: {app.config['SMTP_USERNAME']}")
-        print(f"Verified Sender: {app.config['VERIFIED_SENDER']}")
-        print('✓ Amazon SES configured (verification will happen on first email)')
+        logger.info('Amazon SES configured for sender %s (verified on first email)', app.config['VERIFIED_SENDER'])
+    
+    if app.config['RATE_LIMIT_ENABLED'] and app.config['RATE_LIMIT_STORE'] == 'memory':
+        logger.warning('RATE_LIMIT_STORE=memory: every gunicorn worker keeps its own buckets, '
+                       'so clients get WEB_CONCURRENCY times the configured limits. '
+                       'Set REDIS_URL to share them.')
     
     # Register blueprints
     from app.routes.otp import otp_bp
@@ -45,6 +56,7 @@ def create_app(config_name='default'):
     from app.routes.admin import admin_bp
     from app.routes.auth import auth_bp
     from app.routes.public import public_bp
+    from app.routes.health import health_bp
     
     app.register_blueprint(otp_bp)
     app.register_blueprint(validation_bp)
@@ -52,9 +64,13 @@ def create_app(config_name='default'):
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(public_bp)
+    app.register_blueprint(health_bp)
     
-    # Root health check route
+    from app.utils.log import quiet
+    
+    # Root health check route (kept out of the access log)
     @app.route('/')
+    @quiet
     def index():
         from flask import jsonify
         return jsonify({
@@ -63,19 +79,18 @@ def create_app(config_name='default'):
             'version': '1.0'
         })
     
-    # Request logger middleware
+    # gunicorn starts each worker's threads in post_worker_init; this only
+    # covers servers without that hook (flask run, run.py), once per process
     @app.before_request
-    def log_request():
-        from flask import request
-        print(f"[{datetime.now().isoformat()}] {request.method} {request.path}")
+    def start_background_workers():
+        if app.extensions.get('worker_pid') != os.getpid():
+            init_worker(app)
     
     # Global error handler
     @app.errorhandler(Exception)
     def handle_error(error):
         from flask import request, jsonify
-        print('=== GLOBAL ERROR HANDLER ===')
-        print('Path:', request.path)
-        print('Error:', str(error))
+        logger.exception('Unhandled error on %s', request.path)
         return jsonify({
             'success': False,
             'message': 'Internal server error',
@@ -83,3 +98,29 @@ def create_app(config_name='default'):
         }), 500
     
     return app
+
+
+def init_worker(app):
+    """
+    Start this process's threads: the log writer and the outbox email,
+    webhook, reconciliation, maintenance and metrics workers.
+
+    Safe to call repeatedly; each piece starts once per pid. Connection
+    pools need no reset here, they are created on first use in each process.
+    """
+    from app.utils.log import ensure_log_listener
+    from app.utils.outbox import ensure_outbox_workers
+    from app.utils.webhooks import ensure_webhook_workers
+    from app.utils.reconciliation import ensure_reconcile_worker
+    from app.utils.maintenance import ensure_maintenance_workers
+    from app.utils.metrics import ensure_metrics_writer
+    from app.utils.cooperative import size_threadpool
+    ensure_log_listener(app)
+    ensure_outbox_workers(app)
+    ensure_webhook_workers(app)
+    ensure_reconcile_worker(app)
+    ensure_maintenance_workers(app)
+    ensure_metrics_writer(app)
+    # Under gevent, every pooled DB connection may be busy in the hub's threadpool at once
+    size_threadpool(app.config['DB_POOL_SIZE'])
+    app.extensions['worker_pid'] = os.getpid()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,17 +14,134 @@ class Config:
     RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
     RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
     RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET')
+    RAZORPAY_API_BASE = os.getenv('RAZORPAY_API_BASE', 'https://api.razorpay.com/v1')
+    
+    # Seconds an unpaid order is reused for repeat /create-order calls
+    ORDER_CACHE_TTL = int(os.getenv('ORDER_CACHE_TTL', 900))
+    
+    # Razorpay HTTP client (per gunicorn worker)
+    RAZORPAY_CONNECT_TIMEOUT = float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', 3.05))
+    RAZORPAY_READ_TIMEOUT = float(os.getenv('RAZORPAY_READ_TIMEOUT', 10))
+    RAZORPAY_POOL_SIZE = int(os.getenv('RAZORPAY_POOL_SIZE', 10))
+    RAZORPAY_MAX_RETRIES = int(os.getenv('RAZORPAY_MAX_RETRIES', 2))  # idempotent calls only
+    RAZORPAY_RETRY_BACKOFF = float(os.getenv('RAZORPAY_RETRY_BACKOFF', 0.25))  # seconds
+    RAZORPAY_BREAKER_THRESHOLD = int(os.getenv('RAZORPAY_BREAKER_THRESHOLD', 5))  # consecutive failures
+    RAZORPAY_BREAKER_RESET = int(os.getenv('RAZORPAY_BREAKER_RESET', 30))  # seconds before a trial call
     
     # Email Configuration (Amazon SES)
-    SMTP_HOST = 'email-smtp.us-east-1.amazonaws.com'
-    SMTP_PORT = 587
+    SMTP_HOST = os.getenv('SMTP_HOST', 'email-smtp.us-east-1.amazonaws.com')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+    SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'True') == 'True'  # False only for local sinks/relays
     SMTP_USERNAME = os.getenv('SMTP_USERNAME') or os.getenv('EMAIL_USER')
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD') or os.getenv('EMAIL_PASS')
     VERIFIED_SENDER = os.getenv('VERIFIED_SENDER', 'info@theneedles.in')
     
+    # SMTP session pool (per gunicorn worker)
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 3))
+    SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', 30))
+    SMTP_SESSION_MAX_AGE = int(os.getenv('SMTP_SESSION_MAX_AGE', 300))  # seconds
+    SMTP_SESSION_MAX_MESSAGES = int(os.getenv('SMTP_SESSION_MAX_MESSAGES', 100))
+    SMTP_NOOP_INTERVAL = int(os.getenv('SMTP_NOOP_INTERVAL', 15))  # keep idle sessions warm
+    
+    # Email outbox workers (per gunicorn worker)
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 1))
+    OUTBOX_PRIORITY_WORKERS = int(os.getenv('OUTBOX_PRIORITY_WORKERS', 1))  # OTP-only lane
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 10))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 120))  # per message; keep above 2 x SMTP_TIMEOUT
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+    OUTBOX_RETRY_BASE = int(os.getenv('OUTBOX_RETRY_BASE', 10))  # seconds
+    OUTBOX_RETRY_MAX = int(os.getenv('OUTBOX_RETRY_MAX', 1800))  # seconds
+    
+    # Razorpay webhook processing (per gunicorn worker)
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))
+    WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', 5))
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 50))
+    WEBHOOK_LEASE_SECONDS = int(os.getenv('WEBHOOK_LEASE_SECONDS', 60))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 5))
+    
+    # Payment reconciliation against Razorpay (0 disables the scheduled run)
+    RECONCILE_INTERVAL = int(os.getenv('RECONCILE_INTERVAL', 3600))  # seconds
+    RECONCILE_WINDOW_HOURS = int(os.getenv('RECONCILE_WINDOW_HOURS', 48))
+    RECONCILE_PAGE_SIZE = int(os.getenv('RECONCILE_PAGE_SIZE', 100))  # Razorpay's maximum
+    RECONCILE_MAX_LOOKUPS = int(os.getenv('RECONCILE_MAX_LOOKUPS', 50))  # single-order fetches per run
+    RECONCILE_LEASE_SECONDS = int(os.getenv('RECONCILE_LEASE_SECONDS', 7200))  # longest a run may take
+    
+    # Zoom link broadcasts
+    BROADCAST_SEND_RATE = float(os.getenv('BROADCAST_SEND_RATE', 5))  # emails per second
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 3))
+    BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 50))
+    BROADCAST_LEASE_SECONDS = int(os.getenv('BROADCAST_LEASE_SECONDS', 300))
+    
+    # Registration export: rows fetched per round-trip while streaming. The
+    # export keeps one pooled connection for the whole download (see DB_POOL_SIZE)
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    
     # OTP Configuration
     OTP_EXPIRY_MINUTES = 10
     OTP_MAX_ATTEMPTS = 3
+    OTP_STORE = os.getenv('OTP_STORE', 'sql')  # sql, memory (single worker only) or redis
+    OTP_REDIS_PREFIX = os.getenv('OTP_REDIS_PREFIX', 'otp:')
+    
+    # OTP endpoint throttling: token buckets written as 'burst/seconds'
+    # (3/600 = up to 3 at once, refilled at 3 per 10 minutes)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+    # memory keeps separate buckets in every worker, so redis is the default
+    # whenever REDIS_URL is set
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'redis' if os.getenv('REDIS_URL') else 'memory')
+    RATE_LIMIT_REDIS_PREFIX = os.getenv('RATE_LIMIT_REDIS_PREFIX', 'rl:')
+    # Reverse proxies in front of the app (1 on Render); 0 ignores X-Forwarded-For
+    RATE_LIMIT_PROXY_COUNT = int(os.getenv('RATE_LIMIT_PROXY_COUNT', 0))
+    RATE_LIMIT_SEND_OTP_EMAIL = os.getenv('RATE_LIMIT_SEND_OTP_EMAIL', '3/600')
+    RATE_LIMIT_SEND_OTP_IP = os.getenv('RATE_LIMIT_SEND_OTP_IP', '20/600')
+    RATE_LIMIT_VERIFY_OTP_EMAIL = os.getenv('RATE_LIMIT_VERIFY_OTP_EMAIL', '10/600')
+    RATE_LIMIT_VERIFY_OTP_IP = os.getenv('RATE_LIMIT_VERIFY_OTP_IP', '60/600')
+    OTP_MAX_INFLIGHT = int(os.getenv('OTP_MAX_INFLIGHT', 8))  # concurrent OTP requests per worker before shedding
+    
+    # Expired OTP purge (0 disables it)
+    OTP_PURGE_INTERVAL = int(os.getenv('OTP_PURGE_INTERVAL', 300))  # seconds
+    OTP_PURGE_BATCH_SIZE = int(os.getenv('OTP_PURGE_BATCH_SIZE', 500))  # rows per DELETE TOP (n)
+    OTP_PURGE_PAUSE = float(os.getenv('OTP_PURGE_PAUSE', 0.1))  # seconds between batches
+    OTP_PURGE_MAX_BATCHES = int(os.getenv('OTP_PURGE_MAX_BATCHES', 200))  # per run
+    
+    # Redis (shared state across gunicorn workers)
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Logging: JSON lines on stdout, written by a background thread.
+    # LOG_LEVELS / LOG_SAMPLING take per-blueprint overrides, e.g.
+    # 'payment=DEBUG,admin=WARNING' and 'public=0.1' (keep 10% of requests)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+    LOG_QUIET_PATHS = os.getenv('LOG_QUIET_PATHS', '')  # comma-separated paths left out of the access log
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records beyond this are dropped, never waited on
+    
+    # JSON responses: 'orjson' (used when installed) or 'default' for Flask's own
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+    
+    # Prometheus metrics at /metrics. The gunicorn workers share their series
+    # through METRICS_DIR so a scrape covers all of them ('' turns that off)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'needles-metrics'))
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # seconds between snapshot writes
+    METRICS_GAUGE_TTL = float(os.getenv('METRICS_GAUGE_TTL', 10))  # seconds queue depths are reused between scrapes
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # scrapes need 'Authorization: Bearer <token>' or an admin token
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'False') == 'True'  # Server-Timing on every response, not just admin ones
+    
+    # /readyz: probe results are cached per worker; only the REQUIRED probes
+    # (comma-separated: database, smtp, razorpay) decide readiness
+    READYZ_CACHE_SECONDS = float(os.getenv('READYZ_CACHE_SECONDS', 10))
+    READYZ_TIMEOUT = float(os.getenv('READYZ_TIMEOUT', 2))  # SMTP connect timeout
+    READYZ_REQUIRED = os.getenv('READYZ_REQUIRED', 'database')
+    
+    # Settings cache (seconds): served fresh for TTL, then served stale while
+    # revalidating in the background for up to STALE_TTL more
+    SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', 15))
+    SETTINGS_CACHE_STALE_TTL = int(os.getenv('SETTINGS_CACHE_STALE_TTL', 300))
+    
+    # HTTP caching for public GET endpoints (seconds)
+    PUBLIC_CACHE_MAX_AGE = int(os.getenv('PUBLIC_CACHE_MAX_AGE', 60))
+    PUBLIC_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv('PUBLIC_CACHE_STALE_WHILE_REVALIDATE', 300))
     
     # SQL Server Database Configuration
     DB_DRIVER = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
@@ -31,6 +149,18 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'webinar_db')
     DB_USER = os.getenv('DB_USER', 'sa')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    
+    # Connection pool (per gunicorn worker process). Each of a worker's
+    # GUNICORN_THREADS threads (or gevent greenlets) holds a connection from
+    # its first query until the request ends; requests beyond DB_POOL_SIZE
+    # wait up to DB_POOL_TIMEOUT and then fail. /create-order gives its
+    # connection back before calling Razorpay. A registration export holds
+    # one connection until its download finishes, so each concurrent export
+    # leaves the worker's requests one connection fewer
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # max connection age in seconds
+    DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', 30))  # ping connections idle longer than this
 
 class DevelopmentConfig(Config):
     """Development configuration"""
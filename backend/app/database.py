@@ -1,15 +1,215 @@
 """
 Database connection and operations for SQL Server
 """
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pyodbc
 from flask import current_app, g
-from contextlib import contextmanager
+from app.utils.cooperative import run_blocking
+from app.utils.metrics import add_timing, inc, observe
 
-def get_db_connection():
-    """Create and return a database connection"""
-    config = current_app.config
-    
-    connection_string = (
+logger = logging.getLogger(__name__)
+
+# SQLSTATE classes that mean the connection itself is gone, not just the statement
+DISCONNECT_SQLSTATES = {'08S01', '08001', '08003', '08004', '08007', '01002', 'HYT00', 'HYT01'}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PooledConnection:
+    """A pyodbc connection plus the bookkeeping the pool needs"""
+
+    __slots__ = ('connection', 'pool', 'created_at', 'last_used', 'broken')
+
+    def __init__(self, connection, pool):
+        self.connection = connection
+        self.pool = pool
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.broken = False
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of SQL Server connections for one worker process.
+
+    Connections are health-checked on checkout when they have been idle for
+    longer than ``ping_interval`` seconds and are recycled once they are older
+    than ``recycle`` seconds.
+    """
+
+    def __init__(self, connection_string, size=5, timeout=10, recycle=1800, ping_interval=30):
+        self.connection_string = connection_string
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._total = 0
+        self._available = threading.Condition(threading.Lock())
+        self._counters = {
+            'connects': 0,
+            'connect_errors': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'pings': 0,
+            'recycled': 0,
+            'invalidated': 0,
+        }
+
+    def acquire(self):
+        """Check a connection out of the pool, opening a new one if there is room"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._available:
+            while True:
+                if self._idle:
+                    # LIFO keeps the warmest connections in use and lets the rest age out
+                    entry = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available after {self.timeout}s '
+                        f'(pool size {self.size})'
+                    )
+                waited = True
+                self._available.wait(remaining)
+
+            self._counters['checkouts'] += 1
+            if waited:
+                self._counters['waits'] += 1
+                self._counters['wait_seconds'] += time.monotonic() - started
+
+        # Network work happens outside the lock; the slot is already reserved
+        if entry is not None and not self._check(entry):
+            self._close(entry)
+            entry = None
+
+        if entry is None:
+            try:
+                entry = PooledConnection(run_blocking(pyodbc.connect, self.connection_string), self)
+            except Exception:
+                with self._available:
+                    self._total -= 1
+                    self._counters['connect_errors'] += 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self._counters['connects'] += 1
+
+        return entry
+
+    def release(self, entry):
+        """Return a connection to the pool, discarding it if it is no longer usable"""
+        if os.getpid() != self.pid:
+            # Checked out before a fork; the child must not touch the parent's socket
+            return
+
+        if not entry.broken:
+            try:
+                # Never hand out a connection with an open transaction
+                run_blocking(entry.connection.rollback)
+            except pyodbc.Error:
+                entry.broken = True
+
+        now = time.monotonic()
+        if entry.broken or now - entry.created_at > self.recycle:
+            with self._available:
+                self._counters['invalidated' if entry.broken else 'recycled'] += 1
+            self._close(entry)
+            return
+
+        entry.last_used = now
+        with self._available:
+            self._idle.append(entry)
+            self._available.notify()
+
+    def _check(self, entry):
+        """Decide whether an idle connection can be handed out again"""
+        now = time.monotonic()
+        if now - entry.created_at > self.recycle:
+            with self._available:
+                self._counters['recycled'] += 1
+            return False
+        if now - entry.last_used < self.ping_interval:
+            return True
+
+        with self._available:
+            self._counters['pings'] += 1
+        try:
+            run_blocking(_ping, entry.connection)
+            return True
+        except pyodbc.Error:
+            with self._available:
+                self._counters['invalidated'] += 1
+            return False
+
+    def _close(self, entry):
+        """Close a connection and free its slot"""
+        try:
+            entry.connection.close()
+        except pyodbc.Error:
+            pass
+        with self._available:
+            self._total -= 1
+            self._available.notify()
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones are closed on release)"""
+        with self._available:
+            idle = list(self._idle)
+            self._idle.clear()
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._available:
+            idle = len(self._idle)
+            return {
+                'size': self.size,
+                'open': self._total,
+                'idle': idle,
+                'in_use': self._total - idle,
+                **self._counters,
+            }
+
+
+def _ping(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+_pool_lock = threading.Lock()
+
+
+def build_connection_string(config):
+    """Build the ODBC connection string from app config"""
+    return (
         f"DRIVER={{{config['DB_DRIVER']}}};"
         f"SERVER={config['DB_SERVER']};"
         f"DATABASE={config['DB_NAME']};"
@@ -17,29 +217,160 @@ def get_db_connection():
         f"PWD={config['DB_PASSWORD']};"
         f"TrustServerCertificate=yes;"
     )
-    
-    try:
-        conn = pyodbc.connect(connection_string)
-        return conn
-    except pyodbc.Error as e:
-        print(f"Database connection error: {e}")
-        raise
+
+
+def get_pool():
+    """Return this process's connection pool, creating it on first use"""
+    app = current_app._get_current_object()
+    pool = app.extensions.get('db_pool')
+
+    # A pool inherited through fork() shares sockets with the parent; never reuse it
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None or pool.pid != os.getpid():
+                config = app.config
+                pool = ConnectionPool(
+                    build_connection_string(config),
+                    size=config['DB_POOL_SIZE'],
+                    timeout=config['DB_POOL_TIMEOUT'],
+                    recycle=config['DB_POOL_RECYCLE'],
+                    ping_interval=config['DB_POOL_PING_INTERVAL'],
+                )
+                app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_pool_stats():
+    """Pool usage counters for the current worker process"""
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """
+    Return the connection bound to the current app context.
+
+    The first call in a request checks a connection out of the pool; it is
+    returned by ``close_db_connection`` when the app context tears down.
+    """
+    entry = g.get('_db_conn')
+    if entry is None:
+        try:
+            entry = get_pool().acquire()
+        except pyodbc.Error as e:
+            logger.error("Database connection error: %s", e)
+            raise
+        g._db_conn = entry
+    return entry.connection
+
+
+def close_db_connection(exc=None):
+    """
+    Give the request's connection back to the pool.
+
+    Also called by views before a slow outbound call, so the connection is
+    not held idle meanwhile; a later get_db_cursor checks out another one.
+    """
+    entry = g.pop('_db_conn', None)
+    if entry is not None:
+        entry.pool.release(entry)
+
+
+def _is_disconnect(error):
+    return isinstance(error, pyodbc.Error) and bool(error.args) and error.args[0] in DISCONNECT_SQLSTATES
+
+
+class CountingCursor:
+    """
+    Thin wrapper around a pyodbc cursor that counts the statements sent, so
+    get_db_cursor can report round-trips, and runs every cursor method
+    (and iteration, which fetches) through run_blocking. Plain attributes
+    such as rowcount are passed through.
+    """
+
+    __slots__ = ('_cursor', 'statements')
+
+    def __init__(self, cursor):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, 'statements', 0)
+
+    def execute(self, *args):
+        object.__setattr__(self, 'statements', self.statements + 1)
+        run_blocking(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        object.__setattr__(self, 'statements', self.statements + 1)
+        run_blocking(self._cursor.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return run_blocking(self._cursor.fetchone)
+
+    def fetchall(self):
+        return run_blocking(self._cursor.fetchall)
+
+    def fetchmany(self, *args):
+        return run_blocking(self._cursor.fetchmany, *args)
+
+    def __getattr__(self, name):
+        value = getattr(self._cursor, name)
+        if not callable(value):
+            return value
+
+        # nextset, tables, close...: any of them may wait on SQL Server
+        def call(*args, **kwargs):
+            return run_blocking(functools.partial(value, *args, **kwargs))
+        return call
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+def _record_transaction(started, cursor, outcome):
+    elapsed = time.perf_counter() - started
+    observe('db_transaction_duration_seconds', elapsed)
+    inc('db_transactions_total', outcome=outcome)
+    inc('db_statements_total', cursor.statements)
+    add_timing('db', elapsed)
+
 
 @contextmanager
 def get_db_cursor():
-    """Context manager for database operations"""
+    """Context manager for database operations; each block is its own transaction"""
+    started = time.perf_counter()
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = CountingCursor(conn.cursor())
     try:
         yield cursor
-        conn.commit()
+        run_blocking(conn.commit)
+        _record_transaction(started, cursor, 'commit')
     except Exception as e:
-        conn.rollback()
-        print(f"Database operation error: {e}")
+        _record_transaction(started, cursor, 'error')
+        if _is_disconnect(e):
+            g._db_conn.broken = True
+        else:
+            try:
+                run_blocking(conn.rollback)
+            except pyodbc.Error:
+                g._db_conn.broken = True
+        logger.error("Database operation error: %s", e)
         raise
     finally:
-        cursor.close()
-        conn.close()
+        try:
+            cursor.close()
+        except pyodbc.Error:
+            pass
+
+
+def init_app(app):
+    """Register the request-scoped connection teardown"""
+    app.teardown_appcontext(close_db_connection)
+
 
 def init_db():
     """Initialize database tables"""
@@ -68,6 +399,17 @@ def init_db():
             )
         """)
         
+        # Indexes for keyset pagination and status filters on registrations
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='idx_registrations_created')
+            CREATE INDEX idx_registrations_created ON registrations (created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='idx_registrations_status')
+            CREATE INDEX idx_registrations_status ON registrations (payment_status, id)
+                INCLUDE (email, full_name, city, created_at)
+        """)
+        
         # Create OTP table
         cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='otp_verification' AND xtype='U')
@@ -101,7 +443,116 @@ def init_db():
             )
         """)
         
-        print("✓ Database tables initialized successfully")
+        # Create email outbox table
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='email_outbox' AND xtype='U')
+            CREATE TABLE email_outbox (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                dedupe_key NVARCHAR(200) NOT NULL UNIQUE,
+                kind NVARCHAR(30) NOT NULL,
+                priority TINYINT NOT NULL DEFAULT 5,
+                recipient NVARCHAR(100) NOT NULL,
+                payload NVARCHAR(MAX) NOT NULL,
+                status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INT NOT NULL DEFAULT 0,
+                next_attempt_at DATETIME NOT NULL DEFAULT GETDATE(),
+                locked_until DATETIME,
+                last_error NVARCHAR(500),
+                created_at DATETIME DEFAULT GETDATE(),
+                sent_at DATETIME,
+                expires_at DATETIME,
+                INDEX idx_outbox_due (status, priority, next_attempt_at)
+            )
+        """)
+        cursor.execute("""
+            IF COL_LENGTH('email_outbox', 'expires_at') IS NULL
+            ALTER TABLE email_outbox ADD expires_at DATETIME
+        """)
+        
+        # Create job lease table (one runner per named job)
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='job_leases' AND xtype='U')
+            CREATE TABLE job_leases (
+                name NVARCHAR(100) PRIMARY KEY,
+                owner NVARCHAR(100) NOT NULL,
+                expires_at DATETIME NOT NULL
+            )
+        """)
+        
+        # Create broadcast job tables
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='broadcast_jobs' AND xtype='U')
+            CREATE TABLE broadcast_jobs (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                broadcast_key NVARCHAR(64) NOT NULL,
+                zoom_link NVARCHAR(500) NOT NULL,
+                webinar_date NVARCHAR(100),
+                webinar_time NVARCHAR(100),
+                status NVARCHAR(20) NOT NULL DEFAULT 'queued',
+                total INT NOT NULL DEFAULT 0,
+                sent INT NOT NULL DEFAULT 0,
+                skipped INT NOT NULL DEFAULT 0,
+                failed INT NOT NULL DEFAULT 0,
+                last_error NVARCHAR(500),
+                created_at DATETIME DEFAULT GETDATE(),
+                started_at DATETIME,
+                finished_at DATETIME,
+                INDEX idx_broadcast_key (broadcast_key)
+            )
+        """)
+        
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='broadcast_deliveries' AND xtype='U')
+            CREATE TABLE broadcast_deliveries (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                broadcast_key NVARCHAR(64) NOT NULL,
+                registration_id INT NOT NULL,
+                email NVARCHAR(100) NOT NULL,
+                job_id INT NOT NULL,
+                status NVARCHAR(20) NOT NULL,
+                error NVARCHAR(500),
+                attempts INT NOT NULL DEFAULT 1,
+                updated_at DATETIME DEFAULT GETDATE(),
+                CONSTRAINT uq_broadcast_recipient UNIQUE (broadcast_key, registration_id)
+            )
+        """)
+        
+        # Create order reuse cache (one live Razorpay order per email/amount/currency)
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='order_cache' AND xtype='U')
+            CREATE TABLE order_cache (
+                cache_key CHAR(64) PRIMARY KEY,
+                email NVARCHAR(100) NOT NULL,
+                amount INT NOT NULL,
+                currency NVARCHAR(10) NOT NULL,
+                razorpay_order_id NVARCHAR(100) NOT NULL,
+                order_json NVARCHAR(MAX) NOT NULL,
+                created_at DATETIME DEFAULT GETDATE(),
+                expires_at DATETIME NOT NULL,
+                INDEX idx_order_cache_order (razorpay_order_id)
+            )
+        """)
+        
+        # Create webhook event log (one row per Razorpay event id)
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='webhook_events' AND xtype='U')
+            CREATE TABLE webhook_events (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                event_id NVARCHAR(100) NOT NULL,
+                event NVARCHAR(50) NOT NULL,
+                payload NVARCHAR(MAX) NOT NULL,
+                status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INT NOT NULL DEFAULT 0,
+                locked_until DATETIME,
+                last_error NVARCHAR(500),
+                received_at DATETIME DEFAULT GETDATE(),
+                processed_at DATETIME,
+                CONSTRAINT uq_webhook_event_id UNIQUE (event_id),
+                INDEX idx_webhook_events_status (status, id)
+            )
+        """)
+        
+        logger.info("Database tables initialized")
 
 def test_connection():
     """Test database connection"""
@@ -109,8 +560,8 @@ def test_connection():
         with get_db_cursor() as cursor:
             cursor.execute("SELECT @@VERSION")
             version = cursor.fetchone()
-            print(f"✓ Connected to SQL Server: {version[0][:50]}...")
+            logger.info("Connected to SQL Server: %s", version[0][:50])
             return True
     except Exception as e:
-        print(f"✗ Database connection failed: {e}")
+        logger.error("Database connection failed: %s", e)
         return False
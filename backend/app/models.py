@@ -1,38 +1,67 @@
 """
 Database models for SQL Server operations
 """
+import base64
+import hashlib
+import json
 from datetime import datetime, timedelta
+from flask import current_app
 from app.database import get_db_cursor
+from app.utils.cache import Snapshot, VersionedCache
+from app.utils.rows import map_rows, row_type
+
+
+def _apply_payment_outcomes(cursor, captured, failed):
+    """
+    Bulk-apply payment outcomes on an open cursor.
+    
+    ``captured`` and ``failed`` are lists of (payment_id, method, order_id).
+    Failures are applied first and never overwrite a success, so a failure
+    for an order that was later captured is harmless.
+    """
+    cursor.fast_executemany = True
+    
+    if failed:
+        cursor.executemany("""
+            UPDATE payments
+            SET razorpay_payment_id = ?, payment_method = ?, status = 'failed'
+            WHERE razorpay_order_id = ? AND status <> 'success'
+        """, failed)
+        cursor.executemany("""
+            UPDATE registrations
+            SET razorpay_payment_id = ?, payment_status = 'failed', updated_at = GETDATE()
+            WHERE razorpay_order_id = ? AND payment_status <> 'success'
+        """, [(payment_id, order_id) for payment_id, _, order_id in failed])
+    
+    if captured:
+        cursor.executemany("""
+            UPDATE payments
+            SET razorpay_payment_id = ?, payment_method = ?, status = 'success'
+            WHERE razorpay_order_id = ?
+        """, captured)
+        cursor.executemany("""
+            UPDATE registrations
+            SET razorpay_payment_id = ?, payment_status = 'success', updated_at = GETDATE()
+            WHERE razorpay_order_id = ?
+        """, [(payment_id, order_id) for payment_id, _, order_id in captured])
+        cursor.executemany(
+            "DELETE FROM order_cache WHERE razorpay_order_id = ?",
+            [(order_id,) for _, _, order_id in captured]
+        )
+
+
+# Row types for the registration queries, fields in SELECT order
+RegistrationLookupRow = row_type('RegistrationLookupRow', [
+    'id', 'full_name', 'email', 'phone', 'payment_status', 'razorpay_order_id', 'razorpay_payment_id',
+])
+RegistrationListRow = row_type('RegistrationListRow', [
+    'id', 'full_name', 'email', 'phone', 'city', 'state', 'business_name', 'payment_status', 'created_at',
+])
+
 
 class Registration:
     """Registration model"""
     
-    @staticmethod
-    def create(data):
-        """Create a new registration"""
-        with get_db_cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO registrations 
-                (full_name, email, phone, whatsapp_number, city, state, 
-                 business_name, business_type, experience_level, email_verified)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data.get('fullName'),
-                data.get('email'),
-                data.get('phone'),
-                data.get('whatsappNumber'),
-                data.get('city'),
-                data.get('state'),
-                data.get('businessName'),
-                data.get('businessType'),
-                data.get('experienceLevel'),
-                1  # Email verified
-            ))
-            
-            cursor.execute("SELECT @@IDENTITY")
-            registration_id = cursor.fetchone()[0]
-            return registration_id
-    
     @staticmethod
     def get_by_email(email):
         """Get registration by email"""
@@ -46,56 +75,133 @@ class Registration:
             
             row = cursor.fetchone()
             if row:
-                return {
-                    'id': row[0],
-                    'full_name': row[1],
-                    'email': row[2],
-                    'phone': row[3],
-                    'payment_status': row[4],
-                    'razorpay_order_id': row[5],
-                    'razorpay_payment_id': row[6]
-                }
+                return RegistrationLookupRow(*row)
             return None
     
     @staticmethod
-    def update_payment(email, order_id, payment_id, status):
-        """Update payment information"""
+    def _filters(status=None, city=None, created_from=None, created_to=None):
+        """WHERE clauses and parameters for the listing filters"""
+        clauses = []
+        params = []
+        if status:
+            clauses.append("payment_status = ?")
+            params.append(status)
+        if city:
+            clauses.append("city = ?")
+            params.append(city)
+        if created_from:
+            clauses.append("created_at >= ?")
+            params.append(created_from)
+        if created_to:
+            clauses.append("created_at < ?")
+            params.append(created_to)
+        return clauses, params
+    
+    @staticmethod
+    def encode_cursor(row):
+        """Opaque keyset cursor pointing just after `row`"""
+        created_at = row['created_at']
+        raw = json.dumps([created_at.isoformat() if created_at is not None else None, row['id']])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+        try:
+            created_at, registration_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if created_at is not None:
+                created_at = datetime.fromisoformat(created_at)
+            return created_at, int(registration_id)
+        except (TypeError, ValueError, UnicodeError) as e:
+            raise ValueError(f'Invalid cursor: {cursor}') from e
+    
+    @staticmethod
+    def list_page(limit=100, cursor=None, status=None, city=None, created_from=None, created_to=None):
+        """
+        One page of registrations, newest first, using keyset pagination.
+        Returns (registrations, next_cursor); next_cursor is None on the last page.
+        """
+        clauses, params = Registration._filters(status, city, created_from, created_to)
+        if cursor:
+            after_created, after_id = Registration.decode_cursor(cursor)
+            if after_created is None:
+                # NULLs sort last in DESC order, so only NULL rows remain
+                clauses.append("(created_at IS NULL AND id < ?)")
+                params.append(after_id)
+            else:
+                # The parameter arrives as datetime2; compare at the column's
+                # DATETIME precision so the cursor row's own timestamp matches
+                clauses.append("(created_at < CAST(? AS DATETIME)"
+                               " OR (created_at = CAST(? AS DATETIME) AND id < ?)"
+                               " OR created_at IS NULL)")
+                params.extend([after_created, after_created, after_id])
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with get_db_cursor() as db_cursor:
+            # Fetch one extra row to learn whether another page exists
+            db_cursor.execute(f"""
+                SELECT TOP (?) id, full_name, email, phone, city, state,
+                       business_name, payment_status, created_at
+                FROM registrations
+                {where}
+                ORDER BY created_at DESC, id DESC
+            """, (limit + 1, *params))
+            
+            rows = db_cursor.fetchall()
+        
+        registrations = map_rows(RegistrationListRow, rows[:limit])
+        
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = Registration.encode_cursor(registrations[-1])
+        return registrations, next_cursor
+    
+    @staticmethod
+    def count(status=None, city=None, created_from=None, created_to=None):
+        """Count matching registrations, in total and per payment status"""
+        clauses, params = Registration._filters(status, city, created_from, created_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                UPDATE registrations 
-                SET razorpay_order_id = ?,
-                    razorpay_payment_id = ?,
-                    payment_status = ?,
-                    updated_at = GETDATE()
-                WHERE email = ?
-            """, (order_id, payment_id, status, email))
+            cursor.execute(f"""
+                SELECT payment_status, COUNT(*)
+                FROM registrations
+                {where}
+                GROUP BY payment_status
+            """, params)
+            
+            by_status = {row[0]: row[1] for row in cursor.fetchall()}
+            return {
+                'total': sum(by_status.values()),
+                'by_status': by_status
+            }
+
     
     @staticmethod
-    def get_all():
-        """Get all registrations"""
+    def iter_export_batches(columns, batch_size=1000, status=None, city=None, created_from=None, created_to=None):
+        """
+        Stream matching registrations as lists of row tuples, oldest first.
+        
+        Rows come off the forward-only result set with fetchmany, so only one
+        batch is in memory at a time. Must be consumed inside an app context.
+        """
+        clauses, params = Registration._filters(status, city, created_from, created_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                SELECT id, full_name, email, phone, city, state,
-                       business_name, payment_status, created_at
+            cursor.execute(f"""
+                SELECT {', '.join(columns)}
                 FROM registrations
-                ORDER BY created_at DESC
-            """)
+                {where}
+                ORDER BY id
+            """, params)
             
-            rows = cursor.fetchall()
-            registrations = []
-            for row in rows:
-                registrations.append({
-                    'id': row[0],
-                    'full_name': row[1],
-                    'email': row[2],
-                    'phone': row[3],
-                    'city': row[4],
-                    'state': row[5],
-                    'business_name': row[6],
-                    'payment_status': row[7],
-                    'created_at': row[8]
-                })
-            return registrations
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
 
 
 class OTP:
@@ -117,108 +223,294 @@ class OTP:
             """, (email, otp, expiry))
     
     @staticmethod
-    def get(email):
-        """Get OTP record for email"""
+    def verify(email, otp, max_attempts):
+        """
+        Check an OTP and consume or count the attempt in one statement.
+        
+        The row is deleted when the code matches or the attempt limit is
+        already reached, and its attempts are incremented otherwise. Returns
+        (action, attempts, matched) from the MERGE output, or None when there
+        is no unexpired OTP for ``email``.
+        """
         with get_db_cursor() as cursor:
             cursor.execute("""
-                SELECT otp, expiry, attempts
-                FROM otp_verification
-                WHERE email = ? AND expiry > GETDATE()
-                ORDER BY created_at DESC
-            """, (email,))
+                SET NOCOUNT ON;
+                WITH live AS (
+                    SELECT email, otp, attempts
+                    FROM otp_verification WITH (UPDLOCK, HOLDLOCK)
+                    WHERE email = ? AND expiry > GETDATE()
+                )
+                MERGE live AS target
+                USING (SELECT ? AS otp) AS source
+                ON 1 = 1
+                WHEN MATCHED AND (target.attempts >= ? OR target.otp = source.otp) THEN
+                    DELETE
+                WHEN MATCHED THEN
+                    UPDATE SET attempts = target.attempts + 1
+                OUTPUT $action,
+                       COALESCE(inserted.attempts, deleted.attempts),
+                       CASE WHEN deleted.otp = source.otp THEN 1 ELSE 0 END;
+            """, (email, otp, max_attempts))
             
             row = cursor.fetchone()
             if row:
-                return {
-                    'otp': row[0],
-                    'expiry': row[1],
-                    'attempts': row[2]
-                }
+                return row[0], row[1], bool(row[2])
             return None
     
     @staticmethod
-    def increment_attempts(email):
-        """Increment failed attempts"""
+    def cleanup_expired(batch_size=500):
+        """
+        Remove up to `batch_size` expired OTPs and return how many went.
+        
+        Batches stay well under SQL Server's lock escalation threshold, so
+        the delete takes row/page locks instead of locking the whole table.
+        """
         with get_db_cursor() as cursor:
             cursor.execute("""
-                UPDATE otp_verification
-                SET attempts = attempts + 1
-                WHERE email = ?
-            """, (email,))
-    
-    @staticmethod
-    def delete(email):
-        """Delete OTP record"""
-        with get_db_cursor() as cursor:
-            cursor.execute("DELETE FROM otp_verification WHERE email = ?", (email,))
-    
-    @staticmethod
-    def cleanup_expired():
-        """Remove expired OTPs"""
-        with get_db_cursor() as cursor:
-            cursor.execute("DELETE FROM otp_verification WHERE expiry < GETDATE()")
+                SET NOCOUNT ON;
+                DELETE TOP (?) FROM otp_verification WHERE expiry < GETDATE();
+                SELECT @@ROWCOUNT;
+            """, (batch_size,))
+            return cursor.fetchone()[0]
 
 
 class Payment:
     """Payment model"""
     
     @staticmethod
-    def create(registration_id, order_id, amount):
-        """Create payment record"""
+    def get_local_state(orders):
+        """
+        Local payment/registration state for a set of Razorpay orders.
+        
+        ``orders`` is a list of (order_id, email). The ids are bulk-loaded into
+        a temp table and joined in one query, instead of one lookup per order.
+        Returns {order_id: dict}; ``email_registration_*`` describe any
+        registration for the same email, whichever order it is tied to.
+        """
+        if not orders:
+            return {}
+        
         with get_db_cursor() as cursor:
             cursor.execute("""
-                INSERT INTO payments 
-                (registration_id, razorpay_order_id, amount, status)
-                VALUES (?, ?, ?, 'pending')
-            """, (registration_id, order_id, amount))
+                CREATE TABLE #recon_orders (
+                    order_id NVARCHAR(100) PRIMARY KEY,
+                    email NVARCHAR(100)
+                )
+            """)
+            cursor.fast_executemany = True
+            cursor.executemany(
+                "INSERT INTO #recon_orders (order_id, email) VALUES (?, ?)",
+                orders
+            )
+            cursor.execute("""
+                SELECT o.order_id, p.id, p.status, p.amount,
+                       r.id, r.payment_status,
+                       re.id, re.payment_status, re.razorpay_order_id
+                FROM #recon_orders o
+                LEFT JOIN payments p ON p.razorpay_order_id = o.order_id
+                LEFT JOIN registrations r ON r.razorpay_order_id = o.order_id
+                LEFT JOIN registrations re ON re.email = o.email
+            """)
+            rows = cursor.fetchall()
+            cursor.execute("DROP TABLE #recon_orders")
+            
+            return {
+                row[0]: {
+                    'payment_id': row[1],
+                    'payment_status': row[2],
+                    'amount': row[3],
+                    'registration_id': row[4],
+                    'registration_status': row[5],
+                    'email_registration_id': row[6],
+                    'email_registration_status': row[7],
+                    'email_registration_order_id': row[8]
+                }
+                for row in rows
+            }
     
     @staticmethod
-    def update(order_id, payment_id, signature, status, method=None):
-        """Update payment status"""
+    def get_successful_orders(created_from, created_to):
+        """Order ids of registrations marked paid within a time window"""
         with get_db_cursor() as cursor:
             cursor.execute("""
-                UPDATE payments
-                SET razorpay_payment_id = ?,
-                    razorpay_signature = ?,
-                    status = ?,
-                    payment_method = ?
-                WHERE razorpay_order_id = ?
-            """, (payment_id, signature, status, method, order_id))
+                SELECT razorpay_order_id, id, email
+                FROM registrations
+                WHERE payment_status = 'success'
+                  AND razorpay_order_id IS NOT NULL
+                  AND created_at >= ? AND created_at < ?
+            """, (created_from, created_to))
+            
+            return [
+                {'order_id': row[0], 'registration_id': row[1], 'email': row[2]}
+                for row in cursor.fetchall()
+            ]
     
     @staticmethod
-    def get_by_order_id(order_id):
-        """Get payment by order ID"""
+    def apply_outcomes(captured, failed):
+        """Bulk-apply captured/failed payments in one transaction"""
+        with get_db_cursor() as cursor:
+            _apply_payment_outcomes(cursor, captured, failed)
+    
+    @staticmethod
+    def record_verified(registration_data, order_id, payment_id, signature, amount):
+        """
+        Upsert the registration and its payment as one atomic batch.
+        
+        Runs in a single round-trip: both MERGEs execute under XACT_ABORT so a
+        failure in either rolls back both, and the generated IDs come back via
+        OUTPUT instead of a follow-up SELECT @@IDENTITY.
+        """
         with get_db_cursor() as cursor:
             cursor.execute("""
-                SELECT id, registration_id, amount, status
-                FROM payments
-                WHERE razorpay_order_id = ?
-            """, (order_id,))
+                SET NOCOUNT ON;
+                SET XACT_ABORT ON;
+                
+                DECLARE @registration TABLE (id INT, action NVARCHAR(10));
+                DECLARE @payment TABLE (id INT, action NVARCHAR(10));
+                DECLARE @registration_id INT;
+                
+                MERGE registrations WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS email) AS source
+                ON target.email = source.email
+                WHEN MATCHED THEN
+                    UPDATE SET razorpay_order_id = ?,
+                               razorpay_payment_id = ?,
+                               payment_status = 'success',
+                               updated_at = GETDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (full_name, email, phone, whatsapp_number, city, state,
+                            business_name, business_type, experience_level, email_verified,
+                            payment_status, razorpay_order_id, razorpay_payment_id)
+                    VALUES (?, source.email, ?, ?, ?, ?, ?, ?, ?, 1, 'success', ?, ?)
+                OUTPUT inserted.id, $action INTO @registration;
+                
+                SELECT @registration_id = id FROM @registration;
+                
+                MERGE payments WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS razorpay_order_id) AS source
+                ON target.razorpay_order_id = source.razorpay_order_id
+                WHEN MATCHED THEN
+                    UPDATE SET razorpay_payment_id = ?,
+                               razorpay_signature = ?,
+                               status = 'success'
+                WHEN NOT MATCHED THEN
+                    INSERT (registration_id, razorpay_order_id, razorpay_payment_id,
+                            razorpay_signature, amount, status)
+                    VALUES (@registration_id, source.razorpay_order_id, ?, ?, ?, 'success')
+                OUTPUT inserted.id, $action INTO @payment;
+                
+                -- The order is paid, so it must not be handed out again
+                DELETE FROM order_cache WHERE razorpay_order_id = ?;
+                
+                SELECT r.id, r.action, p.id, p.action
+                FROM @registration r CROSS JOIN @payment p;
+            """, (
+                registration_data.get('email'),
+                order_id,
+                payment_id,
+                registration_data.get('fullName'),
+                registration_data.get('phone'),
+                registration_data.get('whatsappNumber'),
+                registration_data.get('city'),
+                registration_data.get('state'),
+                registration_data.get('businessName'),
+                registration_data.get('businessType'),
+                registration_data.get('experienceLevel'),
+                order_id,
+                payment_id,
+                order_id,
+                payment_id,
+                signature,
+                payment_id,
+                signature,
+                amount,
+                order_id
+            ))
             
             row = cursor.fetchone()
-            if row:
-                return {
-                    'id': row[0],
-                    'registration_id': row[1],
-                    'amount': row[2],
-                    'status': row[3]
-                }
-            return None
+            return {
+                'registration_id': row[0],
+                'registration_created': row[1] == 'INSERT',
+                'payment_id': row[2],
+                'payment_created': row[3] == 'INSERT'
+            }
 
 
-class Settings:
-    """Settings model for webinar configuration"""
+class OrderCache:
+    """Recently created Razorpay orders, reused while a checkout is retried"""
+    
+    @staticmethod
+    def key(email, amount, currency):
+        raw = f'{email.strip().lower()}|{amount}|{currency.upper()}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def lookup(email, amount, currency):
+        """
+        Check registration and cached order in one round-trip.
+        
+        Returns {'registered': bool, 'order': dict or None}; expired cache
+        entries are ignored.
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    CASE WHEN EXISTS (SELECT 1 FROM registrations WHERE email = ?) THEN 1 ELSE 0 END,
+                    (SELECT order_json FROM order_cache
+                     WHERE cache_key = ? AND expires_at > GETDATE())
+            """, (email, OrderCache.key(email, amount, currency)))
+            
+            row = cursor.fetchone()
+            return {
+                'registered': bool(row[0]),
+                'order': json.loads(row[1]) if row[1] else None
+            }
     
     @staticmethod
-    def get_setting(key):
-        """Get a setting value by key"""
+    def store(email, amount, currency, order, ttl_seconds):
+        """
+        Cache a freshly created order and return the order to hand out.
+        
+        If another worker cached an unexpired order for the same key first,
+        that one wins and is returned, so concurrent retries converge on a
+        single order id.
+        """
         with get_db_cursor() as cursor:
-            cursor.execute(
-                "SELECT value FROM settings WHERE setting_key = ?",
-                (key,)
-            )
+            cursor.execute("""
+                SET NOCOUNT ON;
+                MERGE order_cache WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS cache_key) AS source
+                ON target.cache_key = source.cache_key
+                WHEN MATCHED AND target.expires_at <= GETDATE() THEN
+                    UPDATE SET razorpay_order_id = ?, order_json = ?,
+                               created_at = GETDATE(),
+                               expires_at = DATEADD(second, ?, GETDATE())
+                WHEN NOT MATCHED THEN
+                    INSERT (cache_key, email, amount, currency, razorpay_order_id,
+                            order_json, expires_at)
+                    VALUES (source.cache_key, ?, ?, ?, ?, ?, DATEADD(second, ?, GETDATE()));
+                
+                SELECT order_json FROM order_cache WHERE cache_key = ?;
+            """, (
+                OrderCache.key(email, amount, currency),
+                order['id'],
+                json.dumps(order),
+                ttl_seconds,
+                email,
+                amount,
+                currency,
+                order['id'],
+                json.dumps(order),
+                ttl_seconds,
+                OrderCache.key(email, amount, currency)
+            ))
+            
             row = cursor.fetchone()
-            return row[0] if row else None
+            return json.loads(row[0]) if row else order
+
+
+class Settings:
+    """Settings model for webinar configuration"""
     
     @staticmethod
     def set_setting(key, value):
@@ -243,16 +535,62 @@ class Settings:
                     "INSERT INTO settings (setting_key, value) VALUES (?, ?)",
                     (key, value)
                 )
-            
-            return True
+        
+        Settings._cache().invalidate()
+        return True
     
     @staticmethod
-    def get_all_settings():
-        """Get all settings as a dictionary"""
+    def _cache():
+        """Per-app settings cache, created on first use"""
+        app = current_app._get_current_object()
+        cache = app.extensions.get('settings_cache')
+        if cache is None:
+            cache = app.extensions.setdefault('settings_cache', VersionedCache(
+                app,
+                Settings._load_snapshot,
+                Settings._load_version,
+                ttl=app.config['SETTINGS_CACHE_TTL'],
+                stale_ttl=app.config['SETTINGS_CACHE_STALE_TTL'],
+                name='settings-cache'
+            ))
+        return cache
+    
+    @staticmethod
+    def _version_stamp(count, last_modified):
+        """Version stamp shared by all workers: row count plus newest updated_at"""
+        if last_modified is None:
+            return f'{count}-0'
+        return f"{count}-{last_modified.strftime('%Y%m%d%H%M%S%f')}"
+    
+    @staticmethod
+    def _load_version():
+        """Cheap check used to notice changes made by other workers"""
         with get_db_cursor() as cursor:
-            cursor.execute("SELECT setting_key, value FROM settings")
+            cursor.execute("SELECT COUNT(*), MAX(updated_at) FROM settings")
+            row = cursor.fetchone()
+            return Settings._version_stamp(row[0], row[1])
+    
+    @staticmethod
+    def _load_snapshot():
+        """Load every setting along with its version stamp"""
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT setting_key, value, updated_at FROM settings")
             rows = cursor.fetchall()
-            return {row[0]: row[1] for row in rows}
+        
+        values = {row[0]: row[1] for row in rows}
+        timestamps = [row[2] for row in rows if row[2] is not None]
+        last_modified = max(timestamps) if timestamps else None
+        return Snapshot(values, Settings._version_stamp(len(rows), last_modified), last_modified)
+    
+    @staticmethod
+    def get_snapshot():
+        """Cached settings map with its version stamp and last-modified time"""
+        return Settings._cache().get()
+    
+    @staticmethod
+    def get_all_settings():
+        """Get all settings as a dictionary"""
+        return Settings.get_snapshot().values
     
     @staticmethod
     def get_webinar_info():
@@ -276,4 +614,530 @@ class Settings:
             Settings.set_setting('webinar_title', title)
         if zoom_link:
             Settings.set_setting('zoom_link', zoom_link)
+        Settings._cache().invalidate()
         return True
+
+
+class EmailOutbox:
+    """Durable queue of transactional emails"""
+    
+    @staticmethod
+    def enqueue(kind, recipient, payload, dedupe_key, priority, expires_in=None):
+        """
+        Queue an email unless one with the same dedupe key already exists.
+        A message not sent within `expires_in` seconds is dropped.
+        Returns (id, created).
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                DECLARE @id INT = (
+                    SELECT id FROM email_outbox WITH (UPDLOCK, HOLDLOCK)
+                    WHERE dedupe_key = ?
+                );
+                IF @id IS NULL
+                BEGIN
+                    INSERT INTO email_outbox (dedupe_key, kind, priority, recipient, payload, expires_at)
+                    VALUES (?, ?, ?, ?, ?, DATEADD(second, ?, GETDATE()));
+                    SELECT CAST(SCOPE_IDENTITY() AS INT), 1;
+                END
+                ELSE
+                    SELECT @id, 0;
+            """, (dedupe_key, dedupe_key, kind, priority, recipient, payload, expires_in))
+            
+            row = cursor.fetchone()
+            return row[0], bool(row[1])
+    
+    @staticmethod
+    def claim(limit, max_priority, lease_seconds):
+        """
+        Lease up to `limit` due messages to the calling worker.
+        Rows whose lease ran out (crashed worker) are picked up again;
+        messages past their expiry are marked expired and emptied instead.
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                UPDATE email_outbox
+                SET status = 'expired',
+                    payload = '{}',
+                    locked_until = NULL
+                WHERE expires_at < GETDATE()
+                  AND (status = 'pending' OR (status = 'sending' AND locked_until < GETDATE()));
+                
+                WITH due AS (
+                    SELECT TOP (?) *
+                    FROM email_outbox WITH (ROWLOCK, UPDLOCK, READPAST)
+                    WHERE priority <= ?
+                      AND ((status = 'pending' AND next_attempt_at <= GETDATE())
+                           OR (status = 'sending' AND locked_until < GETDATE()))
+                    ORDER BY priority, next_attempt_at, id
+                )
+                UPDATE due
+                SET status = 'sending',
+                    attempts = attempts + 1,
+                    locked_until = DATEADD(second, ?, GETDATE())
+                OUTPUT inserted.id, inserted.kind, inserted.recipient,
+                       inserted.payload, inserted.attempts;
+            """, (limit, max_priority, lease_seconds))
+            
+            return [
+                {
+                    'id': row[0],
+                    'kind': row[1],
+                    'recipient': row[2],
+                    'payload': row[3],
+                    'attempts': row[4]
+                }
+                for row in cursor.fetchall()
+            ]
+    
+    @staticmethod
+    def renew(message_ids, lease_seconds):
+        """Extend the lease on claimed messages that are still being sent"""
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE email_outbox
+                SET locked_until = DATEADD(second, ?, GETDATE())
+                WHERE status = 'sending'
+                  AND id IN ({', '.join('?' * len(message_ids))})
+            """, (lease_seconds, *message_ids))
+    
+    @staticmethod
+    def mark_sent(message_id, redact=False):
+        """Record a successful delivery; `redact` empties the stored payload"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE email_outbox
+                SET status = 'sent',
+                    sent_at = GETDATE(),
+                    locked_until = NULL,
+                    last_error = NULL,
+                    payload = CASE WHEN ? = 1 THEN '{}' ELSE payload END
+                WHERE id = ?
+            """, (int(redact), message_id))
+    
+    @staticmethod
+    def mark_failed(message_id, error, retry_in=None, redact=False):
+        """
+        Schedule a retry in `retry_in` seconds, or give up when it is None.
+        `redact` empties the stored payload of a message given up on.
+        """
+        status = 'failed' if retry_in is None else 'pending'
+        redact = redact and retry_in is None
+        
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE email_outbox
+                SET status = ?,
+                    next_attempt_at = DATEADD(second, ?, GETDATE()),
+                    locked_until = NULL,
+                    last_error = ?,
+                    payload = CASE WHEN ? = 1 THEN '{}' ELSE payload END
+                WHERE id = ?
+            """, (status, int(retry_in or 0), str(error)[:500], int(redact), message_id))
+    
+    @staticmethod
+    def get(message_id):
+        """Get delivery status for one message"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT id, kind, recipient, priority, status, attempts,
+                       next_attempt_at, last_error, created_at, sent_at
+                FROM email_outbox
+                WHERE id = ?
+            """, (message_id,))
+            
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'id': row[0],
+                    'kind': row[1],
+                    'recipient': row[2],
+                    'priority': row[3],
+                    'status': row[4],
+                    'attempts': row[5],
+                    'next_attempt_at': row[6],
+                    'last_error': row[7],
+                    'created_at': row[8],
+                    'sent_at': row[9]
+                }
+            return None
+    
+    @staticmethod
+    def get_stats():
+        """Message counts by kind and status"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT kind, status, COUNT(*)
+                FROM email_outbox
+                GROUP BY kind, status
+            """)
+            
+            stats = {}
+            for row in cursor.fetchall():
+                stats.setdefault(row[0], {})[row[1]] = row[2]
+            return stats
+    
+    @staticmethod
+    def get_queue_depth():
+        """Counts of messages still to be sent, by kind and status"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT kind, status, COUNT(*)
+                FROM email_outbox
+                WHERE status IN ('pending', 'sending')
+                GROUP BY kind, status
+            """)
+            
+            depth = {}
+            for row in cursor.fetchall():
+                depth.setdefault(row[0], {})[row[1]] = row[2]
+            return depth
+
+
+class WebhookEvent:
+    """Raw Razorpay webhook deliveries, deduplicated by event id"""
+    
+    @staticmethod
+    def record(event_id, event, payload):
+        """
+        Store a delivery unless the same event id was already received.
+        Returns (id, created).
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                DECLARE @id INT = (
+                    SELECT id FROM webhook_events WITH (UPDLOCK, HOLDLOCK)
+                    WHERE event_id = ?
+                );
+                IF @id IS NULL
+                BEGIN
+                    INSERT INTO webhook_events (event_id, event, payload)
+                    VALUES (?, ?, ?);
+                    SELECT CAST(SCOPE_IDENTITY() AS INT), 1;
+                END
+                ELSE
+                    SELECT @id, 0;
+            """, (event_id, event_id, event, payload))
+            
+            row = cursor.fetchone()
+            return row[0], bool(row[1])
+    
+    @staticmethod
+    def claim(limit, lease_seconds):
+        """Lease up to `limit` unprocessed events, oldest first"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                WITH due AS (
+                    SELECT TOP (?) *
+                    FROM webhook_events WITH (ROWLOCK, UPDLOCK, READPAST)
+                    WHERE status = 'pending'
+                       OR (status = 'processing' AND locked_until < GETDATE())
+                    ORDER BY id
+                )
+                UPDATE due
+                SET status = 'processing',
+                    attempts = attempts + 1,
+                    locked_until = DATEADD(second, ?, GETDATE())
+                OUTPUT inserted.id, inserted.event, inserted.payload, inserted.attempts;
+            """, (limit, lease_seconds))
+            
+            return [
+                {
+                    'id': row[0],
+                    'event': row[1],
+                    'payload': row[2],
+                    'attempts': row[3]
+                }
+                for row in cursor.fetchall()
+            ]
+    
+    @staticmethod
+    def apply_batch(outcomes, ignored_ids):
+        """
+        Apply a batch of payment outcomes and close out the events, atomically.
+        
+        ``outcomes`` are (event id, 'captured' | 'failed', row) with rows as
+        in _apply_payment_outcomes. Captured events whose order has no
+        payments row are parked as 'unmatched' (reconciliation reports the
+        payment from Razorpay's side) and returned as (event id, order id).
+        """
+        captured = [row for _, kind, row in outcomes if kind == 'captured']
+        failed = [row for _, kind, row in outcomes if kind == 'failed']
+        
+        with get_db_cursor() as cursor:
+            _apply_payment_outcomes(cursor, captured, failed)
+            
+            unmatched = []
+            if captured:
+                order_ids = list({order_id for _, _, order_id in captured})
+                cursor.execute(f"""
+                    SELECT razorpay_order_id FROM payments
+                    WHERE razorpay_order_id IN ({', '.join('?' * len(order_ids))})
+                """, order_ids)
+                known = {row[0] for row in cursor.fetchall()}
+                unmatched = [
+                    (event_id, row[2]) for event_id, kind, row in outcomes
+                    if kind == 'captured' and row[2] not in known
+                ]
+            
+            parked = {event_id for event_id, _ in unmatched}
+            processed_ids = [event_id for event_id, _, _ in outcomes if event_id not in parked]
+            if parked:
+                cursor.executemany("""
+                    UPDATE webhook_events
+                    SET status = 'unmatched', processed_at = GETDATE(), locked_until = NULL
+                    WHERE id = ?
+                """, [(event_id,) for event_id in parked])
+            if processed_ids:
+                cursor.executemany("""
+                    UPDATE webhook_events
+                    SET status = 'processed', processed_at = GETDATE(), locked_until = NULL
+                    WHERE id = ?
+                """, [(event_id,) for event_id in processed_ids])
+            if ignored_ids:
+                cursor.executemany("""
+                    UPDATE webhook_events
+                    SET status = 'ignored', processed_at = GETDATE(), locked_until = NULL
+                    WHERE id = ?
+                """, [(event_id,) for event_id in ignored_ids])
+            
+            return unmatched
+    
+    @staticmethod
+    def mark_failed(event_ids, error, give_up=False):
+        """Put events back in the queue, or park them as failed"""
+        with get_db_cursor() as cursor:
+            cursor.executemany("""
+                UPDATE webhook_events
+                SET status = ?, last_error = ?, locked_until = NULL
+                WHERE id = ?
+            """, [('failed' if give_up else 'pending', str(error)[:500], event_id) for event_id in event_ids])
+    
+    @staticmethod
+    def get_stats():
+        """Event counts by status"""
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT status, COUNT(*) FROM webhook_events GROUP BY status")
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+class JobLease:
+    """Named, expiring leases so only one worker runs a given job at a time"""
+    
+    @staticmethod
+    def acquire(name, owner, ttl_seconds):
+        """Take or renew the lease; returns True if `owner` now holds it"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                MERGE job_leases WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS name) AS source
+                ON target.name = source.name
+                WHEN MATCHED AND (target.expires_at < GETDATE() OR target.owner = ?) THEN
+                    UPDATE SET owner = ?, expires_at = DATEADD(second, ?, GETDATE())
+                WHEN NOT MATCHED THEN
+                    INSERT (name, owner, expires_at)
+                    VALUES (source.name, ?, DATEADD(second, ?, GETDATE()))
+                OUTPUT inserted.owner;
+            """, (name, owner, owner, ttl_seconds, owner, ttl_seconds))
+            
+            return cursor.fetchone() is not None
+    
+    @staticmethod
+    def release(name, owner):
+        """Give up the lease if `owner` still holds it"""
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM job_leases WHERE name = ? AND owner = ?",
+                (name, owner)
+            )
+    
+    @staticmethod
+    def is_held(name):
+        """Whether anyone holds an unexpired lease on `name`"""
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM job_leases WHERE name = ? AND expires_at >= GETDATE()",
+                (name,)
+            )
+            return cursor.fetchone() is not None
+
+
+class BroadcastJob:
+    """Bulk webinar-link broadcast jobs and their per-recipient ledger"""
+    
+    @staticmethod
+    def create(broadcast_key, zoom_link, webinar_date, webinar_time):
+        """Create a queued broadcast job and return its ID"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                INSERT INTO broadcast_jobs (broadcast_key, zoom_link, webinar_date, webinar_time)
+                OUTPUT inserted.id
+                VALUES (?, ?, ?, ?)
+            """, (broadcast_key, zoom_link, webinar_date, webinar_time))
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def get(job_id):
+        """Get a broadcast job with its progress counters"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT id, broadcast_key, zoom_link, webinar_date, webinar_time, status,
+                       total, sent, skipped, failed, last_error,
+                       created_at, started_at, finished_at
+                FROM broadcast_jobs
+                WHERE id = ?
+            """, (job_id,))
+            
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'id': row[0],
+                    'broadcast_key': row[1],
+                    'zoom_link': row[2],
+                    'webinar_date': row[3],
+                    'webinar_time': row[4],
+                    'status': row[5],
+                    'total': row[6],
+                    'sent': row[7],
+                    'skipped': row[8],
+                    'failed': row[9],
+                    'last_error': row[10],
+                    'created_at': row[11],
+                    'started_at': row[12],
+                    'finished_at': row[13]
+                }
+            return None
+    
+    @staticmethod
+    def get_active(broadcast_key):
+        """ID of the newest unfinished job for this broadcast, if any"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT TOP 1 id FROM broadcast_jobs
+                WHERE broadcast_key = ? AND status IN ('queued', 'running')
+                ORDER BY id DESC
+            """, (broadcast_key,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
+    @staticmethod
+    def get_queue_depth():
+        """Unfinished jobs by status, and recipients the running ones still have to handle"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT status, COUNT(*),
+                       SUM(CASE WHEN status = 'running'
+                                THEN total - skipped - sent - failed ELSE 0 END)
+                FROM broadcast_jobs
+                WHERE status IN ('queued', 'running')
+                GROUP BY status
+            """)
+            
+            rows = cursor.fetchall()
+            return {
+                'jobs': {row[0]: row[1] for row in rows},
+                'remaining': sum(max(0, row[2] or 0) for row in rows)
+            }
+    
+    @staticmethod
+    def mark_running(job_id, total, skipped):
+        """Record the start of a (re)run"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE broadcast_jobs
+                SET status = 'running',
+                    total = ?,
+                    skipped = ?,
+                    sent = 0,
+                    failed = 0,
+                    last_error = NULL,
+                    started_at = GETDATE(),
+                    finished_at = NULL
+                WHERE id = ?
+            """, (total, skipped, job_id))
+    
+    @staticmethod
+    def update_progress(job_id, sent, failed):
+        """Store progress counters for the current run"""
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE broadcast_jobs SET sent = ?, failed = ? WHERE id = ?",
+                (sent, failed, job_id)
+            )
+    
+    @staticmethod
+    def finish(job_id, status, error=None):
+        """Mark a job completed or failed"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE broadcast_jobs
+                SET status = ?, last_error = ?, finished_at = GETDATE()
+                WHERE id = ?
+            """, (status, str(error)[:500] if error else None, job_id))
+    
+    @staticmethod
+    def count_recipients(broadcast_key):
+        """Paid registrations, and how many of them already have this broadcast"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*),
+                       SUM(CASE WHEN d.registration_id IS NULL THEN 0 ELSE 1 END)
+                FROM registrations r
+                LEFT JOIN broadcast_deliveries d
+                       ON d.registration_id = r.id
+                      AND d.broadcast_key = ?
+                      AND d.status = 'sent'
+                WHERE r.payment_status = 'success'
+            """, (broadcast_key,))
+            row = cursor.fetchone()
+            return row[0], row[1] or 0
+    
+    @staticmethod
+    def get_pending_recipients(broadcast_key, after_id, limit):
+        """Next batch of paid registrations that have not received this broadcast"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT TOP (?) r.id, r.email, r.full_name
+                FROM registrations r
+                WHERE r.payment_status = 'success'
+                  AND r.id > ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM broadcast_deliveries d
+                      WHERE d.broadcast_key = ?
+                        AND d.registration_id = r.id
+                        AND d.status = 'sent'
+                  )
+                ORDER BY r.id
+            """, (limit, after_id, broadcast_key))
+            
+            return [
+                {'id': row[0], 'email': row[1], 'full_name': row[2]}
+                for row in cursor.fetchall()
+            ]
+    
+    @staticmethod
+    def record_delivery(broadcast_key, job_id, registration_id, email, status, error=None):
+        """Write or update the ledger entry for one recipient"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                MERGE broadcast_deliveries WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS broadcast_key, ? AS registration_id) AS source
+                ON target.broadcast_key = source.broadcast_key
+                   AND target.registration_id = source.registration_id
+                WHEN MATCHED THEN
+                    UPDATE SET job_id = ?, status = ?, error = ?,
+                               attempts = target.attempts + 1, updated_at = GETDATE()
+                WHEN NOT MATCHED THEN
+                    INSERT (broadcast_key, registration_id, email, job_id, status, error)
+                    VALUES (source.broadcast_key, source.registration_id, ?, ?, ?, ?);
+            """, (
+                broadcast_key, registration_id,
+                job_id, status, error,
+                email, job_id, status, error
+            ))
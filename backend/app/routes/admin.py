@@ -1,19 +1,28 @@
 """
 Admin routes for managing registrations and sending bulk emails
 """
-from flask import Blueprint, request, jsonify
-from app.models import Registration, Settings
-from app.utils.email_service import send_webinar_link_email
+import logging
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from app.models import Registration, Settings, EmailOutbox, BroadcastJob, JobLease, WebhookEvent
+from app.database import get_pool_stats
+from app.utils.broadcast import broadcast_key, lease_name, start_broadcast
+from app.utils.export import EXPORT_COLUMNS, EXPORT_FORMATS
+from app.utils.razorpay_client import get_razorpay_client
+from app.utils.maintenance import get_purge_stats
+from app.utils.rate_limit import get_limiter
+from app.utils.log import get_log_stats
 from app.routes.auth import verify_admin_token
-import time
 
 admin_bp = Blueprint('admin', __name__)
 
+logger = logging.getLogger(__name__)
+
 @admin_bp.route('/send-webinar-links', methods=['POST'])
 @verify_admin_token
 def send_webinar_links():
     """
-    Send webinar Zoom link to all registered participants
+    Start a background broadcast of the webinar Zoom link to all paid participants
     Requires X-Admin-Token header for authentication
     
     Request body:
@@ -22,6 +31,9 @@ def send_webinar_links():
         "webinar_date": "December 10, 2025",  # Optional
         "webinar_time": "9:00 AM - 12:00 PM IST"  # Optional
     }
+    
+    Returns 202 with a job_id; poll GET /admin/broadcasts/<job_id> for progress.
+    Participants who already received this Zoom link are skipped.
     """
     try:
         data = request.json
@@ -35,87 +47,242 @@ def send_webinar_links():
                 'message': 'Zoom link is required'
             }), 400
         
-        # Get all registrations with successful payment
-        all_registrations = Registration.get_all()
+        key = broadcast_key(zoom_link)
+        
+        # Only one job per Zoom link at a time
+        active_job_id = BroadcastJob.get_active(key)
+        if active_job_id and JobLease.is_held(lease_name(key)):
+            return jsonify({
+                'success': True,
+                'message': 'A broadcast for this Zoom link is already running',
+                'job_id': active_job_id
+            }), 202
         
-        # Filter only those with successful payment
-        paid_registrations = [r for r in all_registrations if r['payment_status'] == 'success']
+        job_id = BroadcastJob.create(key, zoom_link, webinar_date, webinar_time)
+        start_broadcast(job_id)
+        logger.info('Broadcast %s queued', job_id)
         
-        if not paid_registrations:
+        return jsonify({
+            'success': True,
+            'message': 'Webinar link broadcast started',
+            'job_id': job_id
+        }), 202
+    
+    except Exception as error:
+        logger.exception('Error sending webinar links')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to send webinar links',
+            'error': str(error)
+        }), 500
+
+@admin_bp.route('/broadcasts/<int:job_id>', methods=['GET'])
+@verify_admin_token
+def broadcast_progress(job_id):
+    """
+    Progress of a webinar link broadcast
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        job = BroadcastJob.get(job_id)
+        if not job:
             return jsonify({
                 'success': False,
-                'message': 'No paid registrations found'
+                'message': 'Broadcast not found'
             }), 404
         
-        print(f'Sending webinar links to {len(paid_registrations)} participants...')
-        
-        success_count = 0
-        failed_count = 0
-        failed_emails = []
+        job['running'] = JobLease.is_held(lease_name(job['broadcast_key']))
+        return jsonify({
+            'success': True,
+            'broadcast': job
+        })
+    
+    except Exception as error:
+        logger.exception('Error fetching broadcast progress')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch broadcast progress',
+            'error': str(error)
+        }), 500
+
+@admin_bp.route('/broadcasts/<int:job_id>/resume', methods=['POST'])
+@verify_admin_token
+def resume_broadcast(job_id):
+    """
+    Rerun an interrupted or failed broadcast; recipients who already have the link are skipped
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        job = BroadcastJob.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Broadcast not found'
+            }), 404
         
-        for registration in paid_registrations:
-            try:
-                email = registration['email']
-                name = registration['full_name']
-                
-                send_webinar_link_email(email, name, zoom_link, webinar_date, webinar_time)
-                success_count += 1
-                print(f'✓ Sent to: {email}')
-                
-                # Add small delay to avoid rate limiting
-                time.sleep(0.5)
-                
-            except Exception as e:
-                failed_count += 1
-                failed_emails.append({
-                    'email': registration['email'],
-                    'error': str(e)
-                })
-                print(f'✗ Failed to send to {registration["email"]}: {e}')
+        if JobLease.is_held(lease_name(job['broadcast_key'])):
+            return jsonify({
+                'success': False,
+                'message': 'Broadcast is already running'
+            }), 409
         
+        start_broadcast(job_id)
         return jsonify({
             'success': True,
-            'message': f'Webinar links sent successfully',
-            'total': len(paid_registrations),
-            'sent': success_count,
-            'failed': failed_count,
-            'failed_emails': failed_emails if failed_emails else None
-        })
+            'message': 'Broadcast resumed',
+            'job_id': job_id
+        }), 202
     
     except Exception as error:
-        print('Error sending webinar links:', error)
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error resuming broadcast')
         return jsonify({
             'success': False,
-            'message': 'Failed to send webinar links',
+            'message': 'Failed to resume broadcast',
             'error': str(error)
         }), 500
 
+def _parse_date_arg(name, end_of_range=False):
+    """Parse a YYYY-MM-DD or ISO datetime query arg; a bare date used as an upper bound covers the whole day"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date: {value}")
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def _registration_filters():
+    """Status, city and date-range filters from the query string"""
+    return {
+        'status': request.args.get('status') or None,
+        'city': request.args.get('city') or None,
+        'created_from': _parse_date_arg('from'),
+        'created_to': _parse_date_arg('to', end_of_range=True)
+    }
+
 @admin_bp.route('/registrations', methods=['GET'])
 @verify_admin_token
 def get_registrations():
     """
-    Get all registrations with their payment status
+    Get one page of registrations with their payment status, newest first
     Requires X-Admin-Token header for authentication
+    
+    Query parameters (all optional):
+        limit   page size, 1-500 (default 100)
+        cursor  next_cursor from the previous page
+        status  payment status, e.g. success or pending
+        city    exact city match
+        from    created on/after this date (YYYY-MM-DD or ISO datetime)
+        to      created on/before this date
     """
     try:
-        registrations = Registration.get_all()
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+            filters = _registration_filters()
+            registrations, next_cursor = Registration.list_page(
+                limit=limit,
+                cursor=request.args.get('cursor') or None,
+                **filters
+            )
+        except ValueError as error:
+            return jsonify({
+                'success': False,
+                'message': str(error)
+            }), 400
         
         return jsonify({
             'success': True,
-            'total': len(registrations),
-            'registrations': registrations
+            'count': len(registrations),
+            'registrations': registrations,
+            'next_cursor': next_cursor
         })
     
     except Exception as error:
-        print('Error fetching registrations:', error)
+        logger.exception('Error fetching registrations')
         return jsonify({
             'success': False,
             'message': 'Failed to fetch registrations',
             'error': str(error)
         }), 500
 
+@admin_bp.route('/registrations/count', methods=['GET'])
+@verify_admin_token
+def count_registrations():
+    """
+    Count registrations matching the same filters as /registrations
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        try:
+            filters = _registration_filters()
+        except ValueError as error:
+            return jsonify({
+                'success': False,
+                'message': str(error)
+            }), 400
+        
+        counts = Registration.count(**filters)
+        return jsonify({
+            'success': True,
+            'total': counts['total'],
+            'by_status': counts['by_status']
+        })
+    
+    except Exception as error:
+        logger.exception('Error counting registrations')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to count registrations',
+            'error': str(error)
+        }), 500
+
+@admin_bp.route('/registrations/export', methods=['GET'])
+@verify_admin_token
+def export_registrations():
+    """
+    Stream all matching registrations as a file download
+    Requires X-Admin-Token header for authentication
+    
+    Query parameters: format (csv, ndjson or xlsx; default csv) plus the
+    same filters as /registrations. The body is sent with chunked transfer
+    encoding while rows are still being read from the database.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        }), 400
+    
+    try:
+        filters = _registration_filters()
+    except ValueError as error:
+        return jsonify({
+            'success': False,
+            'message': str(error)
+        }), 400
+    
+    writer, mimetype = EXPORT_FORMATS[export_format]
+    batches = Registration.iter_export_batches(
+        EXPORT_COLUMNS,
+        batch_size=current_app.config['EXPORT_BATCH_SIZE'],
+        **filters
+    )
+    filename = f"registrations-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    
+    return Response(
+        stream_with_context(writer(batches)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @admin_bp.route('/webinar-settings', methods=['GET', 'POST'])
 @verify_admin_token
 def manage_webinar_settings():
@@ -150,9 +317,139 @@ def manage_webinar_settings():
             })
     
     except Exception as error:
-        print('Error managing webinar settings:', error)
+        logger.exception('Error managing webinar settings')
         return jsonify({
             'success': False,
             'message': 'Failed to manage webinar settings',
             'error': str(error)
         }), 500
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@verify_admin_token
+def db_pool_stats():
+    """
+    Connection pool metrics for the worker that served this request
+    Requires X-Admin-Token header for authentication
+    """
+    return jsonify({
+        'success': True,
+        'pool': get_pool_stats()
+    })
+
+@admin_bp.route('/maintenance', methods=['GET'])
+@verify_admin_token
+def maintenance_stats():
+    """
+    Expired-OTP purge counters for the worker that served this request
+    Requires X-Admin-Token header for authentication
+    """
+    return jsonify({
+        'success': True,
+        'otp_purge': get_purge_stats(current_app._get_current_object())
+    })
+
+@admin_bp.route('/rate-limits', methods=['GET'])
+@verify_admin_token
+def rate_limit_stats():
+    """
+    OTP throttling and load-shedding counters for this worker
+    Requires X-Admin-Token header for authentication
+    """
+    return jsonify({
+        'success': True,
+        'rate_limits': get_limiter().stats()
+    })
+
+@admin_bp.route('/logging', methods=['GET'])
+@verify_admin_token
+def logging_stats():
+    """
+    Log queue depth and dropped records for this worker
+    Requires X-Admin-Token header for authentication
+    """
+    return jsonify({
+        'success': True,
+        'logging': get_log_stats(current_app._get_current_object())
+    })
+
+@admin_bp.route('/razorpay-client', methods=['GET'])
+@verify_admin_token
+def razorpay_client_stats():
+    """
+    Razorpay API latency, retry and circuit breaker state for this worker
+    Requires X-Admin-Token header for authentication
+    """
+    return jsonify({
+        'success': True,
+        'client': get_razorpay_client().stats()
+    })
+
+@admin_bp.route('/emails/<int:message_id>', methods=['GET'])
+@verify_admin_token
+def email_status(message_id):
+    """
+    Delivery status of a queued email
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        message = EmailOutbox.get(message_id)
+        if not message:
+            return jsonify({
+                'success': False,
+                'message': 'Email not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'email': message
+        })
+    
+    except Exception as error:
+        logger.exception('Error fetching email status')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch email status',
+            'error': str(error)
+        }), 500
+
+@admin_bp.route('/emails/stats', methods=['GET'])
+@verify_admin_token
+def email_stats():
+    """
+    Outbox message counts by kind and status
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'stats': EmailOutbox.get_stats()
+        })
+    
+    except Exception as error:
+        logger.exception('Error fetching email stats')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch email stats',
+            'error': str(error)
+        }), 500
+
+@admin_bp.route('/webhooks/stats', methods=['GET'])
+@verify_admin_token
+def webhook_stats():
+    """
+    Stored Razorpay webhook event counts by status
+    Requires X-Admin-Token header for authentication
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'stats': WebhookEvent.get_stats()
+        })
+    
+    except Exception as error:
+        logger.exception('Error fetching webhook stats')
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch webhook stats',
+            'error': str(error)
+        }), 500
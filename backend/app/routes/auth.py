@@ -1,3 +1,4 @@
+import logging
 from flask import Blueprint, request, jsonify
 from werkzeug.security import check_password_hash
 import os
@@ -5,6 +6,8 @@ from functools import wraps
 
 auth_bp = Blueprint('auth', __name__)
 
+logger = logging.getLogger(__name__)
+
 # In production, store this in database with hashed passwords
 # For now, using environment variable
 admin_password = os.getenv('ADMIN_PASSWORD_HASH', 'needles_admin_2025')
@@ -73,7 +76,7 @@ def admin_login():
         }), 200
         
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.exception('Login error')
         return jsonify({
             'success': False,
             'message': 'Login failed. Please try again.'
@@ -97,7 +100,7 @@ def verify_token():
         }), 200
         
     except Exception as e:
-        print(f"Token verification error: {str(e)}")
+        logger.exception('Token verification error')
         return jsonify({
             'success': False,
             'message': 'Verification failed'
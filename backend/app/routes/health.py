@@ -0,0 +1,24 @@
+"""
+Liveness and readiness probes for the load balancer
+"""
+from flask import Blueprint, jsonify
+from app.utils.health import check_readiness
+from app.utils.log import quiet
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz', methods=['GET'])
+@quiet
+def healthz():
+    """Liveness: the worker is up and serving. Never touches the database."""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/readyz', methods=['GET'])
+@quiet
+def readyz():
+    """Readiness: cached database, SMTP and Razorpay probe statuses (details are logged)"""
+    ready, checks = check_readiness()
+    return jsonify({
+        'status': 'ready' if ready else 'unavailable',
+        'checks': {name: result['status'] for name, result in checks.items()}
+    }), 200 if ready else 503
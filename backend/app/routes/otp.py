@@ -1,41 +1,46 @@
-from datetime import datetime, timedelta
+import logging
+import secrets
 from flask import Blueprint, request, jsonify, current_app
 from app.utils.validators import validate_email
-from app.utils.email_service import generate_otp, send_email_otp
-from app.models import OTP
+from app.utils.email_service import generate_otp
+from app.utils.outbox import enqueue_email, PRIORITY_OTP
+from app.utils.rate_limit import rate_limited
+from app.utils.otp_store import get_otp_store, VERIFIED, LOCKED, MISSING
 
 otp_bp = Blueprint('otp', __name__)
 
+logger = logging.getLogger(__name__)
+
 @otp_bp.route('/send-otp', methods=['POST'])
+@rate_limited('send_otp', email_limit='RATE_LIMIT_SEND_OTP_EMAIL', ip_limit='RATE_LIMIT_SEND_OTP_IP')
 def send_otp():
     """Send OTP to user's email"""
-    print('=== SEND OTP ENDPOINT CALLED ===')
-    print('Request body:', request.json)
-    print('Timestamp:', datetime.now().isoformat())
-    
     try:
         data = request.json
         email = data.get('email')
         
         if not validate_email(email):
-            print(f'Invalid email format: {email}')
             return jsonify({
                 'success': False,
                 'message': 'Invalid email address'
             }), 400
         
         otp = generate_otp()
-        print(f'Generated OTP for {email}: {otp}')
         
-        # Store OTP in database
+        # Store OTP (SQL Server, memory or Redis depending on OTP_STORE)
         config = current_app.config
-        OTP.create(email, otp, config['OTP_EXPIRY_MINUTES'])
-        
-        print('Attempting to send email...')
-        send_email_otp(email, otp)
-        print('Email sent successfully')
+        get_otp_store().save(email, otp, config['OTP_EXPIRY_MINUTES'] * 60)
         
-        print(f'Email OTP sent to {email}: {otp}')  # For development/testing
+        # Delivery happens in the outbox workers; OTPs use the priority lane
+        message_id = enqueue_email(
+            'otp',
+            email,
+            {'email': email, 'otp': otp},
+            dedupe_key=f'otp:{secrets.token_urlsafe(16)}',
+            priority=PRIORITY_OTP,
+            expires_in=config['OTP_EXPIRY_MINUTES'] * 60
+        )
+        logger.debug('OTP email queued (outbox message %s)', message_id)
         
         return jsonify({
             'success': True,
@@ -43,16 +48,7 @@ def send_otp():
         })
     
     except Exception as error:
-        print('=== SEND OTP ERROR ===')
-        print('Error message:', str(error))
-        print('Error type:', type(error).__name__)
-        
-        if 'authentication' in str(error).lower() or 'auth' in str(error).lower():
-            return jsonify({
-                'success': False,
-                'message': 'Email service not configured. Please contact support.',
-                'error': 'SMTP credentials missing or invalid'
-            }), 500
+        logger.exception('Send OTP error')
         
         return jsonify({
             'success': False,
@@ -61,6 +57,7 @@ def send_otp():
         }), 500
 
 @otp_bp.route('/verify-otp', methods=['POST'])
+@rate_limited('verify_otp', email_limit='RATE_LIMIT_VERIFY_OTP_EMAIL', ip_limit='RATE_LIMIT_VERIFY_OTP_IP')
 def verify_otp():
     """Verify the OTP entered by user"""
     try:
@@ -69,40 +66,34 @@ def verify_otp():
         otp = data.get('otp')
         config = current_app.config
         
-        # Get OTP from database
-        stored = OTP.get(email)
+        # Check the code and record the attempt in one atomic operation
+        outcome, remaining = get_otp_store().verify(email, otp, config['OTP_MAX_ATTEMPTS'])
         
-        if not stored:
+        if outcome == MISSING:
             return jsonify({
                 'success': False,
                 'message': 'OTP not found or expired. Please request a new one.'
             }), 400
         
-        # Check attempts
-        if stored['attempts'] >= config['OTP_MAX_ATTEMPTS']:
-            OTP.delete(email)
+        if outcome == LOCKED:
             return jsonify({
                 'success': False,
                 'message': 'Too many failed attempts. Please request a new OTP.'
             }), 400
         
-        # Verify OTP
-        if stored['otp'] == otp:
-            OTP.delete(email)
+        if outcome == VERIFIED:
             return jsonify({
                 'success': True,
                 'message': 'Email verified successfully'
             })
-        else:
-            OTP.increment_attempts(email)
-            remaining = config['OTP_MAX_ATTEMPTS'] - (stored['attempts'] + 1)
-            return jsonify({
-                'success': False,
-                'message': f"Invalid OTP. {remaining} attempts remaining."
-            }), 400
+        
+        return jsonify({
+            'success': False,
+            'message': f"Invalid OTP. {remaining} attempts remaining."
+        }), 400
     
     except Exception as error:
-        print('Verify OTP error:', error)
+        logger.exception('Verify OTP error')
         return jsonify({
             'success': False,
             'message': 'OTP verification failed',
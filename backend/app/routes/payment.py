@@ -1,15 +1,21 @@
 import json
-from flask import Blueprint, request, jsonify
+import logging
+from flask import Blueprint, request, jsonify, current_app
 from app.utils.payment_service import (
     create_razorpay_order,
     verify_razorpay_signature,
     verify_webhook_signature
 )
-from app.utils.email_service import send_confirmation_email
-from app.models import Registration, Payment, Settings
+from app.utils.outbox import enqueue_email
+from app.utils.razorpay_client import RazorpayUnavailable
+from app.utils.webhooks import event_id_for, record_webhook
+from app.models import Registration, Payment, Settings, OrderCache
+from app.database import close_db_connection
 
 payment_bp = Blueprint('payment', __name__)
 
+logger = logging.getLogger(__name__)
+
 @payment_bp.route('/check-email', methods=['POST'])
 def check_email():
     """Check if email is already registered"""
@@ -36,7 +42,7 @@ def check_email():
         }), 200
     
     except Exception as error:
-        print('Error checking email:', error)
+        logger.exception('Error checking email')
         return jsonify({
             'error': str(error),
             'details': 'Failed to check email'
@@ -52,21 +58,42 @@ def create_order():
         receipt = data.get('receipt')
         notes = data.get('notes', {})
         
-        # Check if email already exists
-        email = notes.get('email') if notes else None
+        # Check if email already exists, and whether a recent unpaid order
+        # for the same checkout can be handed back instead of a new one.
+        # register.html sends the address as customer_email
+        email = (notes.get('customer_email') or notes.get('email')) if notes else None
         if email:
-            existing = Registration.get_by_email(email)
-            if existing:
+            cached = OrderCache.lookup(email, amount, currency)
+            if cached['registered']:
                 return jsonify({
                     'error': 'Email already registered',
                     'message': 'This email is already registered for the webinar'
                 }), 400
+            if cached['order']:
+                return jsonify(cached['order'])
         
+        # Hand the connection back while Razorpay is called, so a slow
+        # gateway does not hold DB_POOL_SIZE connections idle
+        close_db_connection()
         order = create_razorpay_order(amount, currency, receipt, notes)
+        
+        if email:
+            try:
+                order = OrderCache.store(email, amount, currency, order, current_app.config['ORDER_CACHE_TTL'])
+            except Exception as cache_error:
+                logger.warning('Failed to cache order %s: %s', order.get('id'), cache_error)
+        
         return jsonify(order)
     
+    except RazorpayUnavailable as error:
+        logger.warning('Razorpay unavailable, not creating order: %s', error)
+        return jsonify({
+            'error': str(error),
+            'details': 'Payment gateway is temporarily unavailable, please try again shortly'
+        }), 503
+    
     except Exception as error:
-        print('Error creating order:', error)
+        logger.exception('Error creating order')
         return jsonify({
             'error': str(error),
             'details': 'Failed to create Razorpay order'
@@ -90,95 +117,71 @@ def verify_payment():
         )
         
         if not is_valid:
-            print('Payment verification failed')
+            logger.warning('Payment signature verification failed for order %s', razorpay_order_id)
             return jsonify({
                 'success': False,
                 'message': 'Payment verification failed'
             }), 400
         
-        print('Payment verified successfully:', {
-            'order_id': razorpay_order_id,
-            'payment_id': razorpay_payment_id
-        })
+        logger.info('Payment verified', extra={'order_id': razorpay_order_id, 'payment_id': razorpay_payment_id})
         
-        # Check if registration already exists for this email
         email = user_data.get('email')
-        existing = Registration.get_by_email(email)
         
-        if existing:
-            # Use existing registration
-            registration_id = existing['id']
-            print(f'Using existing registration ID: {registration_id} for email: {email}')
-            
-            # Update payment info on existing registration
-            Registration.update_payment(email, razorpay_order_id, razorpay_payment_id, 'success')
-        else:
-            # Map frontend data to database schema
-            registration_data = {
-                'fullName': f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}".strip(),
-                'email': email,
-                'phone': user_data.get('phone'),
-                'whatsappNumber': user_data.get('whatsapp'),
-                'city': user_data.get('city'),
-                'state': '',  # Not collected in form
-                'businessName': '',  # Not collected in form
-                'businessType': user_data.get('category', ''),
-                'experienceLevel': user_data.get('experience', '')
-            }
-            
-            # Save new registration to database
-            registration_id = Registration.create(registration_data)
-            
-            if not registration_id:
-                print('Failed to save registration')
-                return jsonify({
-                    'success': False,
-                    'message': 'Payment verified but registration failed. Please contact support.'
-                }), 500
-            
-            print(f'New registration saved with ID: {registration_id}')
-            
-            # Update payment info for new registration
-            Registration.update_payment(email, razorpay_order_id, razorpay_payment_id, 'success')
+        # Map frontend data to database schema
+        registration_data = {
+            'fullName': f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}".strip(),
+            'email': email,
+            'phone': user_data.get('phone'),
+            'whatsappNumber': user_data.get('whatsapp'),
+            'city': user_data.get('city'),
+            'state': '',  # Not collected in form
+            'businessName': '',  # Not collected in form
+            'businessType': user_data.get('category', ''),
+            'experienceLevel': user_data.get('experience', '')
+        }
         
-        # Save payment details to database
         # Get amount from user data or default to 100 paise
         amount = user_data.get('amount', 100)
-
-        # Check if payment record already exists
-        existing_payment = Payment.get_by_order_id(razorpay_order_id)
         
-        if existing_payment:
-            print(f'Payment record already exists for order ID: {razorpay_order_id}')
-            # Just update the existing payment record
-            Payment.update(razorpay_order_id, razorpay_payment_id, razorpay_signature, 'success')
-        else:
-            # Create a new payment record
-            Payment.create(registration_id, razorpay_order_id, amount)
-            # Update payment record with payment id, signature and mark as success
-            Payment.update(razorpay_order_id, razorpay_payment_id, razorpay_signature, 'success')
-            print(f'New payment record created for registration ID: {registration_id}')
-
-        # Verify saved payment
-        payment_record = Payment.get_by_order_id(razorpay_order_id)
-        if payment_record:
-            print(f'Payment record verified for registration ID: {registration_id}')
-        else:
-            print('Failed to verify payment record')
+        # Upsert registration and payment in one transaction
+        result = Payment.record_verified(
+            registration_data,
+            razorpay_order_id,
+            razorpay_payment_id,
+            razorpay_signature,
+            amount
+        )
+        registration_id = result['registration_id']
+        
+        logger.info('Payment recorded', extra={
+            'registration_id': registration_id,
+            'registration_created': result['registration_created'],
+            'payment_created': result['payment_created'],
+        })
         
-        # Send confirmation email
+        # Queue confirmation email
         try:
             full_name = f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}" .strip()
             
             # Get webinar settings from database
             webinar_settings = Settings.get_webinar_info()
-            webinar_date = webinar_settings.get('webinar_date', 'December 10, 2025')
-            webinar_time = webinar_settings.get('webinar_time', '9:00 AM - 12:00 PM IST')
             
-            send_confirmation_email(email, full_name, razorpay_payment_id, razorpay_order_id, webinar_date, webinar_time)
-            print(f'Confirmation email sent to: {email}')
+            enqueue_email(
+                'confirmation',
+                email,
+                {
+                    'email': email,
+                    'name': full_name,
+                    'payment_id': razorpay_payment_id,
+                    'order_id': razorpay_order_id,
+                    'webinar_date': webinar_settings.get('webinar_date', 'December 10, 2025'),
+                    'webinar_time': webinar_settings.get('webinar_time', '9:00 AM - 12:00 PM IST')
+                },
+                dedupe_key=f'confirmation:{razorpay_order_id}'
+            )
+            logger.debug('Confirmation email queued for order %s', razorpay_order_id)
         except Exception as email_error:
-            print(f'Failed to send confirmation email: {email_error}')
+            logger.exception('Failed to queue confirmation email for order %s', razorpay_order_id)
             # Don't fail the request if email fails
         
         return jsonify({
@@ -190,9 +193,7 @@ def verify_payment():
         })
     
     except Exception as error:
-        print('Payment verification error:', error)
-        import traceback
-        traceback.print_exc()
+        logger.exception('Payment verification error')
         return jsonify({
             'success': False,
             'message': 'Payment verification error',
@@ -201,7 +202,13 @@ def verify_payment():
 
 @payment_bp.route('/webhook', methods=['POST'])
 def webhook():
-    """Handle Razorpay webhook events"""
+    """
+    Acknowledge a Razorpay webhook.
+    
+    The event is verified and stored, keyed by X-Razorpay-Event-Id so that
+    redeliveries are dropped; a background worker applies it to the
+    payments and registrations tables.
+    """
     try:
         # Get the signature from headers
         received_signature = request.headers.get('X-Razorpay-Signature')
@@ -213,63 +220,34 @@ def webhook():
         is_valid = verify_webhook_signature(webhook_body, received_signature)
         
         if not is_valid:
-            print('Webhook signature verification failed')
+            logger.warning('Webhook signature verification failed')
             return jsonify({'error': 'Invalid signature'}), 400
         
-        # Parse the webhook payload
-        webhook_data = json.loads(webhook_body)
-        event = webhook_data.get('event')
-        payload = webhook_data.get('payload')
+        try:
+            body = json.loads(webhook_body)
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            logger.warning('Webhook body is not a JSON object')
+            return jsonify({'error': 'Invalid payload'}), 400
         
-        print('Webhook received:', event)
-        print('Payload:', json.dumps(payload, indent=2))
+        event = body.get('event') or 'unknown'
+        event_id = event_id_for(request.headers.get('X-Razorpay-Event-Id'), webhook_body)
         
-        # Handle different webhook events
-        if event == 'payment.authorized':
-            print('Payment authorized:', payload['payment']['entity']['id'])
-        elif event == 'payment.captured':
-            print('Payment captured:', payload['payment']['entity']['id'])
-            handle_successful_payment(payload['payment']['entity'])
-        elif event == 'payment.failed':
-            print('Payment failed:', payload['payment']['entity']['id'])
-            handle_failed_payment(payload['payment']['entity'])
-        elif event == 'order.paid':
-            print('Order paid:', payload['order']['entity']['id'])
-        else:
-            print('Unhandled webhook event:', event)
+        created = record_webhook(event_id, event, webhook_body)
+        if not created:
+            logger.info('Duplicate webhook %s (%s) ignored', event_id, event)
         
         # Always respond with 200 to acknowledge receipt
-        return jsonify({'received': True}), 200
+        return jsonify({'received': True, 'duplicate': not created}), 200
     
     except Exception as error:
-        print('Webhook error:', error)
+        logger.exception('Webhook error')
         return jsonify({
             'error': 'Webhook processing failed',
             'message': str(error)
         }), 500
 
-def handle_successful_payment(payment_entity):
-    """Process successful payment"""
-    print('Processing successful payment:', {
-        'payment_id': payment_entity['id'],
-        'order_id': payment_entity['order_id'],
-        'amount': payment_entity['amount'] / 100,
-        'email': payment_entity.get('email'),
-        'contact': payment_entity.get('contact'),
-        'method': payment_entity.get('method')
-    })
-    # Add your business logic here
-
-def handle_failed_payment(payment_entity):
-    """Process failed payment"""
-    print('Processing failed payment:', {
-        'payment_id': payment_entity['id'],
-        'order_id': payment_entity['order_id'],
-        'error_code': payment_entity.get('error_code'),
-        'error_description': payment_entity.get('error_description')
-    })
-    # Add your business logic here
-
 @payment_bp.route('/success', methods=['GET'])
 def success_page():
     """Payment success page"""
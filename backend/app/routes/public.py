@@ -1,12 +1,95 @@
 """
 Public routes for fetching webinar information
 """
-from flask import Blueprint, jsonify
+import hashlib
+import logging
+from flask import Blueprint, jsonify, request, current_app
 from app.models import Settings
-from datetime import datetime
+from datetime import datetime, timedelta
 
 public_bp = Blueprint('public', __name__)
 
+logger = logging.getLogger(__name__)
+
+def _cached_json_response(name, cache_key, last_modified, build, expires_at=None):
+    """
+    Serve a JSON body that only changes with ``cache_key``.
+
+    The body is serialized once per key and kept in the app's extensions
+    as (cache_key, body, etag). The response carries an ETag derived from
+    the key plus Last-Modified and Cache-Control headers, so clients and
+    CDNs can revalidate with a 304 instead of a full body. When the body is
+    known to go out of date at ``expires_at``, no cache is told to keep it
+    past that moment.
+    """
+    cache = current_app.extensions.setdefault('public_response_cache', {})
+    entry = cache.get(name)
+    if entry is None or entry[0] != cache_key:
+        body = current_app.json.dumps(build()).encode('utf-8')
+        etag = hashlib.sha1(f'{name}:{cache_key}'.encode('utf-8')).hexdigest()[:20]
+        entry = (cache_key, body, etag)
+        cache[name] = entry
+
+    config = current_app.config
+    max_age = config['PUBLIC_CACHE_MAX_AGE']
+    stale = config['PUBLIC_CACHE_STALE_WHILE_REVALIDATE']
+    if expires_at is not None:
+        remaining = max(0, int((expires_at - datetime.now()).total_seconds()))
+        max_age = min(max_age, remaining)
+        stale = min(stale, remaining - max_age)
+
+    response = current_app.response_class(entry[1], mimetype='application/json')
+    response.set_etag(entry[2])
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = f'public, max-age={max_age}, stale-while-revalidate={stale}'
+    return response.make_conditional(request)
+
+def _registration_status(webinar_date_str):
+    """Build the registration status payload for a webinar date string"""
+    # Parse webinar date
+    try:
+        # Try different date formats
+        for fmt in ['%B %d, %Y', '%d %B %Y', '%d-%m-%Y', '%Y-%m-%d', '%d %B, %Y']:
+            try:
+                webinar_date = datetime.strptime(webinar_date_str.strip(), fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            # If no format matches, default to allowing registration
+            logger.warning('Could not parse webinar date: %s', webinar_date_str)
+            return {
+                'success': True,
+                'registration_open': True,
+                'message': 'Registration is open'
+            }
+
+        # Check if webinar date has passed
+        current_date = datetime.now()
+
+        if current_date.date() >= webinar_date.date():
+            return {
+                'success': True,
+                'registration_open': False,
+                'message': 'Registration is closed. The webinar has already started or ended.'
+            }
+        else:
+            return {
+                'success': True,
+                'registration_open': True,
+                'message': 'Registration is open'
+            }
+
+    except Exception as date_error:
+        logger.warning('Date parsing error: %s', date_error)
+        # Default to open if can't parse
+        return {
+            'success': True,
+            'registration_open': True,
+            'message': 'Registration is open'
+        }
+
 @public_bp.route('/webinar-info', methods=['GET'])
 def get_webinar_info():
     """
@@ -14,16 +97,21 @@ def get_webinar_info():
     Public endpoint - no authentication required
     """
     try:
-        info = Settings.get_webinar_info()
-        # Don't expose zoom_link publicly
-        return jsonify({
-            'success': True,
-            'webinar_date': info['webinar_date'],
-            'webinar_time': info['webinar_time'],
-            'webinar_title': info['webinar_title']
-        })
+        snapshot = Settings.get_snapshot()
+
+        def build():
+            info = Settings.get_webinar_info()
+            # Don't expose zoom_link publicly
+            return {
+                'success': True,
+                'webinar_date': info['webinar_date'],
+                'webinar_time': info['webinar_time'],
+                'webinar_title': info['webinar_title']
+            }
+
+        return _cached_json_response('webinar-info', snapshot.version, snapshot.last_modified, build)
     except Exception as error:
-        print('Error fetching webinar info:', error)
+        logger.exception('Error fetching webinar info')
         # Return defaults if table doesn't exist yet
         return jsonify({
             'success': True,
@@ -39,54 +127,23 @@ def get_registration_status():
     Returns registration status based on webinar date
     """
     try:
-        info = Settings.get_webinar_info()
-        webinar_date_str = info.get('webinar_date', 'December 10, 2025')
-        
-        # Parse webinar date
-        try:
-            # Try different date formats
-            for fmt in ['%B %d, %Y', '%d %B %Y', '%d-%m-%Y', '%Y-%m-%d', '%d %B, %Y']:
-                try:
-                    webinar_date = datetime.strptime(webinar_date_str.strip(), fmt)
-                    break
-                except ValueError:
-                    continue
-            else:
-                # If no format matches, default to allowing registration
-                print(f'Could not parse date: {webinar_date_str}')
-                return jsonify({
-                    'success': True,
-                    'registration_open': True,
-                    'message': 'Registration is open'
-                })
-            
-            # Check if webinar date has passed
-            current_date = datetime.now()
-            
-            if current_date.date() >= webinar_date.date():
-                return jsonify({
-                    'success': True,
-                    'registration_open': False,
-                    'message': 'Registration is closed. The webinar has already started or ended.'
-                })
-            else:
-                return jsonify({
-                    'success': True,
-                    'registration_open': True,
-                    'message': 'Registration is open'
-                })
-                
-        except Exception as date_error:
-            print(f'Date parsing error: {date_error}')
-            # Default to open if can't parse
-            return jsonify({
-                'success': True,
-                'registration_open': True,
-                'message': 'Registration is open'
-            })
-            
+        snapshot = Settings.get_snapshot()
+        webinar_date_str = snapshot.values.get('webinar_date', 'December 10, 2025')
+
+        # The answer flips at midnight, so today's date is part of the cache key
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        last_modified = max(snapshot.last_modified, today) if snapshot.last_modified else today
+
+        return _cached_json_response(
+            'registration-status',
+            (snapshot.version, today.date()),
+            last_modified,
+            lambda: _registration_status(webinar_date_str),
+            expires_at=today + timedelta(days=1)
+        )
+
     except Exception as error:
-        print('Error checking registration status:', error)
+        logger.exception('Error checking registration status')
         # Default to open on error
         return jsonify({
             'success': True,
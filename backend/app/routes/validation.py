@@ -1,8 +1,11 @@
+import logging
 from flask import Blueprint, request, jsonify
 from app.utils.validators import validate_email, validate_phone
 
 validation_bp = Blueprint('validation', __name__)
 
+logger = logging.getLogger(__name__)
+
 @validation_bp.route('/validate-contact', methods=['POST'])
 def validate_contact():
     """Validate email and phone numbers"""
@@ -37,7 +40,7 @@ def validate_contact():
         })
     
     except Exception as error:
-        print('Validation error:', error)
+        logger.exception('Validation error')
         return jsonify({
             'success': False,
             'message': 'Validation failed',
@@ -0,0 +1,72 @@
+"""
+Helpers for background threads that run inside a worker process
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker(threading.Thread):
+    """
+    Daemon thread that repeatedly calls ``run_once`` inside an app context.
+
+    ``run_once`` returns True when it did some work, in which case it is called
+    again straight away; otherwise the thread sleeps for ``interval`` seconds
+    or until ``wake()`` is called.
+    """
+
+    def __init__(self, app, name, interval):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            busy = False
+            try:
+                with self.app.app_context():
+                    busy = self.run_once()
+            except Exception:
+                logger.exception('%s: iteration failed', self.name)
+            if not busy:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+
+def start_workers(app, key, factory):
+    """
+    Start a process's workers once, on first call after (re)fork.
+
+    ``factory`` returns the list of unstarted workers. The started list is kept
+    in ``app.extensions[key]`` together with the pid that owns it, so a forked
+    child starts its own set instead of believing the parent's threads exist.
+    """
+    state = app.extensions.get(key)
+    if state is not None and state['pid'] == os.getpid():
+        return state['workers']
+
+    lock = app.extensions.setdefault('background_lock', threading.Lock())
+    with lock:
+        state = app.extensions.get(key)
+        if state is not None and state['pid'] == os.getpid():
+            return state['workers']
+        workers = factory()
+        for worker in workers:
+            worker.start()
+        app.extensions[key] = {'pid': os.getpid(), 'workers': workers, 'started_at': time.time()}
+        return workers
@@ -0,0 +1,148 @@
+"""
+Background broadcast of the webinar Zoom link to paid registrations
+
+A broadcast is identified by its Zoom link: every successful send is written
+to the ``broadcast_deliveries`` ledger under that key, so rerunning or
+resuming a job only mails the people who have not had the link yet.
+"""
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.models import BroadcastJob, JobLease
+from app.utils.email_service import prepare_webinar_link_email, send_raw_email
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_key(zoom_link):
+    """Ledger key for a broadcast"""
+    return hashlib.sha256(zoom_link.strip().encode('utf-8')).hexdigest()
+
+
+def lease_name(key):
+    return f'broadcast:{key}'
+
+
+class SendPacer:
+    """Spaces calls out so that at most `rate` happen per second across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def start_broadcast(job_id):
+    """Run a broadcast job in a background thread of this worker process"""
+    app = current_app._get_current_object()
+    thread = threading.Thread(
+        target=run_broadcast,
+        args=(app, job_id),
+        name=f'broadcast-{job_id}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def run_broadcast(app, job_id):
+    """
+    Send one broadcast job to completion.
+
+    Holds the broadcast's lease for the whole run (renewed after every batch)
+    so a second worker asked to run the same broadcast backs off.
+    """
+    owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    with app.app_context():
+        config = app.config
+        job = BroadcastJob.get(job_id)
+        if not job:
+            logger.warning('Broadcast %s: job not found', job_id)
+            return
+
+        key = job['broadcast_key']
+        lease_ttl = config['BROADCAST_LEASE_SECONDS']
+        if not JobLease.acquire(lease_name(key), owner, lease_ttl):
+            logger.info('Broadcast %s: already running in another worker', job_id)
+            BroadcastJob.finish(job_id, 'skipped', 'Another worker is already running this broadcast')
+            return
+
+    sent = failed = 0
+    try:
+        with app.app_context():
+            total, skipped = BroadcastJob.count_recipients(key)
+            BroadcastJob.mark_running(job_id, total, skipped)
+        logger.info('Broadcast %s: %s paid registrations, %s already have the link', job_id, total, skipped)
+
+        pacer = SendPacer(config['BROADCAST_SEND_RATE'])
+
+        with app.app_context():
+            # Broadcast-wide fields are rendered once; only the name varies per recipient
+            prepared = prepare_webinar_link_email(job['zoom_link'], job['webinar_date'], job['webinar_time'])
+
+        def send_one(item):
+            recipient, message = item
+            pacer.wait()
+            with app.app_context():
+                try:
+                    send_raw_email(recipient['email'], message)
+                except Exception as e:
+                    BroadcastJob.record_delivery(key, job_id, recipient['id'], recipient['email'], 'failed', str(e)[:500])
+                    logger.warning('Broadcast %s: failed to send to %s: %s', job_id, recipient['email'], e)
+                    return False
+                BroadcastJob.record_delivery(key, job_id, recipient['id'], recipient['email'], 'sent')
+                return True
+
+        after_id = 0
+        with ThreadPoolExecutor(max_workers=config['BROADCAST_CONCURRENCY']) as executor:
+            while True:
+                with app.app_context():
+                    batch = BroadcastJob.get_pending_recipients(key, after_id, config['BROADCAST_BATCH_SIZE'])
+                if not batch:
+                    break
+                after_id = batch[-1]['id']
+
+                messages = prepared.render_batch((r['email'], {'name': r['full_name']}) for r in batch)
+                items = [(recipient, message) for recipient, (_, message) in zip(batch, messages)]
+
+                for ok in executor.map(send_one, items):
+                    if ok:
+                        sent += 1
+                    else:
+                        failed += 1
+
+                with app.app_context():
+                    BroadcastJob.update_progress(job_id, sent, failed)
+                    if not JobLease.acquire(lease_name(key), owner, lease_ttl):
+                        raise RuntimeError('Lost the broadcast lease to another worker')
+
+        with app.app_context():
+            BroadcastJob.finish(job_id, 'completed')
+        logger.info('Broadcast %s: finished, %s sent, %s failed', job_id, sent, failed)
+
+    except Exception as e:
+        logger.exception('Broadcast %s: aborted', job_id)
+        with app.app_context():
+            BroadcastJob.update_progress(job_id, sent, failed)
+            BroadcastJob.finish(job_id, 'failed', e)
+
+    finally:
+        with app.app_context():
+            JobLease.release(lease_name(key), owner)
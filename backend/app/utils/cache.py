@@ -0,0 +1,105 @@
+"""
+In-process read-through cache for small, rarely-changing tables
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# values: the cached data, version: stamp used to detect changes made by
+# other workers, last_modified: datetime of the newest row (or None)
+Snapshot = namedtuple('Snapshot', ['values', 'version', 'last_modified'])
+
+
+class VersionedCache:
+    """
+    Read-through cache with TTL, stale-while-revalidate and last-known-good fallback.
+
+    ``load`` returns a full ``Snapshot``; ``load_version`` returns only the
+    version stamp and should be much cheaper. While an entry is younger than
+    ``ttl`` it is served as-is. Up to ``stale_ttl`` seconds after that it is
+    still served, but a background thread revalidates it by comparing version
+    stamps and reloads only if another worker changed the data. Past that
+    window the refresh happens inline. If the refresh fails, the last good
+    snapshot is served for as long as the database stays unreachable.
+    """
+
+    def __init__(self, app, load, load_version, ttl=30, stale_ttl=300, name='cache'):
+        self.app = app
+        self.load = load
+        self.load_version = load_version
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+
+        self._snapshot = None
+        self._checked_at = 0.0
+        # Bumped by invalidate(); the snapshot is valid while the two match
+        self._generation = 0
+        self._loaded_generation = 0
+        self._refresh_lock = threading.Lock()
+        self._flag_lock = threading.Lock()
+        self._revalidating = False
+
+    def get(self):
+        """Return the current snapshot, loading or revalidating as needed"""
+        snapshot = self._snapshot
+        if snapshot is not None and self._loaded_generation == self._generation:
+            age = time.monotonic() - self._checked_at
+            if age < self.ttl:
+                return snapshot
+            if age < self.ttl + self.stale_ttl:
+                self._revalidate_in_background()
+                return snapshot
+
+        try:
+            return self._refresh()
+        except Exception as e:
+            if snapshot is None:
+                raise
+            logger.warning('%s: refresh failed, serving last known good value: %s', self.name, e)
+            return snapshot
+
+    def invalidate(self):
+        """Force the next read in this worker to reload from the database"""
+        self._generation += 1
+
+    def _refresh(self):
+        with self._refresh_lock:
+            snapshot = self._snapshot
+            generation = self._generation
+            valid = snapshot is not None and self._loaded_generation == generation
+
+            # Another thread may have refreshed while we waited for the lock
+            if valid and time.monotonic() - self._checked_at < self.ttl:
+                return snapshot
+
+            if valid and self.load_version() == snapshot.version:
+                self._checked_at = time.monotonic()
+                return snapshot
+
+            snapshot = self.load()
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            # A write that lands while we are loading leaves the entry invalid
+            self._loaded_generation = generation
+            return snapshot
+
+    def _revalidate_in_background(self):
+        with self._flag_lock:
+            if self._revalidating:
+                return
+            self._revalidating = True
+
+        def revalidate():
+            try:
+                with self.app.app_context():
+                    self._refresh()
+            except Exception as e:
+                logger.warning('%s: background refresh failed: %s', self.name, e)
+            finally:
+                self._revalidating = False
+
+        threading.Thread(target=revalidate, name=f'{self.name}-refresh', daemon=True).start()
@@ -0,0 +1,36 @@
+"""
+Blocking calls under gevent workers
+
+With ``GUNICORN_WORKER_CLASS=gevent`` the socket module is monkey-patched,
+so smtplib, requests and redis yield to other greenlets while they wait.
+pyodbc cannot: it talks to SQL Server from C inside the ODBC driver, and a
+query would freeze every greenlet in the worker until it returned. The
+database layer therefore sends its pyodbc calls through ``run_blocking``,
+which hands them to the gevent hub's threadpool when gevent is active and
+simply calls them otherwise.
+"""
+try:
+    import gevent
+    import gevent.monkey
+except ImportError:  # only needed for GUNICORN_WORKER_CLASS=gevent
+    gevent = None
+
+
+def gevent_active():
+    """True when this process runs under gevent's monkey-patched sockets"""
+    return gevent is not None and gevent.monkey.is_module_patched('socket')
+
+
+def run_blocking(func, *args):
+    """Call ``func(*args)``, off the event loop when running under gevent"""
+    if gevent is not None and gevent.monkey.is_module_patched('socket'):
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+
+def size_threadpool(size):
+    """Let up to ``size`` blocking calls run at once (gevent's default is 10)"""
+    if gevent_active():
+        threadpool = gevent.get_hub().threadpool
+        if threadpool.maxsize != max(size, 1):
+            threadpool.maxsize = max(size, 1)
@@ -1,29 +1,11 @@
-import smtplib
 import random
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from flask import current_app
+from app.utils.email_templates import EmailTemplate
+from app.utils.smtp_pool import get_smtp_pool
 
-def generate_otp():
-    """Generate a 6-digit OTP"""
-    return str(random.randint(100000, 999999))
-
-def send_email_otp(email, otp):
-    """Send OTP via email using Amazon SES"""
-    config = current_app.config
-    
-    msg = MIMEMultipart('alternative')
-    msg['From'] = f"The Needles Webinar <{config['VERIFIED_SENDER']}>"
-    msg['To'] = email
-    msg['Subject'] = f'Your verification code is {otp}'
-    msg['Reply-To'] = config['VERIFIED_SENDER']
-    msg['X-Priority'] = '1'  # High priority
-    msg['Importance'] = 'high'
-    msg['X-Entity-Ref-ID'] = 'account-verification'
-    
-    # Plain text version (important for spam filters)
-    text_content = f'''
-Your Verification Code: {otp}
+# Plain text version (important for spam filters)
+OTP_TEXT = '''
+Your Verification Code: ${otp}
 
 Thank you for registering for The Needles Fashion Business Webinar.
 
@@ -35,8 +17,8 @@ If you did not request this code, please ignore this email.
 The Needles - Fashion Business Webinar
 December 10, 2025 | 9:00 AM - 12:00 PM IST
     '''
-    
-    html_content = f'''
+
+OTP_HTML = '''
 <!DOCTYPE html>
 <html>
 <head>
@@ -64,7 +46,7 @@ December 10, 2025 | 9:00 AM - 12:00 PM IST
                             <table width="100%" cellpadding="20" cellspacing="0">
                                 <tr>
                                     <td align="center" style="background-color: #f8f9fa; border: 2px solid #006478; border-radius: 8px;">
-                                        <span style="font-size: 32px; font-weight: bold; color: #006478; letter-spacing: 8px; font-family: monospace;">{otp}</span>
+                                        <span style="font-size: 32px; font-weight: bold; color: #006478; letter-spacing: 8px; font-family: monospace;">${otp}</span>
                                     </td>
                                 </tr>
                             </table>
@@ -91,35 +73,15 @@ December 10, 2025 | 9:00 AM - 12:00 PM IST
 </body>
 </html>
     '''
-    
-    # Attach both plain text and HTML (improves deliverability)
-    msg.attach(MIMEText(text_content, 'plain'))
-    msg.attach(MIMEText(html_content, 'html'))
-    
-    with smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT']) as server:
-        server.starttls()
-        server.login(config['SMTP_USERNAME'], config['SMTP_PASSWORD'])
-        server.send_message(msg)
 
-def send_confirmation_email(email, name, payment_id, order_id, webinar_date='December 10, 2025', webinar_time='9:00 AM - 12:00 PM IST'):
-    """Send confirmation email after successful payment"""
-    config = current_app.config
-    
-    msg = MIMEMultipart('alternative')
-    msg['From'] = f"The Needles Webinar <{config['VERIFIED_SENDER']}>"
-    msg['To'] = email
-    msg['Subject'] = 'Your Webinar Registration is Confirmed - The Needles'
-    msg['Reply-To'] = config['VERIFIED_SENDER']
-    msg['List-Unsubscribe'] = f'<mailto:{config["VERIFIED_SENDER"]}?subject=unsubscribe>'
-    
-    html_content = f'''
+CONFIRMATION_HTML = '''
         <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9;">
             <div style="background-color: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
                 <div style="text-align: center; margin-bottom: 30px;">
                     <h1 style="color: #006478; margin: 0;">✅ Registration Confirmed!</h1>
                 </div>
                 
-                <p style="font-size: 16px; color: #333;">Dear {name},</p>
+                <p style="font-size: 16px; color: #333;">Dear ${name},</p>
                 
                 <p style="font-size: 16px; color: #333; line-height: 1.6;">
                     Thank you for registering for the <strong>Fashion Business Webinar</strong>! 
@@ -128,16 +90,16 @@ def send_confirmation_email(email, name, payment_id, order_id, webinar_date='Dec
                 
                 <div style="background: linear-gradient(135deg, #006478 0%, #fee901 100%); padding: 25px; border-radius: 10px; margin: 30px 0;">
                     <h2 style="color: white; margin: 0 0 15px 0; font-size: 20px;">📅 Webinar Details</h2>
-                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Date:</strong> {webinar_date}</p>
-                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Time:</strong> {webinar_time}</p>
+                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Date:</strong> ${webinar_date}</p>
+                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Time:</strong> ${webinar_time}</p>
                     <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Duration:</strong> 3 Hours</p>
                     <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Mode:</strong> Online (Zoom)</p>
                 </div>
                 
                 <div style="background-color: #f0f8f9; padding: 20px; border-radius: 8px; border-left: 4px solid #006478; margin: 25px 0;">
                     <h3 style="color: #006478; margin: 0 0 10px 0; font-size: 16px;">Payment Details</h3>
-                    <p style="margin: 5px 0; color: #555; font-size: 14px;"><strong>Payment ID:</strong> {payment_id}</p>
-                    <p style="margin: 5px 0; color: #555; font-size: 14px;"><strong>Order ID:</strong> {order_id}</p>
+                    <p style="margin: 5px 0; color: #555; font-size: 14px;"><strong>Payment ID:</strong> ${payment_id}</p>
+                    <p style="margin: 5px 0; color: #555; font-size: 14px;"><strong>Order ID:</strong> ${order_id}</p>
                     <p style="margin: 5px 0; color: #28a745; font-size: 14px;"><strong>Status:</strong> ✅ Paid</p>
                 </div>
                 
@@ -176,33 +138,15 @@ def send_confirmation_email(email, name, payment_id, order_id, webinar_date='Dec
             </div>
         </div>
     '''
-    
-    msg.attach(MIMEText(html_content, 'html'))
-    
-    with smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT']) as server:
-        server.starttls()
-        server.login(config['SMTP_USERNAME'], config['SMTP_PASSWORD'])
-        server.send_message(msg)
 
-def send_webinar_link_email(email, name, zoom_link, webinar_date='December 10, 2025', webinar_time='9:00 AM - 12:00 PM IST'):
-    """Send webinar Zoom link to registered participants"""
-    config = current_app.config
-    
-    msg = MIMEMultipart('alternative')
-    msg['From'] = f"The Needles Webinar <{config['VERIFIED_SENDER']}>"
-    msg['To'] = email
-    msg['Subject'] = 'Your Webinar Zoom Link - The Needles Fashion Business Event'
-    msg['Reply-To'] = config['VERIFIED_SENDER']
-    msg['List-Unsubscribe'] = f'<mailto:{config["VERIFIED_SENDER"]}?subject=unsubscribe>'
-    
-    html_content = f'''
+WEBINAR_LINK_HTML = '''
         <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f9f9f9;">
             <div style="background-color: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
                 <div style="text-align: center; margin-bottom: 30px;">
                     <h1 style="color: #006478; margin: 0;">🎉 Get Ready for the Webinar!</h1>
                 </div>
                 
-                <p style="font-size: 16px; color: #333;">Dear {name},</p>
+                <p style="font-size: 16px; color: #333;">Dear ${name},</p>
                 
                 <p style="font-size: 16px; color: #333; line-height: 1.6;">
                     We're excited to see you at the <strong>Fashion Business Webinar</strong>! 
@@ -211,11 +155,11 @@ def send_webinar_link_email(email, name, zoom_link, webinar_date='December 10, 2
                 
                 <div style="background: linear-gradient(135deg, #006478 0%, #fee901 100%); padding: 30px; border-radius: 10px; margin: 30px 0; text-align: center;">
                     <h2 style="color: white; margin: 0 0 20px 0; font-size: 20px;">📅 Webinar Details</h2>
-                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Date:</strong> {webinar_date}</p>
-                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Time:</strong> {webinar_time}</p>
+                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Date:</strong> ${webinar_date}</p>
+                    <p style="color: white; margin: 5px 0; font-size: 16px;"><strong>Time:</strong> ${webinar_time}</p>
                     <p style="color: white; margin: 5px 0 20px 0; font-size: 16px;"><strong>Duration:</strong> 3 Hours</p>
                     
-                    <a href="{zoom_link}" style="display: inline-block; background-color: white; color: #006478; padding: 15px 40px; text-decoration: none; border-radius: 50px; font-weight: bold; font-size: 18px; margin-top: 10px; box-shadow: 0 4px 15px rgba(0,0,0,0.2);">
+                    <a href="${zoom_link}" style="display: inline-block; background-color: white; color: #006478; padding: 15px 40px; text-decoration: none; border-radius: 50px; font-weight: bold; font-size: 18px; margin-top: 10px; box-shadow: 0 4px 15px rgba(0,0,0,0.2);">
                         🎥 Join Zoom Webinar
                     </a>
                 </div>
@@ -235,7 +179,7 @@ def send_webinar_link_email(email, name, zoom_link, webinar_date='December 10, 2
                     <h3 style="color: #006478; margin: 0 0 15px 0; font-size: 16px;">🔗 Zoom Meeting Details</h3>
                     <p style="margin: 8px 0; color: #555; font-size: 14px;"><strong>Zoom Link:</strong></p>
                     <p style="margin: 5px 0; word-break: break-all;">
-                        <a href="{zoom_link}" style="color: #006478; text-decoration: underline;">{zoom_link}</a>
+                        <a href="${zoom_link}" style="color: #006478; text-decoration: underline;">${zoom_link}</a>
                     </p>
                     <p style="margin-top: 15px; color: #888; font-size: 12px;">
                         💡 <em>Tip: Click the link above or copy-paste it into your browser</em>
@@ -275,10 +219,64 @@ def send_webinar_link_email(email, name, zoom_link, webinar_date='December 10, 2
             </div>
         </div>
     '''
-    
-    msg.attach(MIMEText(html_content, 'html'))
-    
-    with smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT']) as server:
-        server.starttls()
-        server.login(config['SMTP_USERNAME'], config['SMTP_PASSWORD'])
-        server.send_message(msg)
+
+# Compiled once at import; see app.utils.email_templates
+TEMPLATES = {
+    'otp': EmailTemplate(
+        'Your verification code is ${otp}',
+        OTP_HTML,
+        OTP_TEXT,
+        headers={
+            'X-Priority': '1',  # High priority
+            'Importance': 'high',
+            'X-Entity-Ref-ID': 'account-verification'
+        }
+    ),
+    'confirmation': EmailTemplate(
+        'Your Webinar Registration is Confirmed - The Needles',
+        CONFIRMATION_HTML,
+        unsubscribe=True
+    ),
+    'webinar_link': EmailTemplate(
+        'Your Webinar Zoom Link - The Needles Fashion Business Event',
+        WEBINAR_LINK_HTML,
+        unsubscribe=True
+    ),
+}
+
+def generate_otp():
+    """Generate a 6-digit OTP"""
+    return str(random.randint(100000, 999999))
+
+def send_raw_email(email, message):
+    """Send a pre-rendered message over the SMTP session pool"""
+    sender = current_app.config['VERIFIED_SENDER']
+    get_smtp_pool().sendmail(sender, [email], message)
+
+def send_email_otp(email, otp):
+    """Send OTP via email using Amazon SES"""
+    prepared = TEMPLATES['otp'].prepare(current_app.config['VERIFIED_SENDER'])
+    send_raw_email(email, prepared.render(email, otp=otp))
+
+def send_confirmation_email(email, name, payment_id, order_id, webinar_date='December 10, 2025', webinar_time='9:00 AM - 12:00 PM IST'):
+    """Send confirmation email after successful payment"""
+    prepared = TEMPLATES['confirmation'].prepare(
+        current_app.config['VERIFIED_SENDER'],
+        webinar_date=webinar_date,
+        webinar_time=webinar_time
+    )
+    send_raw_email(email, prepared.render(email, name=name, payment_id=payment_id, order_id=order_id))
+
+def prepare_webinar_link_email(zoom_link, webinar_date='December 10, 2025', webinar_time='9:00 AM - 12:00 PM IST'):
+    """Webinar link email with the broadcast-wide fields rendered; use render/render_batch per recipient"""
+    return TEMPLATES['webinar_link'].prepare(
+        current_app.config['VERIFIED_SENDER'],
+        zoom_link=zoom_link,
+        webinar_date=webinar_date,
+        webinar_time=webinar_time
+    )
+
+def send_webinar_link_email(email, name, zoom_link, webinar_date='December 10, 2025', webinar_time='9:00 AM - 12:00 PM IST'):
+    """Send webinar Zoom link to registered participants"""
+    prepared = prepare_webinar_link_email(zoom_link, webinar_date, webinar_time)
+    send_raw_email(email, prepared.render(email, name=name))
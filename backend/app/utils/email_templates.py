@@ -0,0 +1,192 @@
+"""
+Precompiled email templates
+
+Templates use ``${name}`` placeholders. Each one is compiled once into a list
+of pre-encoded byte segments and slot names; static fields (sender, webinar
+date and time, Zoom link) are filled once per distinct value set, and only
+per-recipient fields are substituted when a message is rendered.
+"""
+import base64
+import html
+import re
+import threading
+import uuid
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid
+
+PLACEHOLDER = re.compile(r'\$\{(\w+)\}')
+
+SENDER_NAME = 'The Needles Webinar'
+
+# Distinct static-field combinations kept per template
+MAX_PREPARED = 16
+
+
+def minify_html(source):
+    """Drop indentation and whitespace between tags"""
+    source = re.sub(r'>\s+<', '><', source)
+    source = re.sub(r'\s{2,}', ' ', source)
+    return source.strip()
+
+
+class CompiledTemplate:
+    """Template split into static byte segments (bytes) and slot names (str)"""
+
+    __slots__ = ('parts', 'escape')
+
+    def __init__(self, parts, escape=False):
+        self.parts = parts
+        self.escape = escape
+
+    @classmethod
+    def compile(cls, source, escape=False):
+        pieces = PLACEHOLDER.split(source)
+        # split() alternates literal text and captured slot names
+        parts = [piece if i % 2 else piece.encode('utf-8') for i, piece in enumerate(pieces)]
+        return cls(cls._merge(parts), escape)
+
+    @staticmethod
+    def _merge(parts):
+        merged = []
+        for part in parts:
+            if isinstance(part, bytes):
+                if not part:
+                    continue
+                if merged and isinstance(merged[-1], bytes):
+                    merged[-1] += part
+                    continue
+            merged.append(part)
+        return merged
+
+    def _encode(self, value):
+        value = str(value)
+        if self.escape:
+            value = html.escape(value, quote=True)
+        return value.encode('utf-8')
+
+    def fill(self, **values):
+        """Return a new template with the given slots rendered into static bytes"""
+        parts = [
+            self._encode(values[part]) if isinstance(part, str) and part in values else part
+            for part in self.parts
+        ]
+        return CompiledTemplate(self._merge(parts), self.escape)
+
+    def render(self, **values):
+        """Render to UTF-8 bytes; every remaining slot must be supplied"""
+        encode = self._encode
+        return b''.join(
+            part if isinstance(part, bytes) else encode(values[part])
+            for part in self.parts
+        )
+
+
+def _header(value):
+    """Encode a header value, refusing line breaks"""
+    value = str(value).replace('\r', ' ').replace('\n', ' ')
+    if value.isascii():
+        return value
+    return Header(value, 'utf-8').encode()
+
+
+def _body_part(content_type, body):
+    encoded = base64.encodebytes(body).replace(b'\n', b'\r\n')
+    return (
+        f'Content-Type: {content_type}; charset="utf-8"\r\n'
+        'Content-Transfer-Encoding: base64\r\n'
+        '\r\n'
+    ).encode('ascii') + encoded
+
+
+class PreparedEmail:
+    """An EmailTemplate with its static fields already rendered"""
+
+    def __init__(self, sender, headers, subject, html_body, text_body):
+        self.sender = sender
+        self.subject = subject
+        self.html = html_body
+        self.text = text_body
+
+        domain = sender.rsplit('@', 1)[-1]
+        self._domain = domain
+        # Headers that are the same for every recipient, encoded once
+        self._static_headers = ''.join(
+            f'{name}: {_header(value)}\r\n' for name, value in [
+                ('From', formataddr((SENDER_NAME, sender))),
+                ('Reply-To', sender),
+                *headers,
+                ('MIME-Version', '1.0'),
+            ]
+        ).encode('ascii')
+
+    def render(self, to, **fields):
+        """Build the raw RFC 5322 message for one recipient"""
+        subject = self.subject.render(**fields).decode('utf-8')
+        boundary = f'=_{uuid.uuid4().hex}'
+
+        head = (
+            f'To: {_header(to)}\r\n'
+            f'Subject: {_header(subject)}\r\n'
+            f'Date: {formatdate(localtime=True)}\r\n'
+            f'Message-ID: {make_msgid(domain=self._domain)}\r\n'
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+            '\r\n'
+        ).encode('ascii')
+
+        delimiter = f'--{boundary}\r\n'.encode('ascii')
+        chunks = [self._static_headers, head]
+        if self.text is not None:
+            chunks += [delimiter, _body_part('text/plain', self.text.render(**fields))]
+        chunks += [
+            delimiter,
+            _body_part('text/html', self.html.render(**fields)),
+            f'--{boundary}--\r\n'.encode('ascii'),
+        ]
+        return b''.join(chunks)
+
+    def render_batch(self, recipients):
+        """Yield (to, raw_message) for an iterable of (to, fields) pairs"""
+        for to, fields in recipients:
+            yield to, self.render(to, **fields)
+
+
+class EmailTemplate:
+    """Subject, HTML and optional plain-text template for one kind of email"""
+
+    def __init__(self, subject, html_source, text_source=None, headers=None, unsubscribe=False):
+        self.subject = CompiledTemplate.compile(subject)
+        self.html = CompiledTemplate.compile(minify_html(html_source), escape=True)
+        self.text = CompiledTemplate.compile(text_source) if text_source else None
+        self.headers = list((headers or {}).items())
+        self.unsubscribe = unsubscribe
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, sender, **static):
+        """
+        Return a PreparedEmail with ``static`` fields rendered in.
+
+        Results are cached per distinct (sender, static) values, so the work
+        is redone only when settings such as the webinar date change.
+        """
+        key = (sender, tuple(sorted(static.items())))
+        prepared = self._prepared.get(key)
+        if prepared is not None:
+            return prepared
+
+        headers = list(self.headers)
+        if self.unsubscribe:
+            headers.append(('List-Unsubscribe', f'<mailto:{sender}?subject=unsubscribe>'))
+
+        prepared = PreparedEmail(
+            sender,
+            headers,
+            self.subject.fill(**static),
+            self.html.fill(**static),
+            self.text.fill(**static) if self.text else None
+        )
+        with self._lock:
+            if len(self._prepared) >= MAX_PREPARED:
+                self._prepared.clear()
+            self._prepared[key] = prepared
+        return prepared
@@ -0,0 +1,110 @@
+"""
+Readiness probes for the database, SES and Razorpay
+
+Each probe result is cached per worker for ``READYZ_CACHE_SECONDS``, so a
+load balancer polling /readyz every few seconds costs at most one
+``SELECT 1`` and one TCP connect per worker per interval. When the cache
+goes stale the first request refreshes it and the others keep getting the
+last result instead of queueing behind the probe.
+
+/readyz itself only reports each probe's status; the error behind a failed
+probe is logged when the probe runs, not served to whoever asks.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from flask import current_app
+from app.database import get_db_cursor
+from app.utils.razorpay_client import CircuitBreaker, get_razorpay_client
+
+logger = logging.getLogger(__name__)
+
+_probe_lock = threading.Lock()
+
+
+def probe_database():
+    with get_db_cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return 'ok', None
+
+
+def probe_smtp():
+    """TCP connect to the SES endpoint; no login, that is the outbox's job"""
+    config = current_app.config
+    if not config['SMTP_USERNAME'] or not config['SMTP_PASSWORD']:
+        return 'down', 'SMTP credentials not configured'
+    with socket.create_connection((config['SMTP_HOST'], config['SMTP_PORT']), timeout=config['READYZ_TIMEOUT']):
+        pass
+    return 'ok', None
+
+
+def probe_razorpay():
+    """State of the client's circuit breaker; reflects real calls, makes none"""
+    breaker = get_razorpay_client().breaker
+    if breaker.state == CircuitBreaker.CLOSED:
+        return 'ok', None
+    if breaker.state == CircuitBreaker.HALF_OPEN:
+        return 'degraded', 'circuit half open'
+    return 'down', f'circuit open, retry in {breaker.retry_after():.0f}s'
+
+
+PROBES = {
+    'database': probe_database,
+    'smtp': probe_smtp,
+    'razorpay': probe_razorpay,
+}
+
+
+def _run(name):
+    started = time.perf_counter()
+    try:
+        status, detail = PROBES[name]()
+    except Exception as e:
+        status, detail = 'down', str(e)[:200]
+    if status != 'ok':
+        logger.warning('Readiness probe %s is %s: %s', name, status, detail)
+    return {
+        'status': status,
+        'detail': detail,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+        'checked_at': time.time(),
+    }
+
+
+def _stale(results, ttl):
+    now = time.time()
+    return [name for name in PROBES if name not in results or now - results[name]['checked_at'] >= ttl]
+
+
+def check_readiness():
+    """
+    Return (ready, {probe: result}); results carry the probe's detail and
+    latency for logs and admin tools, not for the public endpoint.
+
+    Only the probes listed in READYZ_REQUIRED decide readiness; the others
+    are reported so a degraded dependency is visible without taking the
+    worker out of rotation.
+    """
+    app = current_app._get_current_object()
+    config = app.config
+    state = app.extensions.get('readiness')
+    if state is None or state['pid'] != os.getpid():
+        state = app.extensions['readiness'] = {'pid': os.getpid(), 'results': {}}
+
+    results = state['results']
+    ttl = config['READYZ_CACHE_SECONDS']
+
+    # Only one thread probes; the rest serve the previous results if there are any
+    if _stale(results, ttl) and _probe_lock.acquire(blocking=not results):
+        try:
+            for name in _stale(results, ttl):
+                results[name] = _run(name)
+        finally:
+            _probe_lock.release()
+
+    required = [name.strip() for name in config['READYZ_REQUIRED'].split(',') if name.strip()]
+    ready = all(results.get(name, {}).get('status') == 'ok' for name in required)
+    return ready, dict(results)
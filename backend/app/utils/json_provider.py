@@ -0,0 +1,45 @@
+"""
+orjson-backed JSON provider for Flask
+
+orjson serializes dicts, lists, datetimes and the dataclass row types from
+app.utils.rows in C, several times faster than the standard library, and
+``response`` hands its bytes to the response without a decode/encode round
+trip. Naive datetimes are written as UTC ISO 8601 ("2025-11-01T09:30:00+00:00").
+Flask's default provider treated them as UTC too, but wrote HTTP dates.
+Types orjson does not know, such as Decimal, go through Flask's default
+handler, so Decimals are still strings.
+
+Calls that pass ``json.dumps`` keyword arguments (``indent=...``) fall back
+to the standard library provider unchanged.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; create_app keeps Flask's provider without it
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Use the orjson provider when orjson is installed and JSON_PROVIDER allows it"""
+    if orjson is not None and app.config['JSON_PROVIDER'] == 'orjson':
+        app.json = ORJSONProvider(app)
@@ -0,0 +1,224 @@
+"""
+Structured, non-blocking logging
+
+Records from the ``app`` logger tree are stamped with the current request
+(id, method, path, blueprint) and pushed onto a bounded in-memory queue;
+a listener thread formats them as one JSON object per line and writes them
+to stdout. A request thread never waits on stdout, and if the queue is full
+the record is dropped and counted rather than blocking.
+
+Per-blueprint levels and sampling come from ``LOG_LEVELS`` and
+``LOG_SAMPLING``; routes decorated with ``@quiet`` (and paths listed in
+``LOG_QUIET_PATHS``) skip the access log and anything below WARNING.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import uuid
+import zlib
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'method', 'path', 'blueprint', 'quiet',
+}
+
+_state = {'pid': None, 'listener': None}
+_state_lock = threading.Lock()
+
+
+def quiet(view):
+    """Mark a route as noisy: no access log line and nothing below WARNING"""
+    view._quiet_logging = True
+    return view
+
+
+def parse_mapping(value, convert):
+    """'payment=DEBUG,public=WARNING' -> {'payment': convert('DEBUG'), ...}"""
+    result = {}
+    for item in (value or '').split(','):
+        name, _, setting = item.partition('=')
+        if name.strip() and setting.strip():
+            result[name.strip()] = convert(setting.strip())
+    return result
+
+
+def _level(name):
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f'Unknown log level: {name}')
+    return level
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key in ('request_id', 'method', 'path', 'blueprint'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamps records with request details and applies per-blueprint level,
+    sampling and per-route quieting. Runs in the thread that logged.
+    """
+
+    def __init__(self, default_level, levels, sampling):
+        super().__init__()
+        self.default_level = default_level
+        self.levels = levels
+        self.sampling = sampling
+
+    def filter(self, record):
+        if not has_request_context():
+            return record.levelno >= self.default_level
+
+        record.request_id = g.get('request_id')
+        record.method = request.method
+        record.path = request.path
+        record.blueprint = request.blueprint
+
+        if record.levelno >= logging.WARNING:
+            return record.levelno >= self.levels.get(request.blueprint, self.default_level)
+        if g.get('log_quiet'):
+            return False
+        if record.levelno < self.levels.get(request.blueprint, self.default_level):
+            return False
+        return g.get('log_sampled', True)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of waiting on a full queue"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback here, where the arguments are
+        # still valid, and ship a plain copy to the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_listener(handler):
+    """Start the stdout writer thread for this process (again after a fork)"""
+    with _state_lock:
+        if _state['pid'] == os.getpid():
+            return
+        if _state['pid'] is not None:
+            # Forked: the inherited queue's lock may have been held by the
+            # parent's listener thread, so start over with a fresh one
+            handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter())
+        listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+        listener.start()
+        _state.update(pid=os.getpid(), listener=listener)
+
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None and _state['pid'] == os.getpid():
+        listener.stop()
+        _state.update(pid=None, listener=None)
+
+
+def ensure_log_listener(app):
+    """Make sure this process has a writer thread draining the log queue"""
+    handler = app.extensions.get('log_handler')
+    if handler is not None and _state['pid'] != os.getpid():
+        _start_listener(handler)
+
+
+def configure_logging(app):
+    """Install the queue handler, request hooks and access log on ``app``"""
+    config = app.config
+    default_level = _level(config['LOG_LEVEL'])
+    levels = parse_mapping(config['LOG_LEVELS'], _level)
+    sampling = parse_mapping(config['LOG_SAMPLING'], float)
+    quiet_paths = {path.strip() for path in config['LOG_QUIET_PATHS'].split(',') if path.strip()}
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=config['LOG_QUEUE_SIZE']))
+    handler.addFilter(RequestContextFilter(default_level, levels, sampling))
+
+    root = logging.getLogger('app')
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(min([default_level, *levels.values()]))
+    root.propagate = False
+
+    app.extensions['log_handler'] = handler
+    _start_listener(handler)
+    atexit.register(_stop_listener)
+
+    access_log = logging.getLogger('app.access')
+
+    @app.before_request
+    def begin_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_started = time.perf_counter()
+
+        view = app.view_functions.get(request.endpoint)
+        g.log_quiet = request.path in quiet_paths or getattr(view, '_quiet_logging', False)
+
+        # Sample whole requests, keyed on the request id, so a kept request
+        # keeps all of its lines
+        rate = sampling.get(request.blueprint, 1.0)
+        g.log_sampled = rate >= 1 or (zlib.crc32(g.request_id.encode('utf-8')) % 10000) < rate * 10000
+
+    @app.after_request
+    def end_request_log(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        started = g.get('log_started')
+        duration_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+        level = logging.WARNING if response.status_code >= 500 else logging.INFO
+        access_log.log(level, 'request', extra={
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'remote_addr': request.remote_addr,
+        })
+        return response
+
+
+def get_log_stats(app):
+    """Queue depth and dropped-record count for this process"""
+    handler = app.extensions.get('log_handler')
+    if handler is None:
+        return {}
+    return {'queued': handler.queue.qsize(), 'dropped': handler.dropped}
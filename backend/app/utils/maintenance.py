@@ -0,0 +1,106 @@
+"""
+Scheduled database maintenance
+
+Currently purges expired rows from ``otp_verification`` in small batches.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from flask import current_app
+from app.models import OTP, JobLease
+from app.utils.background import BackgroundWorker, start_workers
+
+logger = logging.getLogger(__name__)
+
+OTP_PURGE_LEASE = 'otp-purge'
+
+_stats_lock = threading.Lock()
+
+
+def purge_expired_otps(batch_size, pause, max_batches):
+    """
+    Delete expired OTPs with DELETE TOP (n) until none are left.
+
+    Each batch commits on its own and is followed by ``pause`` seconds of
+    sleep, so OTP inserts are never blocked for long. Stops after
+    ``max_batches`` and leaves the rest for the next run.
+    """
+    started = time.monotonic()
+    deleted = batches = 0
+    # Only a short batch proves nothing expired is left; a run that stops at
+    # max_batches with a full last batch is not complete, whatever the count
+    complete = False
+    while batches < max_batches:
+        count = OTP.cleanup_expired(batch_size)
+        batches += 1
+        deleted += count
+        if count < batch_size:
+            complete = True
+            break
+        time.sleep(pause)
+    return {
+        'rows_deleted': deleted,
+        'batches': batches,
+        'duration_ms': round((time.monotonic() - started) * 1000, 1),
+        'complete': complete,
+    }
+
+
+def _record_run(app, result):
+    with _stats_lock:
+        stats = app.extensions.setdefault('otp_purge_stats', {
+            'runs': 0,
+            'rows_deleted_total': 0,
+            'batches_total': 0,
+            'last_run': None,
+        })
+        stats['runs'] += 1
+        stats['rows_deleted_total'] += result['rows_deleted']
+        stats['batches_total'] += result['batches']
+        stats['last_run'] = {'finished_at': time.time(), **result}
+
+
+def get_purge_stats(app):
+    """Purge counters for this worker process"""
+    with _stats_lock:
+        stats = app.extensions.get('otp_purge_stats')
+        return dict(stats) if stats else {'runs': 0, 'rows_deleted_total': 0, 'batches_total': 0, 'last_run': None}
+
+
+class OTPPurgeWorker(BackgroundWorker):
+    """
+    Purges expired OTPs every OTP_PURGE_INTERVAL seconds.
+
+    The lease is taken for a whole interval and not released, so however
+    many processes run this worker, one of them purges per interval.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, 'otp-purge', app.config['OTP_PURGE_INTERVAL'])
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def run_once(self):
+        config = current_app.config
+        if not JobLease.acquire(OTP_PURGE_LEASE, self.owner, int(self.interval)):
+            return False
+
+        result = purge_expired_otps(
+            config['OTP_PURGE_BATCH_SIZE'],
+            config['OTP_PURGE_PAUSE'],
+            config['OTP_PURGE_MAX_BATCHES']
+        )
+        _record_run(self.app, result)
+        if result['rows_deleted']:
+            logger.info('OTP purge: removed %s expired rows in %s batches (%sms)',
+                        result['rows_deleted'], result['batches'], result['duration_ms'])
+        return False
+
+
+def ensure_maintenance_workers(app):
+    """Start this process's maintenance workers, unless they are disabled"""
+    if not app.config['OTP_PURGE_INTERVAL']:
+        return []
+    return start_workers(app, 'maintenance_workers', lambda: [OTPPurgeWorker(app)])
@@ -0,0 +1,421 @@
+"""
+Prometheus-style metrics
+
+Counters and histograms are kept in memory per worker process and rendered
+in the Prometheus text format at ``/metrics``. Under gunicorn each worker
+also writes a JSON snapshot of its metrics to ``METRICS_DIR`` every
+``METRICS_FLUSH_INTERVAL`` seconds; whichever worker serves the scrape adds
+up its own live values and the snapshots of the other live workers, so the
+numbers cover the whole deployment. When a worker dies, its last snapshot is
+added to ``metrics-dead.json`` and kept there, as in prometheus_client's
+multiprocess mode, so the totals never go down when gunicorn replaces a
+worker. Queue depths are read from the database
+at scrape time and reused for ``METRICS_GAUGE_TTL`` seconds.
+
+Scrapes need ``Authorization: Bearer <METRICS_TOKEN>`` or an admin token in
+``X-Admin-Token``; without either the endpoint answers 401.
+
+With ``SERVER_TIMING`` on, or for requests carrying an admin token, the
+response also gets a ``Server-Timing`` header with the time spent in the
+app, the database and Razorpay for that request.
+"""
+import atexit
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_request_context, request
+from app.utils.background import BackgroundWorker, start_workers
+from app.utils.log import quiet
+
+try:
+    import fcntl
+except ImportError:  # Windows; only the gunicorn deployment runs several workers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Counters and histograms of workers that have exited, in METRICS_DIR
+DEAD_SNAPSHOT = 'metrics-dead.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help, label names)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by route and status', ('blueprint', 'route', 'method', 'status')),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency', ('blueprint', 'route', 'method')),
+    'db_transactions_total': ('counter', 'get_db_cursor blocks by outcome', ('outcome',)),
+    'db_transaction_duration_seconds': ('histogram', 'Time spent inside get_db_cursor blocks, commit included', ()),
+    'db_statements_total': ('counter', 'Statements sent to SQL Server (execute/executemany calls)', ()),
+    'smtp_connect_duration_seconds': ('histogram', 'SMTP connect, STARTTLS and login', ('outcome',)),
+    'smtp_send_duration_seconds': ('histogram', 'SMTP message delivery on a pooled session', ('outcome',)),
+    'razorpay_request_duration_seconds': ('histogram', 'Razorpay API call latency per attempt', ('endpoint', 'outcome')),
+}
+
+# Read from the database when /metrics is scraped
+GAUGES = {
+    'outbox_queue_depth': ('Outbox emails waiting to be sent', ('kind', 'status')),
+    'webhook_queue_depth': ('Webhook events waiting to be applied', ('status',)),
+    'broadcast_jobs': ('Unfinished webinar-link broadcasts', ('status',)),
+    'broadcast_recipients_remaining': ('Recipients not yet handled by running broadcasts', ()),
+}
+
+_lock = threading.Lock()
+_state = {'pid': os.getpid(), 'counters': {}, 'histograms': {}}
+
+
+def _series():
+    """This process's series, reset after a fork so workers do not inherit the parent's"""
+    if _state['pid'] != os.getpid():
+        _state.update(pid=os.getpid(), counters={}, histograms={})
+    return _state
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to a counter"""
+    key = (name, tuple(labels.get(label, '') for label in METRICS[name][2]))
+    with _lock:
+        counters = _series()['counters']
+        counters[key] = counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record one observation in a histogram"""
+    key = (name, tuple(labels.get(label, '') for label in METRICS[name][2]))
+    with _lock:
+        histograms = _series()['histograms']
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        buckets = entry[0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+                break
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def add_timing(name, seconds):
+    """Add to this request's Server-Timing entry ``name``"""
+    if has_request_context():
+        timings = g.setdefault('server_timing', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _as_snapshot(pid, counters, histograms):
+    return {
+        'pid': pid,
+        'written_at': time.time(),
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), list(entry[0]), entry[1], entry[2]]
+                       for (name, labels), entry in histograms.items()],
+    }
+
+
+def snapshot():
+    """This process's series as plain JSON-able lists"""
+    with _lock:
+        state = _series()
+        return _as_snapshot(os.getpid(), state['counters'], state['histograms'])
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def _write_json(path, data):
+    """Atomically replace ``path``"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_snapshot(directory):
+    """Atomically replace this process's snapshot file"""
+    _write_json(_snapshot_path(directory, os.getpid()), snapshot())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _directory_lock(directory):
+    """Serialise changes to the dead-workers file between processes"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def fold_dead(directory, paths):
+    """
+    Add the snapshots at ``paths``, left by workers that have exited, to the
+    dead-workers file and remove them.
+    """
+    dead_path = os.path.join(directory, DEAD_SNAPSHOT)
+    with _directory_lock(directory):
+        # Another worker may have folded some of them since they were listed
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return
+        snapshots = []
+        for path in [dead_path] + paths:
+            try:
+                snapshots.append(_read_json(path))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                logger.warning('Skipping unreadable metrics snapshot %s: %s', path, e)
+        counters, histograms = merge(snapshots)
+        _write_json(dead_path, _as_snapshot(None, counters, histograms))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_snapshots(directory):
+    """
+    Snapshots of the other live workers, plus the dead-workers file. Files
+    left by dead workers are folded into the latter first.
+    """
+    snapshots, dead = [], []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if not _alive(pid):
+            dead.append(path)
+            continue
+        try:
+            snapshots.append(_read_json(path))
+        except (OSError, ValueError):
+            # Being replaced right now; it will be there on the next scrape
+            continue
+
+    if dead:
+        fold_dead(directory, dead)
+    try:
+        snapshots.append(_read_json(os.path.join(directory, DEAD_SNAPSHOT)))
+    except (OSError, ValueError):
+        pass
+    return snapshots
+
+
+def merge(snapshots):
+    """Add up counters and histograms from several snapshots"""
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snap['histograms']:
+            key = (name, tuple(labels))
+            entry = histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+            entry[1] += total
+            entry[2] += count
+    return counters, histograms
+
+
+def collect_gauges():
+    """Queue depths from the database: {name: {labels: value}}"""
+    from app.models import BroadcastJob, EmailOutbox, WebhookEvent
+
+    gauges = {name: {} for name in GAUGES}
+    for kind, statuses in EmailOutbox.get_queue_depth().items():
+        for status, count in statuses.items():
+            gauges['outbox_queue_depth'][(kind, status)] = count
+    for status, count in WebhookEvent.get_stats().items():
+        if status in ('pending', 'processing'):
+            gauges['webhook_queue_depth'][(status,)] = count
+    depth = BroadcastJob.get_queue_depth()
+    for status, count in depth['jobs'].items():
+        gauges['broadcast_jobs'][(status,)] = count
+    gauges['broadcast_recipients_remaining'][()] = depth['remaining']
+    return gauges
+
+
+def cached_gauges(app):
+    """``collect_gauges``, reused for METRICS_GAUGE_TTL seconds per process"""
+    cached = app.extensions.get('metrics_gauges')
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    gauges = collect_gauges()
+    app.extensions['metrics_gauges'] = (now + app.config['METRICS_GAUGE_TTL'], gauges)
+    return gauges
+
+
+def _is_admin():
+    from app.routes.auth import ADMIN_SECRET_KEY
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(token, ADMIN_SECRET_KEY)
+
+
+def _authorized():
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return _is_admin()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, gauges):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+            continue
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {count}')
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(label_names, labels)} {count}')
+
+    for name, (help_text, label_names) in GAUGES.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in sorted(gauges.get(name, {}).items()):
+            lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    config = current_app.config
+    if not _authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    snapshots = [snapshot()]
+    if config['METRICS_DIR']:
+        snapshots += read_snapshots(config['METRICS_DIR'])
+    counters, histograms = merge(snapshots)
+
+    try:
+        gauges = cached_gauges(current_app._get_current_object())
+    except Exception as e:
+        # Latency series are still worth serving while the database is down
+        logger.warning('Could not read queue depths for /metrics: %s', e)
+        gauges = {}
+
+    return Response(render(counters, histograms, gauges), mimetype='text/plain; version=0.0.4')
+
+
+class MetricsSnapshotWriter(BackgroundWorker):
+    """Writes this worker's snapshot to METRICS_DIR for the other workers to read"""
+
+    def __init__(self, app):
+        super().__init__(app, 'metrics-writer', app.config['METRICS_FLUSH_INTERVAL'])
+        self.directory = app.config['METRICS_DIR']
+
+    def run_once(self):
+        write_snapshot(self.directory)
+        return False
+
+
+def ensure_metrics_writer(app):
+    """Start this process's snapshot writer when metrics are shared through METRICS_DIR"""
+    if not app.config['METRICS_ENABLED'] or not app.config['METRICS_DIR']:
+        return []
+    directory = app.config['METRICS_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    def build():
+        pid = os.getpid()
+
+        def final_snapshot():
+            # Increments since the last flush would be lost when the worker exits
+            if os.getpid() == pid:
+                write_snapshot(directory)
+
+        atexit.register(final_snapshot)
+        return [MetricsSnapshotWriter(app)]
+
+    return start_workers(app, 'metrics_writer', build)
+
+
+def init_metrics(app):
+    """Register the request timing hooks and the /metrics endpoint"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def begin_request_timing():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def end_request_timing(response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if rule != '/metrics':
+            blueprint = request.blueprint or ''
+            observe('http_request_duration_seconds', elapsed,
+                    blueprint=blueprint, route=rule, method=request.method)
+            inc('http_requests_total', blueprint=blueprint, route=rule,
+                method=request.method, status=str(response.status_code))
+
+        if not (app.config['SERVER_TIMING'] or _is_admin()):
+            return response
+        timings = [f'app;dur={elapsed * 1000:.1f}']
+        for name, seconds in g.get('server_timing', {}).items():
+            timings.append(f'{name};dur={seconds * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', quiet(metrics_view))
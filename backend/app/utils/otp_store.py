@@ -0,0 +1,211 @@
+"""
+Pluggable storage for email OTPs
+
+``OTP_STORE`` selects the backend:
+
+- ``sql``: the ``otp_verification`` table (default)
+- ``memory``: a dict in this process; only for a single worker, and
+  gunicorn.conf.py refuses to start more than one with it
+- ``redis``: a Redis-compatible server at ``REDIS_URL``, shared by all workers
+
+The key-value backends rely on native expiry, so OTP traffic stops writing
+to (and fragmenting) the primary database.
+"""
+import os
+import threading
+import time
+from flask import current_app
+from app.models import OTP
+
+try:
+    import redis
+except ImportError:  # only needed for OTP_STORE=redis
+    redis = None
+
+_store_lock = threading.Lock()
+
+# Outcomes of OTPStore.verify
+VERIFIED = 'verified'
+INVALID = 'invalid'
+LOCKED = 'locked'
+MISSING = 'missing'
+
+
+class OTPStore:
+    """Interface every backend implements"""
+
+    def save(self, email, otp, ttl_seconds):
+        """Store a new OTP for ``email``, replacing any previous one"""
+        raise NotImplementedError
+
+    def verify(self, email, otp, max_attempts):
+        """
+        Atomically check ``otp`` and record the attempt.
+
+        Returns (outcome, remaining_attempts). A matching code, or any code
+        once ``max_attempts`` failures have been recorded, consumes the OTP;
+        a wrong code counts one more failure.
+        """
+        raise NotImplementedError
+
+
+def _outcome(attempts, matched, max_attempts):
+    """Outcome for an OTP that had ``attempts`` failures before this try"""
+    if attempts >= max_attempts:
+        return LOCKED, 0
+    if matched:
+        return VERIFIED, max_attempts - attempts
+    return INVALID, max_attempts - (attempts + 1)
+
+
+class SQLOTPStore(OTPStore):
+    """The original SQL Server table, via the OTP model"""
+
+    def save(self, email, otp, ttl_seconds):
+        OTP.create(email, otp, ttl_seconds / 60)
+
+    def verify(self, email, otp, max_attempts):
+        result = OTP.verify(email, otp, max_attempts)
+        if result is None:
+            return MISSING, 0
+        action, attempts, matched = result
+        if action == 'UPDATE':
+            # The output carries the incremented count
+            return INVALID, max(0, max_attempts - attempts)
+        return _outcome(attempts, matched, max_attempts)
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    Process-local store with expiry.
+
+    Expired entries are dropped when they are read, and swept every
+    ``sweep_every`` saves so abandoned ones do not pile up.
+    """
+
+    def __init__(self, sweep_every=256):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._sweep_every = sweep_every
+        self._saves = 0
+
+    def _live(self, email, now):
+        entry = self._entries.get(email)
+        if entry is not None and entry['expires_at'] <= now:
+            del self._entries[email]
+            return None
+        return entry
+
+    def save(self, email, otp, ttl_seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[email] = {'otp': otp, 'attempts': 0, 'expires_at': now + ttl_seconds}
+            self._saves += 1
+            if self._saves % self._sweep_every == 0:
+                self._sweep(now)
+
+    def verify(self, email, otp, max_attempts):
+        with self._lock:
+            entry = self._live(email, time.monotonic())
+            if entry is None:
+                return MISSING, 0
+            outcome = _outcome(entry['attempts'], entry['otp'] == otp, max_attempts)
+            if outcome[0] == INVALID:
+                entry['attempts'] += 1
+            else:
+                del self._entries[email]
+            return outcome
+
+    def _sweep(self, now):
+        expired = [email for email, entry in self._entries.items() if entry['expires_at'] <= now]
+        for email in expired:
+            del self._entries[email]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisOTPStore(OTPStore):
+    """
+    One hash per email (``otp``, ``attempts``) with a key TTL.
+
+    Works with any redis-py compatible client, including fakeredis.
+    """
+
+    def __init__(self, client, prefix='otp:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, email):
+        return f'{self.prefix}{email}'
+
+    def save(self, email, otp, ttl_seconds):
+        key = self._key(email)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping={'otp': otp, 'attempts': 0})
+        pipe.expire(key, max(1, int(ttl_seconds)))
+        pipe.execute()
+
+    def verify(self, email, otp, max_attempts):
+        key = self._key(email)
+        # Optimistic transaction: if another request touches the key between
+        # the read and EXEC, the EXEC is aborted and the check is redone
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    entry = pipe.hgetall(key)
+                    if not entry:
+                        pipe.unwatch()
+                        return MISSING, 0
+                    stored = _text(entry.get(b'otp', entry.get('otp')))
+                    attempts = int(entry.get(b'attempts', entry.get('attempts', 0)))
+                    outcome = _outcome(attempts, stored == otp, max_attempts)
+
+                    pipe.multi()
+                    if outcome[0] == INVALID:
+                        pipe.hincrby(key, 'attempts', 1)
+                    else:
+                        pipe.delete(key)
+                    pipe.execute()
+                    return outcome
+                except redis.WatchError:
+                    continue
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def create_otp_store(config):
+    """Build the backend named by ``OTP_STORE``"""
+    backend = config['OTP_STORE']
+    if backend == 'sql':
+        return SQLOTPStore()
+    if backend == 'memory':
+        return MemoryOTPStore()
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError('OTP_STORE=redis needs the redis package (pip install redis)')
+        return RedisOTPStore(redis.Redis.from_url(config['REDIS_URL']), prefix=config['OTP_REDIS_PREFIX'])
+    raise ValueError(f'Unknown OTP_STORE: {backend}')
+
+
+def get_otp_store():
+    """Return this process's OTP store, creating it on first use"""
+    app = current_app._get_current_object()
+    state = app.extensions.get('otp_store')
+
+    if state is None or state['pid'] != os.getpid():
+        with _store_lock:
+            state = app.extensions.get('otp_store')
+            if state is None or state['pid'] != os.getpid():
+                state = {'pid': os.getpid(), 'store': create_otp_store(app.config)}
+                app.extensions['otp_store'] = state
+    return state['store']
+
+
+def set_otp_store(app, store):
+    """Install a ready-made store, e.g. a RedisOTPStore over fakeredis in tests"""
+    app.extensions['otp_store'] = {'pid': os.getpid(), 'store': store}
@@ -0,0 +1,118 @@
+"""
+Durable outbox for transactional emails
+
+HTTP handlers call ``enqueue_email`` and return; worker threads in each
+gunicorn process drain the ``email_outbox`` table and do the SMTP work.
+
+Payloads of SECRET_KINDS (the OTP) are emptied once the message is sent or
+given up on, and such messages carry an expiry after which they are dropped
+unsent, so one-time codes do not stay readable in the table.
+"""
+import json
+import logging
+import random
+from flask import current_app
+from app.database import close_db_connection
+from app.models import EmailOutbox
+from app.utils.background import BackgroundWorker, start_workers
+from app.utils.email_service import send_email_otp, send_confirmation_email
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are sent first; OTP workers only ever look at priority 0
+PRIORITY_OTP = 0
+PRIORITY_TRANSACTIONAL = 5
+
+# Kinds whose payload is a secret, emptied once the message is done with
+SECRET_KINDS = {'otp'}
+
+# kind -> callable(payload) that performs the actual send
+SENDERS = {
+    'otp': lambda p: send_email_otp(p['email'], p['otp']),
+    'confirmation': lambda p: send_confirmation_email(
+        p['email'], p['name'], p['payment_id'], p['order_id'],
+        p['webinar_date'], p['webinar_time']
+    ),
+}
+
+
+def enqueue_email(kind, recipient, payload, dedupe_key, priority=PRIORITY_TRANSACTIONAL, expires_in=None):
+    """
+    Queue an email for background delivery and wake this process's workers.
+
+    Returns the outbox message id. Enqueueing the same ``dedupe_key`` twice
+    returns the existing message instead of sending a duplicate. A message
+    still unsent after ``expires_in`` seconds is dropped.
+    """
+    if kind not in SENDERS:
+        raise ValueError(f'Unknown email kind: {kind}')
+
+    message_id, created = EmailOutbox.enqueue(kind, recipient, json.dumps(payload), dedupe_key, priority, expires_in)
+    if created:
+        for worker in ensure_outbox_workers(current_app._get_current_object()):
+            if worker.max_priority >= priority:
+                worker.wake()
+    return message_id
+
+
+def retry_delay(attempts, base, cap):
+    """Exponential backoff with full jitter, in seconds"""
+    return random.uniform(base, min(cap, base * 2 ** (attempts - 1)))
+
+
+class OutboxWorker(BackgroundWorker):
+    """
+    Claims due messages up to ``max_priority`` and sends them.
+
+    The lease only has to cover one send: before each message the leases of
+    the ones still waiting in the batch are renewed, so a slow SMTP server
+    does not let another worker claim and send them again. No database
+    connection is held while talking to SMTP.
+    """
+
+    def __init__(self, app, name, max_priority):
+        super().__init__(app, name, app.config['OUTBOX_POLL_INTERVAL'])
+        self.max_priority = max_priority
+
+    def run_once(self):
+        config = current_app.config
+        lease = config['OUTBOX_LEASE_SECONDS']
+        messages = EmailOutbox.claim(config['OUTBOX_BATCH_SIZE'], self.max_priority, lease)
+
+        for index, message in enumerate(messages):
+            if index:
+                EmailOutbox.renew([m['id'] for m in messages[index:]], lease)
+            close_db_connection()
+            redact = message['kind'] in SECRET_KINDS
+            try:
+                SENDERS[message['kind']](json.loads(message['payload']))
+            except Exception as e:
+                if message['attempts'] >= config['OUTBOX_MAX_ATTEMPTS']:
+                    logger.error('Outbox: giving up on message %s to %s: %s', message['id'], message['recipient'], e)
+                    EmailOutbox.mark_failed(message['id'], e, redact=redact)
+                else:
+                    delay = retry_delay(message['attempts'], config['OUTBOX_RETRY_BASE'], config['OUTBOX_RETRY_MAX'])
+                    logger.warning('Outbox: message %s failed (attempt %s), retrying in %.0fs: %s',
+                                   message['id'], message['attempts'], delay, e)
+                    EmailOutbox.mark_failed(message['id'], e, retry_in=delay)
+            else:
+                EmailOutbox.mark_sent(message['id'], redact=redact)
+
+        return len(messages) == config['OUTBOX_BATCH_SIZE']
+
+
+def ensure_outbox_workers(app):
+    """Start this process's outbox workers if they are not running yet"""
+    def build():
+        config = app.config
+        workers = [
+            OutboxWorker(app, f'outbox-otp-{i}', PRIORITY_OTP)
+            for i in range(config['OUTBOX_PRIORITY_WORKERS'])
+        ]
+        workers += [
+            OutboxWorker(app, f'outbox-{i}', 255)
+            for i in range(config['OUTBOX_WORKERS'])
+        ]
+        return workers
+
+    return start_workers(app, 'outbox_workers', build)
@@ -1,13 +1,10 @@
 import hmac
 import hashlib
-import base64
-import requests
 from flask import current_app
+from app.utils.razorpay_client import get_razorpay_client
 
 def create_razorpay_order(amount, currency='INR', receipt=None, notes=None):
     """Create a Razorpay order"""
-    config = current_app.config
-    
     if receipt is None:
         from datetime import datetime
         receipt = f"webinar_{int(datetime.now().timestamp())}"
@@ -22,26 +19,7 @@ def create_razorpay_order(amount, currency='INR', receipt=None, notes=None):
         'notes': notes
     }
     
-    auth_string = f"{config['RAZORPAY_KEY_ID']}:{config['RAZORPAY_KEY_SECRET']}"
-    auth_bytes = auth_string.encode('utf-8')
-    auth_b64 = base64.b64encode(auth_bytes).decode('utf-8')
-    
-    response = requests.post(
-        'https://api.razorpay.com/v1/orders',
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f'Basic {auth_b64}'
-        },
-        json=order_data
-    )
-    
-    order = response.json()
-    
-    if not response.ok:
-        error_msg = order.get('error', {}).get('description', 'Failed to create order')
-        raise Exception(error_msg)
-    
-    return order
+    return get_razorpay_client().create_order(order_data)
 
 def verify_razorpay_signature(order_id, payment_id, signature):
     """Verify Razorpay payment signature"""
@@ -0,0 +1,300 @@
+"""
+Token-bucket throttling and load shedding for public endpoints
+
+Each limited route gets a bucket per client IP and per email address.
+Buckets live in a store shared by all gunicorn workers (Redis) or, with
+``RATE_LIMIT_STORE=memory``, in each process. A key that has been denied
+is also remembered locally until its retry time, so repeat offenders are
+turned away without another round-trip. All of this runs before the view,
+so a rejected request never reaches the database or SES.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+
+try:
+    import redis
+except ImportError:  # only needed for RATE_LIMIT_STORE=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_limiter_lock = threading.Lock()
+
+
+def parse_limit(value):
+    """'3/600' -> (capacity 3, refill rate 3/600 tokens per second)"""
+    count, _, seconds = str(value).partition('/')
+    capacity = int(count)
+    return capacity, capacity / float(seconds or 1)
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict; limits apply per process"""
+
+    def __init__(self, sweep_every=1024):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._sweep_every = sweep_every
+        self._calls = 0
+
+    def consume(self, buckets):
+        """
+        Take one token from every (key, capacity, rate) bucket, or from none.
+        Returns the seconds each bucket needs before it has a token; all
+        zeros means the tokens were taken.
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = []
+            for key, capacity, rate in buckets:
+                tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+                states.append(min(capacity, tokens + (now - updated) * rate))
+
+            waits = [0 if tokens >= 1 else (1 - tokens) / rate
+                     for tokens, (_, _, rate) in zip(states, buckets)]
+            if any(waits):
+                return waits
+
+            for tokens, (key, capacity, rate) in zip(states, buckets):
+                tokens -= 1
+                # Remember when the bucket will be full again; after that it
+                # carries no state and can be dropped
+                self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+            self._calls += 1
+            if self._calls % self._sweep_every == 0:
+                self._sweep(now)
+
+        return waits
+
+    def _sweep(self, now):
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+
+
+class RedisBucketStore:
+    """
+    Token buckets in Redis, shared by every worker.
+
+    Each bucket is a hash (``tokens``, ``ts``). All buckets of a request are
+    read under one WATCH and written in one MULTI, with a TTL of one full
+    refill so idle buckets disappear on their own.
+    """
+
+    def __init__(self, client, prefix='rl:'):
+        self.client = client
+        self.prefix = prefix
+
+    def consume(self, buckets):
+        keys = [self.prefix + key for key, _, _ in buckets]
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    now = time.time()
+                    states = []
+                    for key, (_, capacity, rate) in zip(keys, buckets):
+                        state = pipe.hgetall(key)
+                        tokens = float(state.get(b'tokens', state.get('tokens', capacity)))
+                        updated = float(state.get(b'ts', state.get('ts', now)))
+                        states.append(min(capacity, tokens + max(0.0, now - updated) * rate))
+
+                    waits = [0 if tokens >= 1 else (1 - tokens) / rate
+                             for tokens, (_, _, rate) in zip(states, buckets)]
+                    if any(waits):
+                        pipe.unwatch()
+                        return waits
+
+                    pipe.multi()
+                    for key, tokens, (_, capacity, rate) in zip(keys, states, buckets):
+                        pipe.hset(key, mapping={'tokens': tokens - 1, 'ts': now})
+                        pipe.expire(key, max(1, math.ceil(capacity / rate)))
+                    pipe.execute()
+                    return waits
+                except redis.WatchError:
+                    continue
+
+
+class RateLimiter:
+    """Buckets, the local deny cache, the in-flight limit and counters for one process"""
+
+    def __init__(self, store, max_inflight):
+        self.store = store
+        self.pid = os.getpid()
+        self._denied = {}
+        self._inflight = threading.BoundedSemaphore(max_inflight) if max_inflight else None
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def check(self, scope, keys):
+        """
+        Consume a token from every (kind, value, limit) bucket in ``keys``,
+        or from none of them when any is empty. Returns 0 when allowed, else
+        the seconds the client should wait.
+        """
+        now = time.monotonic()
+        buckets = []
+        for kind, value, limit in keys:
+            bucket = f'{scope}:{kind}:{value}'
+
+            until = self._denied.get(bucket)
+            if until is not None:
+                if until > now:
+                    self.count(f'{scope}.rejected_local')
+                    self.count(f'{scope}.throttled.{kind}')
+                    return until - now
+                self._denied.pop(bucket, None)
+
+            capacity, rate = limit
+            buckets.append((bucket, capacity, rate))
+
+        try:
+            waits = self.store.consume(buckets)
+        except Exception as e:
+            # Fail open: a broken limiter must not take the site down
+            self.count('store_errors')
+            logger.warning('Rate limit store error (%s): %s', scope, e)
+            return 0
+
+        if any(waits):
+            with self._lock:
+                if len(self._denied) > 10000:
+                    self._denied = {k: v for k, v in self._denied.items() if v > now}
+                for (bucket, _, _), wait in zip(buckets, waits):
+                    if wait:
+                        self._denied[bucket] = now + wait
+            for (kind, _, _), wait in zip(keys, waits):
+                if wait:
+                    self.count(f'{scope}.throttled.{kind}')
+            return max(waits)
+
+        self.count(f'{scope}.allowed')
+        return 0
+
+    def try_enter(self):
+        if self._inflight is None:
+            return True
+        return self._inflight.acquire(blocking=False)
+
+    def leave(self):
+        if self._inflight is not None:
+            self._inflight.release()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'store': type(self.store).__name__,
+            'denied_keys_cached': len(self._denied),
+            'counters': counters,
+        }
+
+
+def create_limiter(config):
+    backend = config['RATE_LIMIT_STORE']
+    if backend == 'memory':
+        store = MemoryBucketStore()
+    elif backend == 'redis':
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORE=redis needs the redis package (pip install redis)')
+        store = RedisBucketStore(redis.Redis.from_url(config['REDIS_URL']), config['RATE_LIMIT_REDIS_PREFIX'])
+    else:
+        raise ValueError(f'Unknown RATE_LIMIT_STORE: {backend}')
+    return RateLimiter(store, config['OTP_MAX_INFLIGHT'])
+
+
+def get_limiter():
+    """Return this process's rate limiter, creating it on first use"""
+    app = current_app._get_current_object()
+    limiter = app.extensions.get('rate_limiter')
+
+    if limiter is None or limiter.pid != os.getpid():
+        with _limiter_lock:
+            limiter = app.extensions.get('rate_limiter')
+            if limiter is None or limiter.pid != os.getpid():
+                limiter = create_limiter(app.config)
+                app.extensions['rate_limiter'] = limiter
+    return limiter
+
+
+def client_ip():
+    """
+    Client address as seen by the outermost of RATE_LIMIT_PROXY_COUNT proxies.
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so only the last RATE_LIMIT_PROXY_COUNT entries were
+    written by proxies we run; anything before them came from the client
+    and may be forged.
+    """
+    hops = current_app.config['RATE_LIMIT_PROXY_COUNT']
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    if forwarded and not hops and not current_app.extensions.get('rate_limit_proxy_warned'):
+        # Behind a proxy remote_addr is the proxy, so all clients share a bucket
+        current_app.extensions['rate_limit_proxy_warned'] = True
+        logger.warning('Request has X-Forwarded-For but RATE_LIMIT_PROXY_COUNT is 0; '
+                       'all clients behind the proxy share one per-IP rate limit. '
+                       'Set RATE_LIMIT_PROXY_COUNT to the number of proxies in front of the app.')
+    route = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    if hops and len(route) >= hops:
+        return route[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def _retry_response(status, seconds, message):
+    seconds = max(1, math.ceil(seconds))
+    response = jsonify({
+        'success': False,
+        'message': message.format(seconds=seconds)
+    })
+    response.status_code = status
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limited(scope, email_limit, ip_limit):
+    """
+    Throttle a view by client IP and by the JSON body's ``email``.
+
+    ``email_limit`` and ``ip_limit`` name config keys holding 'count/seconds'
+    limits. Over-limit requests get 429 with Retry-After; when more than
+    OTP_MAX_INFLIGHT of these requests are already running in this process
+    the request is shed with 503.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if not config['RATE_LIMIT_ENABLED']:
+                return view(*args, **kwargs)
+
+            limiter = get_limiter()
+            keys = [('ip', client_ip(), parse_limit(config[ip_limit]))]
+            data = request.get_json(silent=True)
+            email = data.get('email') if isinstance(data, dict) else None
+            if isinstance(email, str) and email.strip():
+                keys.append(('email', email.strip().lower(), parse_limit(config[email_limit])))
+
+            retry_after = limiter.check(scope, keys)
+            if retry_after:
+                return _retry_response(429, retry_after, 'Too many requests. Please try again in {seconds} seconds.')
+
+            if not limiter.try_enter():
+                limiter.count(f'{scope}.shed')
+                return _retry_response(503, 1, 'Server is busy. Please try again in a moment.')
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.leave()
+
+        return wrapper
+    return decorator
@@ -0,0 +1,368 @@
+"""
+Shared HTTP client for the Razorpay REST API
+
+One ``requests.Session`` per worker process keeps TLS connections to
+api.razorpay.com alive between calls. Every request has connect/read
+timeouts; idempotent calls are retried with jittered backoff, and a circuit
+breaker fails fast while Razorpay is erroring so workers are not tied up
+waiting on it.
+"""
+import base64
+import os
+import random
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from app.utils.metrics import add_timing, observe
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Responses worth retrying (on idempotent calls only)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Latency samples kept per endpoint for percentiles
+LATENCY_WINDOW = 512
+
+_client_lock = threading.Lock()
+
+
+class RazorpayError(Exception):
+    """Razorpay returned an error or could not be reached"""
+
+    def __init__(self, message, status=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.payload = payload
+
+
+class RazorpayUnavailable(RazorpayError):
+    """The circuit breaker is open; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    ``threshold`` consecutive failures open the circuit for ``reset_timeout``
+    seconds; after that a single trial call is let through and its outcome
+    closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def retry_after(self):
+        """Seconds until the next trial call is allowed"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class _EndpointStats:
+    __slots__ = ('name', 'calls', 'errors', 'retries', 'total', 'max', 'samples')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': round(self.total / self.calls * 1000, 1) if self.calls else None,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(self.max * 1000, 1),
+        }
+
+
+class RazorpayClient:
+    """Thread-safe Razorpay API client backed by a pooled keep-alive session"""
+
+    def __init__(self, key_id, key_secret, base_url='https://api.razorpay.com/v1',
+                 connect_timeout=3.05, read_timeout=10, pool_size=10, max_retries=2,
+                 backoff=0.25, breaker_threshold=5, breaker_reset=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.pid = os.getpid()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Basic auth is encoded once, not on every call
+        token = base64.b64encode(f'{key_id}:{key_secret}'.encode('utf-8')).decode('ascii')
+        self.session.headers.update({
+            'Authorization': f'Basic {token}',
+            'Content-Type': 'application/json',
+        })
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def create_order(self, order_data):
+        return self.request('POST', '/orders', json=order_data)
+
+    def fetch_order(self, order_id):
+        return self.request('GET', f'/orders/{order_id}', endpoint='/orders/{id}')
+
+    def fetch_payment(self, payment_id):
+        return self.request('GET', f'/payments/{payment_id}', endpoint='/payments/{id}')
+
+    def iter_collection(self, path, start, end, page_size=100):
+        """
+        Yield every entity of a list endpoint (``/payments``, ``/orders``)
+        created between the ``start`` and ``end`` unix timestamps.
+        """
+        skip = 0
+        while True:
+            page = self.request('GET', path, params={
+                'from': int(start),
+                'to': int(end),
+                'count': page_size,
+                'skip': skip,
+            })
+            items = page.get('items') or []
+            yield from items
+            if len(items) < page_size:
+                return
+            skip += len(items)
+
+    def request(self, method, path, json=None, params=None, endpoint=None, idempotent=None):
+        """
+        Call the API and return the decoded JSON body.
+
+        Idempotent calls are retried on connection errors, timeouts, 429 and
+        5xx responses. Non-idempotent calls (order creation) are only retried
+        when the connection could not be opened, since then the request never
+        reached Razorpay.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        stats = self._endpoint(f'{method} {endpoint or path}')
+        url = self.base_url + path
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._record(stats, 0.0, error=True, rejected=True)
+                raise RazorpayUnavailable(
+                    f'Razorpay is unavailable, retry in {self.breaker.retry_after():.0f}s'
+                )
+
+            started = time.perf_counter()
+            response = None
+            # The breaker hears about every attempt exactly once, in the
+            # finally, so a half-open trial is always settled
+            healthy = False
+            retry = False
+            try:
+                try:
+                    response = self.session.request(method, url, json=json, params=params, timeout=self.timeout)
+                except requests.exceptions.ConnectTimeout as e:
+                    error, retryable = e, True
+                except requests.exceptions.ConnectionError as e:
+                    # Covers refused connections and resets mid-request; only the
+                    # former is known not to have reached the server
+                    error, retryable = e, idempotent or _never_sent(e)
+                except requests.exceptions.Timeout as e:
+                    error, retryable = e, idempotent
+                except requests.exceptions.RequestException as e:
+                    # Broken response bodies, redirect loops and the like
+                    error, retryable = e, False
+                else:
+                    elapsed = time.perf_counter() - started
+                    if response.status_code >= 500 or response.status_code == 429:
+                        if idempotent and response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                            self._record(stats, elapsed, error=True, retry=True)
+                            retry = True
+                        else:
+                            self._record(stats, elapsed, error=True)
+                            raise _error_from(response)
+                    elif not response.ok:
+                        # A 4xx is Razorpay answering; the request was at fault
+                        healthy = True
+                        self._record(stats, elapsed, error=True)
+                        raise _error_from(response)
+                    else:
+                        try:
+                            body = response.json()
+                        except ValueError as e:
+                            self._record(stats, elapsed, error=True)
+                            raise RazorpayError(
+                                f'Razorpay returned a non-JSON body (HTTP {response.status_code})',
+                                status=response.status_code
+                            ) from e
+                        healthy = True
+                        self._record(stats, elapsed)
+                        return body
+
+                if not retry:
+                    elapsed = time.perf_counter() - started
+                    if retryable and attempt < self.max_retries:
+                        self._record(stats, elapsed, error=True, retry=True)
+                        retry = True
+                    else:
+                        self._record(stats, elapsed, error=True)
+                        raise RazorpayError(f'Razorpay request failed: {error}') from error
+            finally:
+                if healthy:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+
+            attempt += 1
+            self._sleep(attempt, response)
+
+    def _sleep(self, attempt, response=None):
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), 5))
+        time.sleep(delay)
+
+    def _endpoint(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(name, _EndpointStats(name))
+        return stats
+
+    def _record(self, stats, elapsed, error=False, retry=False, rejected=False):
+        outcome = 'rejected' if rejected else 'error' if error else 'ok'
+        observe('razorpay_request_duration_seconds', elapsed, endpoint=stats.name, outcome=outcome)
+        add_timing('razorpay', elapsed)
+        with self._stats_lock:
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            stats.samples.append(elapsed)
+            if error:
+                stats.errors += 1
+            if retry:
+                stats.retries += 1
+
+    def stats(self):
+        """Latency and error counters per endpoint, plus breaker state"""
+        with self._stats_lock:
+            endpoints = {name: stats.snapshot() for name, stats in self._stats.items()}
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'circuit_opens': self.breaker.opens,
+            'endpoints': endpoints,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def _never_sent(error):
+    """True if a ConnectionError happened while opening the connection"""
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return 'NewConnectionError' in type(reason).__name__ or 'Connection refused' in str(reason)
+
+
+def _error_from(response):
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    description = (payload.get('error') or {}).get('description') if isinstance(payload, dict) else None
+    return RazorpayError(
+        description or f'Razorpay returned HTTP {response.status_code}',
+        status=response.status_code,
+        payload=payload
+    )
+
+
+def get_razorpay_client():
+    """Return this process's Razorpay client, creating it on first use"""
+    app = current_app._get_current_object()
+    client = app.extensions.get('razorpay_client')
+
+    if client is None or client.pid != os.getpid():
+        with _client_lock:
+            client = app.extensions.get('razorpay_client')
+            if client is None or client.pid != os.getpid():
+                config = app.config
+                client = RazorpayClient(
+                    config['RAZORPAY_KEY_ID'],
+                    config['RAZORPAY_KEY_SECRET'],
+                    base_url=config['RAZORPAY_API_BASE'],
+                    connect_timeout=config['RAZORPAY_CONNECT_TIMEOUT'],
+                    read_timeout=config['RAZORPAY_READ_TIMEOUT'],
+                    pool_size=config['RAZORPAY_POOL_SIZE'],
+                    max_retries=config['RAZORPAY_MAX_RETRIES'],
+                    backoff=config['RAZORPAY_RETRY_BACKOFF'],
+                    breaker_threshold=config['RAZORPAY_BREAKER_THRESHOLD'],
+                    breaker_reset=config['RAZORPAY_BREAKER_RESET'],
+                )
+                app.extensions['razorpay_client'] = client
+    return client
@@ -0,0 +1,284 @@
+"""
+Reconciliation of local payment records against Razorpay
+
+Pages through the orders and payments Razorpay has for a time window, diffs
+them against the ``payments`` and ``registrations`` tables and, when asked,
+applies the safe corrections in bulk. Anything that needs a human (money
+taken twice, a local success Razorpay never captured, a paid order whose
+notes lack the email or phone to register it) is only reported.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from app.database import close_db_connection
+from app.models import Payment, JobLease
+from app.utils.background import BackgroundWorker, start_workers
+from app.utils.razorpay_client import RazorpayError, get_razorpay_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'reconcile'
+# Held for RECONCILE_INTERVAL after a successful run so the other workers skip
+COOLDOWN_LEASE_NAME = 'reconcile:cooldown'
+
+# Payments can be made some time after their order was created
+PAYMENT_WINDOW_SLACK = timedelta(hours=1)
+
+# Mismatch kinds, in report order. Only the first three are fixed automatically.
+CAPTURED_PENDING = 'captured_but_pending'
+PAID_NO_REGISTRATION = 'paid_but_no_registration'
+FAILED_PENDING = 'failed_but_pending'
+DUPLICATE_PAYMENT = 'duplicate_payment'
+AMOUNT_MISMATCH = 'amount_mismatch'
+SUCCESS_NOT_CAPTURED = 'success_but_not_captured'
+
+MISMATCH_KINDS = [
+    CAPTURED_PENDING, PAID_NO_REGISTRATION, FAILED_PENDING,
+    DUPLICATE_PAYMENT, AMOUNT_MISMATCH, SUCCESS_NOT_CAPTURED,
+]
+
+
+def _timestamp(value):
+    return int(time.mktime(value.timetuple()))
+
+
+def _registration_data(order, payment):
+    """Rebuild registration fields from what checkout sent to Razorpay"""
+    notes = {**(order.get('notes') or {}), **(payment.get('notes') or {})}
+    return {
+        'fullName': notes.get('customer_name') or '',
+        'email': payment.get('email') or notes.get('customer_email') or notes.get('email'),
+        'phone': notes.get('customer_phone') or payment.get('contact'),
+        'whatsappNumber': None,
+        'city': notes.get('city'),
+        'state': '',
+        'businessName': '',
+        'businessType': notes.get('category', ''),
+        'experienceLevel': ''
+    }
+
+
+def fetch_remote(client, start, end, page_size=100):
+    """
+    Razorpay orders created in the window and their payments, plus the ids
+    of every order with a payment captured in the window, whenever the
+    order itself was created.
+    """
+    orders = {
+        order['id']: order
+        for order in client.iter_collection('/orders', _timestamp(start), _timestamp(end), page_size)
+    }
+    payments = {}
+    captured_orders = set()
+    for payment in client.iter_collection(
+        '/payments', _timestamp(start), _timestamp(end + PAYMENT_WINDOW_SLACK), page_size
+    ):
+        if payment.get('status') == 'captured' and payment.get('order_id'):
+            captured_orders.add(payment['order_id'])
+        if payment.get('order_id') in orders:
+            payments.setdefault(payment['order_id'], []).append(payment)
+    return orders, payments, captured_orders
+
+
+def diff(orders, payments, local, local_successes):
+    """
+    Compare remote and local state; returns (mismatches, fixes).
+
+    ``fixes`` holds the bulk corrections: 'captured' and 'failed' rows in
+    the (payment_id, method, order_id) form Payment.apply_outcomes takes, and
+    'register' entries for paid orders that never got a registration. A
+    registration is only recreated when the order carries an email and a
+    phone number; otherwise the mismatch is reported with ``skipped`` set.
+    """
+    mismatches = {kind: [] for kind in MISMATCH_KINDS}
+    fixes = {'captured': [], 'failed': [], 'register': []}
+    captured_orders = set()
+
+    for order_id, order in orders.items():
+        order_payments = payments.get(order_id, [])
+        captured = [p for p in order_payments if p.get('status') == 'captured']
+        state = local.get(order_id) or {}
+        data = _registration_data(order, captured[0] if captured else {})
+        email = data['email']
+
+        if captured:
+            captured_orders.add(order_id)
+            payment = captured[0]
+            item = {'order_id': order_id, 'payment_id': payment['id'], 'email': email, 'amount': payment.get('amount')}
+
+            if len(captured) > 1:
+                mismatches[DUPLICATE_PAYMENT].append({**item, 'payment_ids': [p['id'] for p in captured]})
+
+            if state.get('payment_id'):
+                if state.get('payment_status') != 'success' or \
+                        (state.get('registration_id') and state.get('registration_status') != 'success'):
+                    mismatches[CAPTURED_PENDING].append(item)
+                    fixes['captured'].append((payment['id'], payment.get('method'), order_id))
+                if state.get('amount') is not None and int(state['amount']) != payment.get('amount'):
+                    mismatches[AMOUNT_MISMATCH].append({**item, 'local_amount': int(state['amount'])})
+            elif state.get('registration_id'):
+                # Registration without a payment row; recording the payment fixes both
+                mismatches[CAPTURED_PENDING].append(item)
+                _register(fixes, item, data, order, payment)
+            elif state.get('email_registration_status') == 'success':
+                # The email already has a paid registration under another order
+                mismatches[DUPLICATE_PAYMENT].append({
+                    **item, 'registered_order_id': state.get('email_registration_order_id')
+                })
+            else:
+                mismatches[PAID_NO_REGISTRATION].append(item)
+                _register(fixes, item, data, order, payment)
+
+        elif order_payments and all(p.get('status') == 'failed' for p in order_payments):
+            if state.get('registration_status') == 'pending' or state.get('payment_status') == 'pending':
+                payment = order_payments[0]
+                mismatches[FAILED_PENDING].append({'order_id': order_id, 'payment_id': payment['id'], 'email': email})
+                fixes['failed'].append((payment['id'], payment.get('method'), order_id))
+
+    for row in local_successes:
+        if row['order_id'] not in captured_orders:
+            mismatches[SUCCESS_NOT_CAPTURED].append(row)
+
+    return mismatches, fixes
+
+
+def _register(fixes, item, data, order, payment):
+    """Queue a registration rebuild, or mark the mismatch as needing a human"""
+    if data['email'] and data['phone']:
+        fixes['register'].append((order, payment))
+    else:
+        item['skipped'] = 'order notes have no email or phone'
+
+
+def reconcile(start, end, apply=False):
+    """
+    Reconcile the orders created between ``start`` and ``end``.
+
+    Returns a report dict. With ``apply`` the captured/failed corrections are
+    written with bulk updates and missing registrations are recreated from
+    the order notes.
+    
+    Local successes whose order is outside the remote window and had no
+    capture in it are looked up one by one, at most RECONCILE_MAX_LOOKUPS
+    per run; the rest are counted as ``unchecked``.
+    """
+    config = current_app.config
+    client = get_razorpay_client()
+
+    orders, payments, captured_orders = fetch_remote(client, start, end, config['RECONCILE_PAGE_SIZE'])
+    local = Payment.get_local_state([
+        (order_id, _registration_data(order, (payments.get(order_id) or [{}])[0])['email'])
+        for order_id, order in orders.items()
+    ])
+
+    successes = Payment.get_successful_orders(start, end)
+    # The one-by-one lookups below are remote calls; do not hold a pooled
+    # connection idle through them
+    close_db_connection()
+
+    local_successes = []
+    lookups = unchecked = 0
+    for row in successes:
+        if row['order_id'] in orders:
+            local_successes.append(row)
+            continue
+        if row['order_id'] in captured_orders:
+            continue
+        if lookups >= config['RECONCILE_MAX_LOOKUPS']:
+            unchecked += 1
+            continue
+        # Paid locally but outside the remote window; ask for the order itself
+        lookups += 1
+        try:
+            order = client.fetch_order(row['order_id'])
+        except RazorpayError as e:
+            if e.status != 400:
+                raise
+            order = {}
+        if order.get('status') != 'paid':
+            local_successes.append(row)
+
+    mismatches, fixes = diff(orders, payments, local, local_successes)
+
+    fixed = {CAPTURED_PENDING: 0, PAID_NO_REGISTRATION: 0, FAILED_PENDING: 0}
+    if apply:
+        if fixes['captured'] or fixes['failed']:
+            Payment.apply_outcomes(fixes['captured'], fixes['failed'])
+            fixed[CAPTURED_PENDING] = len(fixes['captured'])
+            fixed[FAILED_PENDING] = len(fixes['failed'])
+        for order, payment in fixes['register']:
+            result = Payment.record_verified(
+                _registration_data(order, payment),
+                order['id'],
+                payment['id'],
+                None,
+                payment.get('amount')
+            )
+            fixed[PAID_NO_REGISTRATION if result['registration_created'] else CAPTURED_PENDING] += 1
+
+    return {
+        'window': {'from': start.isoformat(), 'to': end.isoformat()},
+        'remote': {'orders': len(orders), 'payments': sum(len(p) for p in payments.values())},
+        'applied': apply,
+        'counts': {kind: len(items) for kind, items in mismatches.items()},
+        'fixed': fixed,
+        'skipped': sum(1 for items in mismatches.values() for item in items if item.get('skipped')),
+        'unchecked': unchecked,
+        'mismatches': mismatches,
+    }
+
+
+class ReconcileWorker(BackgroundWorker):
+    """
+    Reconciles the last RECONCILE_WINDOW_HOURS every RECONCILE_INTERVAL seconds.
+
+    Every process runs one of these. A run holds the ``reconcile`` lease for
+    up to RECONCILE_LEASE_SECONDS and releases it when done; a successful
+    run also takes the cooldown lease for a full interval, so only one
+    worker does the work each time round and a failed run is retried by
+    whichever worker comes next.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, 'reconcile', app.config['RECONCILE_INTERVAL'])
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def run_once(self):
+        config = current_app.config
+        if not JobLease.acquire(LEASE_NAME, self.owner, config['RECONCILE_LEASE_SECONDS']):
+            return False
+        try:
+            # Checked under the run lease, which the last run released only
+            # after taking the cooldown
+            if JobLease.is_held(COOLDOWN_LEASE_NAME):
+                return False
+            # The lease checks bound a pooled connection; give it back
+            # while Razorpay is paged through
+            close_db_connection()
+
+            end = datetime.now()
+            start = end - timedelta(hours=config['RECONCILE_WINDOW_HOURS'])
+            report = reconcile(start, end, apply=True)
+            JobLease.acquire(COOLDOWN_LEASE_NAME, self.owner, int(self.interval))
+        finally:
+            JobLease.release(LEASE_NAME, self.owner)
+
+        found = {kind: count for kind, count in report['counts'].items() if count}
+        logger.info('Reconciliation %s - %s: %s orders, mismatches %s, fixed %s, skipped %s, unchecked %s',
+                    report['window']['from'], report['window']['to'], report['remote']['orders'],
+                    found or 'none', report['fixed'], report['skipped'], report['unchecked'])
+        if report['skipped'] or report['unchecked']:
+            logger.warning('Reconciliation left %s mismatches for a human and %s local successes unchecked; '
+                           'run reconcile.py for details', report['skipped'], report['unchecked'])
+        return False
+
+
+def ensure_reconcile_worker(app):
+    """Start this process's scheduled reconciliation, unless it is disabled"""
+    if not app.config['RECONCILE_INTERVAL']:
+        return []
+    return start_workers(app, 'reconcile_workers', lambda: [ReconcileWorker(app)])
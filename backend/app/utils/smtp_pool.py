@@ -0,0 +1,293 @@
+"""
+Pool of authenticated SMTP sessions to Amazon SES
+"""
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from flask import current_app
+from app.utils.metrics import observe
+
+# Replies that mean "this session is done, try again on a new one"
+RETRYABLE_SMTP_CODES = {421, 451}
+
+_pool_lock = threading.Lock()
+
+
+def _retryable(error):
+    """
+    Whether a failed send is worth one more try on a fresh session: a
+    dropped connection, a socket error or timeout, or a 421/451 reply.
+    smtplib's own errors subclass OSError, so they are sorted out first;
+    refused recipients and other permanent replies fail straight away.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in RETRYABLE_SMTP_CODES
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SMTPPoolTimeout(Exception):
+    """Raised when no SMTP session becomes available in time"""
+
+
+class SMTPSession:
+    """An authenticated SMTP connection plus its usage counters"""
+
+    __slots__ = ('server', 'created_at', 'last_used', 'messages')
+
+    def __init__(self, server):
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages = 0
+
+
+class SMTPSessionPool:
+    """
+    Thread-safe pool of logged-in SMTP sessions.
+
+    Each session pays EHLO, STARTTLS and AUTH once and is then reused until it
+    is older than ``max_age`` seconds or has sent ``max_messages`` messages.
+    Idle sessions are kept warm with NOOP every ``noop_interval`` seconds, and
+    a send that fails with a disconnect or a 421/451 reply is retried once on
+    a fresh session.
+    """
+
+    def __init__(self, host, port, username, password, size=3, timeout=30,
+                 max_age=300, max_messages=100, noop_interval=15, starttls=True):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_messages = max_messages
+        self.noop_interval = noop_interval
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._total = 0
+        self._available = threading.Condition(threading.Lock())
+        self._counters = {
+            'connects': 0,
+            'connect_errors': 0,
+            'messages': 0,
+            'send_errors': 0,
+            'retries': 0,
+            'noops': 0,
+            'expired': 0,
+            'discarded': 0,
+        }
+
+        if noop_interval:
+            threading.Thread(target=self._keepalive_loop, name='smtp-keepalive', daemon=True).start()
+
+    def send_message(self, msg):
+        """Send an email.message.Message over a pooled session"""
+        self._send(lambda server: server.send_message(msg))
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """Send a pre-rendered raw message (bytes with CRLF line endings)"""
+        self._send(lambda server: server.sendmail(from_addr, to_addrs, message))
+
+    def _send(self, deliver):
+        for attempt in range(2):
+            session = self.acquire()
+            started = time.perf_counter()
+            try:
+                deliver(session.server)
+            except OSError as e:
+                observe('smtp_send_duration_seconds', time.perf_counter() - started, outcome='error')
+                self.release(session, discard=True)
+                if attempt or not _retryable(e):
+                    self._count('send_errors')
+                    raise
+                self._count('retries')
+                continue
+            except Exception:
+                observe('smtp_send_duration_seconds', time.perf_counter() - started, outcome='error')
+                self.release(session, discard=True)
+                self._count('send_errors')
+                raise
+
+            observe('smtp_send_duration_seconds', time.perf_counter() - started, outcome='ok')
+            session.messages += 1
+            self._count('messages')
+            self.release(session)
+            return
+
+    def acquire(self):
+        """Check out a session, logging in a new one if there is room"""
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while True:
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    session = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SMTPPoolTimeout(f'No SMTP session available after {self.timeout}s')
+                self._available.wait(remaining)
+
+        if session is not None and not self._check(session):
+            self._close(session)
+            session = None
+
+        if session is None:
+            try:
+                session = SMTPSession(self._connect())
+            except Exception:
+                with self._available:
+                    self._total -= 1
+                    self._counters['connect_errors'] += 1
+                    self._available.notify()
+                raise
+            self._count('connects')
+
+        return session
+
+    def release(self, session, discard=False):
+        """Return a session to the pool, or close it if it is spent or broken"""
+        if os.getpid() != self.pid:
+            return
+        if discard or self._expired(session):
+            self._count('discarded' if discard else 'expired')
+            self._close(session)
+            return
+        session.last_used = time.monotonic()
+        with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    def _connect(self):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                server.ehlo()
+                if self.starttls:
+                    server.starttls()
+                    server.ehlo()
+                server.login(self.username, self.password)
+            except Exception:
+                server.close()
+                raise
+            outcome = 'ok'
+            return server
+        finally:
+            observe('smtp_connect_duration_seconds', time.perf_counter() - started, outcome=outcome)
+
+    def _expired(self, session):
+        return (
+            time.monotonic() - session.created_at > self.max_age
+            or session.messages >= self.max_messages
+        )
+
+    def _check(self, session):
+        """Decide whether an idle session can be handed out again"""
+        if self._expired(session):
+            self._count('expired')
+            return False
+        if time.monotonic() - session.last_used < self.noop_interval:
+            return True
+        return self._noop(session)
+
+    def _noop(self, session):
+        self._count('noops')
+        try:
+            code, _ = session.server.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        if code != 250:
+            return False
+        session.last_used = time.monotonic()
+        return True
+
+    def _close(self, session):
+        try:
+            session.server.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                session.server.close()
+            except OSError:
+                pass
+        with self._available:
+            self._total -= 1
+            self._available.notify()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(self.noop_interval)
+            if os.getpid() != self.pid:
+                return
+            self.keepalive()
+
+    def keepalive(self):
+        """NOOP idle sessions that are due, closing the ones that are spent or dead"""
+        now = time.monotonic()
+        with self._available:
+            due = [s for s in self._idle if now - s.last_used >= self.noop_interval]
+            for session in due:
+                self._idle.remove(session)
+            # Keep the slots reserved while we talk to the server
+        for session in due:
+            if not self._expired(session) and self._noop(session):
+                with self._available:
+                    self._idle.appendleft(session)
+                    self._available.notify()
+            else:
+                self._close(session)
+
+    def _count(self, name):
+        with self._available:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._available:
+            idle = len(self._idle)
+            return {
+                'size': self.size,
+                'open': self._total,
+                'idle': idle,
+                'in_use': self._total - idle,
+                **self._counters,
+            }
+
+
+def get_smtp_pool():
+    """Return this process's SMTP session pool, creating it on first use"""
+    app = current_app._get_current_object()
+    pool = app.extensions.get('smtp_pool')
+
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = app.extensions.get('smtp_pool')
+            if pool is None or pool.pid != os.getpid():
+                config = app.config
+                pool = SMTPSessionPool(
+                    config['SMTP_HOST'],
+                    config['SMTP_PORT'],
+                    config['SMTP_USERNAME'],
+                    config['SMTP_PASSWORD'],
+                    size=config['SMTP_POOL_SIZE'],
+                    timeout=config['SMTP_TIMEOUT'],
+                    max_age=config['SMTP_SESSION_MAX_AGE'],
+                    max_messages=config['SMTP_SESSION_MAX_MESSAGES'],
+                    noop_interval=config['SMTP_NOOP_INTERVAL'],
+                    starttls=config['SMTP_STARTTLS'],
+                )
+                app.extensions['smtp_pool'] = pool
+    return pool
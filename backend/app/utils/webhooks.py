@@ -0,0 +1,125 @@
+"""
+Asynchronous processing of Razorpay webhooks
+
+The webhook route only verifies the signature, stores the raw event in
+``webhook_events`` (deduplicated by Razorpay's event id) and acknowledges.
+Worker threads apply the stored events to ``payments`` and ``registrations``
+in batches.
+"""
+import hashlib
+import json
+import logging
+from flask import current_app
+from app.models import WebhookEvent
+from app.utils.background import BackgroundWorker, start_workers
+
+logger = logging.getLogger(__name__)
+
+CAPTURED_EVENTS = {'payment.captured', 'order.paid'}
+FAILED_EVENTS = {'payment.failed'}
+
+
+def event_id_for(header_value, body):
+    """Razorpay's X-Razorpay-Event-Id, or a hash of the body if it is missing"""
+    if header_value:
+        return header_value
+    return 'sha256:' + hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def record_webhook(event_id, event, body):
+    """Persist an event and wake this process's workers; returns True if new"""
+    _, created = WebhookEvent.record(event_id, event, body)
+    if created:
+        for worker in ensure_webhook_workers(current_app._get_current_object()):
+            worker.wake()
+    return created
+
+
+def payment_outcome(event, payload):
+    """
+    Map a webhook to ('captured' | 'failed', (payment_id, method, order_id)),
+    or None for events that do not change a payment.
+    """
+    if event not in CAPTURED_EVENTS and event not in FAILED_EVENTS:
+        return None
+    payment = (payload.get('payment') or {}).get('entity') or {}
+    order_id = payment.get('order_id') or ((payload.get('order') or {}).get('entity') or {}).get('id')
+    if not order_id:
+        return None
+    outcome = 'captured' if event in CAPTURED_EVENTS else 'failed'
+    return outcome, (payment.get('id'), payment.get('method'), order_id)
+
+
+class WebhookWorker(BackgroundWorker):
+    """
+    Claims stored webhook events and applies them in one transaction per
+    batch. If the batch fails, its events are applied one at a time so a
+    single bad event cannot hold back the others.
+    """
+
+    def __init__(self, app, name):
+        super().__init__(app, name, app.config['WEBHOOK_POLL_INTERVAL'])
+
+    def run_once(self):
+        config = current_app.config
+        events = WebhookEvent.claim(config['WEBHOOK_BATCH_SIZE'], config['WEBHOOK_LEASE_SECONDS'])
+        if not events:
+            return False
+
+        outcomes = {}
+        for event in events:
+            try:
+                body = json.loads(event['payload'])
+                outcomes[event['id']] = payment_outcome(event['event'], body.get('payload') or {})
+            except (ValueError, AttributeError) as e:
+                logger.warning('Webhook event %s: unreadable payload: %s', event['id'], e)
+                outcomes[event['id']] = None
+
+        try:
+            self.apply(events, outcomes)
+        except Exception as e:
+            if len(events) == 1:
+                logger.exception('Webhook event %s failed', events[0]['id'])
+                self.fail(events, e)
+                return False
+            logger.warning('Webhook batch of %s failed, applying its events one by one: %s', len(events), e)
+            for event in events:
+                try:
+                    self.apply([event], outcomes)
+                except Exception as error:
+                    logger.exception('Webhook event %s failed', event['id'])
+                    self.fail([event], error)
+
+        return len(events) == config['WEBHOOK_BATCH_SIZE']
+
+    def apply(self, events, outcomes):
+        applied = [
+            (event['id'],) + outcomes[event['id']]
+            for event in events if outcomes[event['id']] is not None
+        ]
+        ignored = [event['id'] for event in events if outcomes[event['id']] is None]
+
+        unmatched = WebhookEvent.apply_batch(applied, ignored)
+        for event_id, order_id in unmatched:
+            logger.warning('Webhook event %s: captured payment for unknown order %s, parked as unmatched',
+                           event_id, order_id)
+        logger.info('Webhooks: applied %s, ignored %s, unmatched %s',
+                    len(applied) - len(unmatched), len(ignored), len(unmatched))
+
+    def fail(self, events, error):
+        max_attempts = current_app.config['WEBHOOK_MAX_ATTEMPTS']
+        retry = [event['id'] for event in events if event['attempts'] < max_attempts]
+        give_up = [event['id'] for event in events if event['attempts'] >= max_attempts]
+        if retry:
+            WebhookEvent.mark_failed(retry, error)
+        if give_up:
+            WebhookEvent.mark_failed(give_up, error, give_up=True)
+
+
+def ensure_webhook_workers(app):
+    """Start this process's webhook workers if they are not running yet"""
+    return start_workers(
+        app,
+        'webhook_workers',
+        lambda: [WebhookWorker(app, f'webhooks-{i}') for i in range(app.config['WEBHOOK_WORKERS'])]
+    )
@@ -0,0 +1,40 @@
+"""
+Email rendering: the per-recipient work the outbox workers and broadcasts do
+"""
+import pytest
+from app.utils.email_service import TEMPLATES
+
+SENDER = 'info@theneedles.in'
+
+FIELDS = {
+    'otp': ({}, {'otp': '493817'}),
+    'confirmation': (
+        {'webinar_date': 'December 10, 2025', 'webinar_time': '9:00 AM - 12:00 PM IST'},
+        {'name': 'Priya Raman', 'payment_id': 'pay_Q1w2E3r4T5y6U7', 'order_id': 'order_Q1w2E3r4T5y6U7'},
+    ),
+    'webinar_link': (
+        {'zoom_link': 'https://zoom.us/j/81234567890?pwd=abcdef', 'webinar_date': 'December 10, 2025',
+         'webinar_time': '9:00 AM - 12:00 PM IST'},
+        {'name': 'Priya Raman'},
+    ),
+}
+
+
+@pytest.mark.parametrize('kind', sorted(TEMPLATES))
+def test_render_email(benchmark, kind):
+    static, fields = FIELDS[kind]
+    prepared = TEMPLATES[kind].prepare(SENDER, **static)
+
+    message = benchmark(prepared.render, 'priya.raman@example.com', **fields)
+
+    assert message.startswith(b'From: ')
+
+
+def test_render_webinar_link_batch_1000(benchmark):
+    static, _ = FIELDS['webinar_link']
+    prepared = TEMPLATES['webinar_link'].prepare(SENDER, **static)
+    recipients = [(f'participant{i}@example.com', {'name': f'Participant {i}'}) for i in range(1000)]
+
+    messages = benchmark(lambda: list(prepared.render_batch(recipients)))
+
+    assert len(messages) == 1000
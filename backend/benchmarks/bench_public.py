@@ -0,0 +1,23 @@
+"""
+Webinar date parsing behind /registration-status
+"""
+import pytest
+from app.routes.public import _registration_status
+
+# One date per accepted format, in the order they are tried, plus one that
+# matches none of them (the slowest path)
+DATES = {
+    'month-day-year': 'December 10, 2030',
+    'day-month-year': '10 December 2030',
+    'dd-mm-yyyy': '10-12-2030',
+    'iso': '2030-12-10',
+    'day-month-comma-year': '10 December, 2030',
+    'unparseable': 'TBA',
+}
+
+
+@pytest.mark.parametrize('case', DATES)
+def test_registration_status(benchmark, app, case):
+    status = benchmark(_registration_status, DATES[case])
+
+    assert status['registration_open']
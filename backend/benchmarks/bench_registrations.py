@@ -0,0 +1,49 @@
+"""
+Registration listing: mapping cursor rows to dicts and serializing them
+"""
+import pytest
+from flask import jsonify
+from app.models import Registration
+from conftest import registration_rows
+
+SIZES = [
+    10_000,
+    100_000,
+    pytest.param(1_000_000, marks=pytest.mark.large),
+]
+
+
+@pytest.fixture(scope='module')
+def rows_by_size():
+    cache = {}
+
+    def get(count):
+        if count not in cache:
+            cache.clear()
+            cache[count] = registration_rows(count)
+        return cache[count]
+    return get
+
+
+@pytest.mark.parametrize('count', SIZES)
+def test_list_page(benchmark, app, serve_rows, rows_by_size, count):
+    serve_rows(rows_by_size(count))
+
+    registrations, next_cursor = benchmark(Registration.list_page, limit=count)
+
+    assert len(registrations) == count
+    assert next_cursor is None
+
+
+@pytest.mark.parametrize('count', SIZES)
+def test_jsonify_registrations(benchmark, app, serve_rows, rows_by_size, count):
+    serve_rows(rows_by_size(count))
+    registrations, _ = Registration.list_page(limit=count)
+
+    response = benchmark(lambda: jsonify({
+        'success': True,
+        'count': len(registrations),
+        'registrations': registrations,
+    }))
+
+    assert response.status_code == 200
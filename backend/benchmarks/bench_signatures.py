@@ -0,0 +1,31 @@
+"""
+Razorpay checkout and webhook signature checks
+"""
+import hashlib
+import hmac
+import json
+import pytest
+from app.utils.payment_service import verify_razorpay_signature, verify_webhook_signature
+
+
+def sign(secret, body):
+    return hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def test_verify_razorpay_signature(benchmark, app):
+    order_id, payment_id = 'order_Q1w2E3r4T5y6U7', 'pay_Q1w2E3r4T5y6U7'
+    signature = sign(app.config['RAZORPAY_KEY_SECRET'], f'{order_id}|{payment_id}')
+
+    assert benchmark(verify_razorpay_signature, order_id, payment_id, signature)
+
+
+@pytest.mark.parametrize('size', [1_000, 50_000])
+def test_verify_webhook_signature(benchmark, app, size):
+    event = {
+        'event': 'payment.captured',
+        'payload': {'payment': {'entity': {'id': 'pay_Q1w2E3r4T5y6U7', 'notes': {'padding': 'x' * size}}}},
+    }
+    body = json.dumps(event)
+    signature = sign(app.config['RAZORPAY_WEBHOOK_SECRET'], body)
+
+    assert benchmark(verify_webhook_signature, body, signature)
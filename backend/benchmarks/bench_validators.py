@@ -0,0 +1,31 @@
+"""
+Input validation on /validate-contact and /send-otp
+"""
+import pytest
+from app.utils.validators import validate_email, validate_phone
+
+EMAILS = {
+    'valid': 'priya.raman+webinar@example.co.in',
+    'invalid': 'priya.raman@example',
+    'long': 'a' * 200 + '@' + 'b' * 200 + '.com',
+}
+
+PHONES = {
+    'plain': '9876543210',
+    'formatted': '+91 98765-43210',
+    'invalid': '12345',
+}
+
+
+@pytest.mark.parametrize('case', EMAILS)
+def test_validate_email(benchmark, case):
+    result = benchmark(validate_email, EMAILS[case])
+
+    assert result == (case != 'invalid')
+
+
+@pytest.mark.parametrize('case', PHONES)
+def test_validate_phone(benchmark, case):
+    result = benchmark(validate_phone, PHONES[case])
+
+    assert result == (case != 'invalid')
@@ -0,0 +1,140 @@
+"""
+Shared fixtures and per-benchmark budgets
+
+The benchmarks never talk to SQL Server, SES or Razorpay: the in-memory
+pyodbc stand-in from loadtest/ is installed before the app is imported, and
+the model benchmarks feed pre-built rows straight to the code under test.
+
+Every benchmark has a budget in budgets.json: the median time per call it may
+not exceed. ``--budget-scale 2`` loosens all budgets on a slower machine;
+``--record-budgets`` rewrites the budgets of the benchmarks that ran from
+this run's medians (times BUDGET_HEADROOM).
+"""
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'loadtest'))
+
+import memdb  # noqa: E402
+
+BUDGETS_PATH = os.path.join(BENCHMARKS_DIR, 'budgets.json')
+BUDGET_HEADROOM = 2.0
+
+memdb.install()
+os.environ.update({
+    'RAZORPAY_KEY_ID': 'rzp_test_benchmark',
+    'RAZORPAY_KEY_SECRET': 'benchmark_key_secret',
+    'RAZORPAY_WEBHOOK_SECRET': 'benchmark_webhook_secret',
+    'SMTP_USERNAME': 'benchmark',
+    'SMTP_PASSWORD': 'benchmark',
+    'METRICS_DIR': '',
+    'LOG_LEVEL': 'ERROR',
+})
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('budgets')
+    group.addoption('--budget-scale', type=float, default=1.0,
+                    help='multiply every budget by this factor (default: 1.0)')
+    group.addoption('--record-budgets', action='store_true',
+                    help=f'store median x {BUDGET_HEADROOM:g} of this run as the budgets in budgets.json')
+
+
+def _load_budgets():
+    if not os.path.exists(BUDGETS_PATH):
+        return {'unit': 'microseconds', 'headroom': BUDGET_HEADROOM, 'budgets': {}}
+    with open(BUDGETS_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def pytest_configure(config):
+    config._budgets = _load_budgets()
+    config._recorded_budgets = {}
+
+
+def pytest_sessionfinish(session):
+    recorded = session.config._recorded_budgets
+    if not recorded:
+        return
+    budgets = session.config._budgets
+    budgets['budgets'].update(recorded)
+    budgets['budgets'] = dict(sorted(budgets['budgets'].items()))
+    with open(BUDGETS_PATH, 'w', encoding='utf-8') as f:
+        json.dump(budgets, f, indent=2)
+        f.write('\n')
+
+
+@pytest.fixture(autouse=True)
+def within_budget(request, benchmark):
+    """Fail a benchmark whose median is over its recorded budget"""
+    yield
+    if benchmark.disabled or benchmark.stats is None:
+        return
+    median_us = benchmark.stats.stats.median * 1e6
+    name = request.node.name
+    config = request.config
+
+    if config.getoption('record_budgets'):
+        config._recorded_budgets[name] = round(median_us * BUDGET_HEADROOM, 2)
+        return
+
+    budget = config._budgets['budgets'].get(name)
+    if budget is None:
+        pytest.fail(f'{name} has no budget; record one with --record-budgets')
+    budget *= config.getoption('budget_scale')
+    if median_us > budget:
+        pytest.fail(f'{name}: median {median_us:.2f}us is over its budget of {budget:.2f}us')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        yield app
+
+
+def registration_rows(count):
+    """``count`` rows shaped like the registrations listing query returns them"""
+    created = datetime(2025, 11, 1, 9, 30)
+    return [
+        (i, f'Participant {i}', f'participant{i}@example.com', '9876543210', 'Chennai',
+         'Tamil Nadu', '', 'success', created + timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+class RowsCursor:
+    """Cursor that answers every query with the same pre-built rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, *params):
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.fixture
+def serve_rows(monkeypatch):
+    """Make the models' get_db_cursor yield a RowsCursor over the given rows"""
+    from app import models
+
+    def install(rows):
+        @contextmanager
+        def get_db_cursor():
+            yield RowsCursor(rows)
+
+        monkeypatch.setattr(models, 'get_db_cursor', get_db_cursor)
+    return install
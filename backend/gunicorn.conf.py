@@ -0,0 +1,92 @@
+"""
+Gunicorn settings for the backend
+
+    cd backend && gunicorn -c gunicorn.conf.py run:app
+
+The app is imported once in the master (preload_app) and forked into the
+workers, so a worker is serving within milliseconds of starting. Nothing
+at import time opens a database, SMTP or Razorpay connection; each worker
+creates its own pools on first use, and post_worker_init starts its
+background threads right away instead of on the first request.
+
+Every call the backend makes (pyodbc, smtplib, requests) blocks, so the
+worker class decides how many requests can wait on SQL Server, SES or
+Razorpay at the same time. ``GUNICORN_WORKER_CLASS`` picks one of:
+
+    gthread (default)  WEB_CONCURRENCY processes x GUNICORN_THREADS threads.
+                       pyodbc, smtplib and requests all release the GIL
+                       while they wait, so a slow Razorpay call holds one
+                       thread, not the worker.
+    gevent             GUNICORN_WORKER_CONNECTIONS greenlets per process;
+                       needs ``pip install gevent``. Sockets are patched to
+                       be cooperative and pyodbc calls run in the hub's
+                       threadpool (see app/utils/cooperative.py). The app
+                       is loaded after the patching, so preload is off.
+    sync               One request per process, as before.
+
+Defaults are sized from the CPUs this container may use (its cgroup quota,
+not the host's core count): CPUs + 1 processes (at least 2) and 16 threads
+per CPU (at most 64). Each process has its own DB_POOL_SIZE connections;
+threads beyond that wait up to DB_POOL_TIMEOUT for one, which keeps SQL
+Server's load bounded while the other requests keep running. A request
+holds its connection until it ends, except that /create-order gives it
+back before calling Razorpay. Raise DB_POOL_SIZE with GUNICORN_THREADS
+if requests start timing out on the pool (see app/config/config.py).
+"""
+import math
+import os
+
+from dotenv import load_dotenv
+
+# The app reads .env too; load it here so the checks below see the same settings
+load_dotenv()
+
+
+def available_cpus():
+    """CPUs this process may use: the cgroup v2 quota, else its affinity mask"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+cpus = available_cpus()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'sync':
+    workers = int(os.getenv('WEB_CONCURRENCY', 2 * cpus + 1))
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', max(2, cpus + 1)))
+# gunicorn turns sync into gthread whenever threads > 1
+threads = 1 if worker_class == 'sync' else int(os.getenv('GUNICORN_THREADS', min(64, 16 * cpus)))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# MemoryOTPStore keeps each OTP in the worker that sent it; with several
+# workers a verify request usually lands on one that has never seen the code
+if os.getenv('OTP_STORE') == 'memory' and workers > 1:
+    raise RuntimeError(
+        f'OTP_STORE=memory only works with a single worker, not {workers}; '
+        'set WEB_CONCURRENCY=1 or use OTP_STORE=sql or redis'
+    )
+
+# gevent has to patch the standard library before the app imports it
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True' and worker_class != 'gevent'
+
+# The app writes its own JSON access log line per request
+accesslog = None
+
+
+def post_worker_init(worker):
+    """Start the worker's log writer and background workers (after gevent's patching)"""
+    from app import init_worker
+    init_worker(worker.app.wsgi())
@@ -37,6 +37,12 @@ if __name__ == '__main__':
             print('  - registrations')
             print('  - otp_verification')
             print('  - payments')
+            print('  - email_outbox')
+            print('  - job_leases')
+            print('  - broadcast_jobs')
+            print('  - broadcast_deliveries')
+            print('  - order_cache')
+            print('  - webhook_events')
         except Exception as e:
             print(f'\n❌ Failed to initialize database: {e}')
             sys.exit(1)
@@ -0,0 +1,300 @@
+"""
+In-memory stand-in for the pyodbc driver
+
+Installed as ``sys.modules['pyodbc']`` before the app is imported, so the
+real connection pool, ``get_db_cursor`` and the models all run unchanged;
+only the statements themselves are answered from Python dicts. It knows the
+statements the registration funnel (including the SQL OTP store) and the
+email outbox send, recognised by a fragment of their SQL, and raises
+ProgrammingError for anything else so a changed query shows up instead of
+being silently ignored.
+
+``latency`` is slept on every execute to stand in for the network
+round-trip to SQL Server.
+"""
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+pooling = True
+
+
+class Database:
+    """Tables as dicts, guarded by one lock (statements are atomic)"""
+
+    def __init__(self, latency=0.0, settings=None):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.registrations = {}   # email -> row dict
+        self.payments = {}        # order id -> row dict
+        self.order_cache = {}     # cache key -> row dict
+        self.outbox = {}          # id -> row dict
+        self.outbox_keys = {}     # dedupe key -> id
+        self.otps = {}            # email -> row dict
+        self.settings = {key: (value, datetime.now()) for key, value in (settings or {}).items()}
+        self.connections = 0
+        self.statements = 0
+
+        # (SQL fragment, handler); the first match wins
+        self.routes = [
+            ('SELECT COUNT(*), MAX(updated_at) FROM settings', self.settings_version),
+            ('SELECT setting_key, value, updated_at FROM settings', self.settings_rows),
+            ('DELETE FROM otp_verification WHERE email = ?', self.otp_delete),
+            ('INSERT INTO otp_verification', self.otp_insert),
+            ('MERGE live AS target', self.otp_verify),
+            ('MERGE registrations', self.record_verified),
+            ('MERGE order_cache', self.order_store),
+            ('FROM order_cache', self.order_lookup),
+            ('FROM registrations', self.registration_by_email),
+            ('INSERT INTO email_outbox', self.outbox_enqueue),
+            ('FROM email_outbox WITH (ROWLOCK, UPDLOCK, READPAST)', self.outbox_claim),
+            ('SET locked_until = DATEADD', self.outbox_renew),
+            ("SET status = 'sent'", self.outbox_sent),
+            ('UPDATE email_outbox', self.outbox_failed),
+        ]
+
+    def execute(self, sql, params):
+        if self.latency:
+            time.sleep(self.latency)
+        if sql.strip() == 'SELECT 1':
+            return [(1,)]
+        for fragment, handler in self.routes:
+            if fragment in sql:
+                with self.lock:
+                    self.statements += 1
+                    return handler(*params)
+        first = next((line.strip() for line in sql.splitlines() if line.strip()), '')
+        raise ProgrammingError(f'memdb does not know this statement: {first[:80]}')
+
+    # -- handlers: each returns a list of row tuples --
+
+    def settings_version(self):
+        stamps = [updated for _, updated in self.settings.values()]
+        return [(len(self.settings), max(stamps) if stamps else None)]
+
+    def settings_rows(self):
+        return [(key, value, updated) for key, (value, updated) in self.settings.items()]
+
+    def registration_by_email(self, email):
+        row = self.registrations.get(email)
+        if row is None:
+            return []
+        return [(row['id'], row['full_name'], email, row['phone'], row['payment_status'],
+                 row['razorpay_order_id'], row['razorpay_payment_id'])]
+
+    def order_lookup(self, email, cache_key):
+        entry = self.order_cache.get(cache_key)
+        live = entry is not None and entry['expires_at'] > datetime.now()
+        return [(1 if email in self.registrations else 0, entry['order_json'] if live else None)]
+
+    def order_store(self, cache_key, order_id, order_json, ttl, email, amount, currency,
+                    _order_id, _order_json, _ttl, _cache_key):
+        entry = self.order_cache.get(cache_key)
+        if entry is None or entry['expires_at'] <= datetime.now():
+            self.order_cache[cache_key] = entry = {
+                'razorpay_order_id': order_id,
+                'order_json': order_json,
+                'expires_at': datetime.now() + timedelta(seconds=ttl),
+            }
+        return [(entry['order_json'],)]
+
+    def otp_delete(self, email):
+        self.otps.pop(email, None)
+        return []
+
+    def otp_insert(self, email, otp, expiry):
+        self.otps[email] = {'otp': otp, 'expiry': expiry, 'attempts': 0}
+        return []
+
+    def otp_verify(self, email, otp, max_attempts):
+        row = self.otps.get(email)
+        if row is None or row['expiry'] <= datetime.now():
+            return []
+        if row['attempts'] >= max_attempts or row['otp'] == otp:
+            del self.otps[email]
+            return [('DELETE', row['attempts'], 1 if row['otp'] == otp else 0)]
+        row['attempts'] += 1
+        return [('UPDATE', row['attempts'], 0)]
+
+    def record_verified(self, email, order_id, payment_id, full_name, phone, whatsapp, city, state,
+                        business_name, business_type, experience, *rest):
+        signature, amount = rest[4], rest[7]
+
+        registration = self.registrations.get(email)
+        registration_action = 'UPDATE' if registration else 'INSERT'
+        if registration is None:
+            registration = self.registrations[email] = {
+                'id': next(self.ids), 'full_name': full_name, 'phone': phone, 'city': city,
+            }
+        registration.update(payment_status='success', razorpay_order_id=order_id, razorpay_payment_id=payment_id)
+
+        payment = self.payments.get(order_id)
+        payment_action = 'UPDATE' if payment else 'INSERT'
+        if payment is None:
+            payment = self.payments[order_id] = {
+                'id': next(self.ids), 'registration_id': registration['id'], 'amount': amount,
+            }
+        payment.update(razorpay_payment_id=payment_id, razorpay_signature=signature, status='success')
+
+        for key in [k for k, v in self.order_cache.items() if v['razorpay_order_id'] == order_id]:
+            del self.order_cache[key]
+        return [(registration['id'], registration_action, payment['id'], payment_action)]
+
+    def outbox_enqueue(self, dedupe_key, _dedupe_key, kind, priority, recipient, payload, expires_in):
+        existing = self.outbox_keys.get(dedupe_key)
+        if existing is not None:
+            return [(existing, 0)]
+        message_id = next(self.ids)
+        self.outbox[message_id] = {
+            'id': message_id, 'kind': kind, 'priority': priority, 'recipient': recipient,
+            'payload': payload, 'status': 'pending', 'attempts': 0,
+            'next_attempt_at': datetime.now(), 'locked_until': None,
+            'expires_at': None if expires_in is None else datetime.now() + timedelta(seconds=expires_in),
+        }
+        self.outbox_keys[dedupe_key] = message_id
+        return [(message_id, 1)]
+
+    def outbox_claim(self, limit, max_priority, lease_seconds):
+        now = datetime.now()
+        for message in self.outbox.values():
+            if (message['expires_at'] is not None and message['expires_at'] < now
+                    and (message['status'] == 'pending'
+                         or (message['status'] == 'sending' and message['locked_until'] < now))):
+                message.update(status='expired', payload='{}', locked_until=None)
+        due = sorted(
+            (m for m in self.outbox.values()
+             if m['priority'] <= max_priority
+             and ((m['status'] == 'pending' and m['next_attempt_at'] <= now)
+                  or (m['status'] == 'sending' and m['locked_until'] < now))),
+            key=lambda m: (m['priority'], m['next_attempt_at'], m['id'])
+        )[:limit]
+        for message in due:
+            message.update(status='sending', attempts=message['attempts'] + 1,
+                           locked_until=now + timedelta(seconds=lease_seconds))
+        return [(m['id'], m['kind'], m['recipient'], m['payload'], m['attempts']) for m in due]
+
+    def outbox_renew(self, lease_seconds, *message_ids):
+        for message_id in message_ids:
+            message = self.outbox.get(message_id)
+            if message is not None and message['status'] == 'sending':
+                message['locked_until'] = datetime.now() + timedelta(seconds=lease_seconds)
+        return []
+
+    def outbox_sent(self, redact, message_id):
+        message = self.outbox.get(message_id)
+        if message is not None:
+            message.update(status='sent', locked_until=None)
+            if redact:
+                message['payload'] = '{}'
+        return []
+
+    def outbox_failed(self, status, retry_in, error, redact, message_id):
+        message = self.outbox.get(message_id)
+        if message is not None:
+            message.update(status=status, locked_until=None, last_error=error,
+                           next_attempt_at=datetime.now() + timedelta(seconds=retry_in))
+            if redact:
+                message['payload'] = '{}'
+        return []
+
+    def stats(self):
+        with self.lock:
+            return {
+                'connections': self.connections,
+                'statements': self.statements,
+                'registrations': len(self.registrations),
+                'payments': len(self.payments),
+                'otps': len(self.otps),
+                'outbox_pending': sum(1 for m in self.outbox.values() if m['status'] in ('pending', 'sending')),
+            }
+
+
+class Cursor:
+    def __init__(self, database):
+        self.database = database
+        self.rows = []
+        self.description = None
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = tuple(params[0])
+        self.rows = self.database.execute(sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        self.rows = []
+
+
+class Connection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return Cursor(self.database)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# The database every connect() attaches to; replaced by install()
+database = Database()
+
+
+def connect(connection_string, **kwargs):
+    with database.lock:
+        database.connections += 1
+    return Connection(database)
+
+
+def install(latency=0.0, settings=None):
+    """Make ``import pyodbc`` return this module, backed by a fresh Database"""
+    import sys
+    global database
+    database = Database(latency, settings)
+    sys.modules['pyodbc'] = sys.modules[__name__]
+    return database
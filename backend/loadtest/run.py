@@ -0,0 +1,374 @@
+"""
+Registration funnel load test
+Drives the real Flask app through the whole funnel with local stand-ins for
+SES (an SMTP sink), Razorpay (tools/fake_razorpay.py) and SQL Server (an
+in-memory pyodbc replacement), and reports throughput and p50/p95/p99 for
+every step.
+
+    python loadtest/run.py                                # default profile
+    python loadtest/run.py --users 500 --concurrency 50
+    python loadtest/run.py --db-latency-ms 5 --smtp-latency-ms 50 --profile slow-deps
+    python loadtest/run.py --save-baseline                # record in baselines.json
+    python loadtest/run.py --check --tolerance 0.25       # exit 1 on a regression
+    python loadtest/run.py --deployed                     # SQL OTP store, rate limits on
+
+Each virtual user goes registration-status -> validate-contact -> check-email
+-> send-otp -> (waits for the OTP email at the sink) -> verify-otp ->
+create-order -> (pays at the stub) -> verify-payment, with a fresh email.
+Everything runs in this process, so the numbers compare runs on the same
+machine with each other, not with production.
+
+By default OTPs are kept in memory and rate limiting is off, so the run
+measures the funnel itself. ``--deployed`` uses the settings a deployment
+runs with instead: OTPs in the SQL table and rate limits on, with each
+user arriving from its own address through one proxy hop.
+"""
+import argparse
+import email
+import hashlib
+import hmac
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.header import decode_header, make_header
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'tools'))
+sys.path.insert(0, LOADTEST_DIR)
+
+import requests
+from werkzeug.serving import make_server
+
+import fake_razorpay
+import memdb
+import smtp_sink
+
+BASELINES_PATH = os.path.join(LOADTEST_DIR, 'baselines.json')
+
+STEPS = [
+    'registration-status',
+    'validate-contact',
+    'check-email',
+    'send-otp',
+    'otp-delivery',
+    'verify-otp',
+    'create-order',
+    'verify-payment',
+]
+
+KEY_ID = 'rzp_test_loadtest'
+KEY_SECRET = 'loadtest_secret'
+OTP_PATTERN = re.compile(r'\b(\d{6})\b')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the registration funnel against local stand-ins')
+    parser.add_argument('--users', type=int, default=200, help='registrations to run (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=20, help='users in flight at once (default: 20)')
+    parser.add_argument('--db-latency-ms', type=float, default=1.0, help='delay per SQL statement (default: 1)')
+    parser.add_argument('--smtp-latency-ms', type=float, default=20.0, help='delay per delivered email (default: 20)')
+    parser.add_argument('--razorpay-latency-ms', type=float, default=30.0, help='delay per Razorpay call (default: 30)')
+    parser.add_argument('--deployed', action='store_true',
+                        help='use the SQL OTP store and rate limiting, as deployed (default: memory OTPs, no limits)')
+    parser.add_argument('--otp-timeout', type=float, default=30.0, help='seconds to wait for an OTP email')
+    parser.add_argument('--profile', default=None, help='baseline name (default: derived from the options)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run in baselines.json')
+    parser.add_argument('--check', action='store_true', help='compare with the stored baseline; exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before --check fails, as a fraction (default: 0.25)')
+    parser.add_argument('--slack-ms', type=float, default=10.0,
+                        help='latency increase always allowed, so jitter on fast steps does not fail --check (default: 10)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser.parse_args()
+
+
+def profile_name(args):
+    return args.profile or (
+        f'u{args.users}-c{args.concurrency}'
+        f'-db{args.db_latency_ms:g}-smtp{args.smtp_latency_ms:g}-rzp{args.razorpay_latency_ms:g}'
+        f"{'-deployed' if args.deployed else ''}"
+    )
+
+
+def start_backend(args):
+    """Start the stand-ins and the app; returns (base_url, razorpay_url, sink, database)"""
+    smtp_server, sink = smtp_sink.serve(latency=args.smtp_latency_ms / 1000)
+    razorpay_server, _ = fake_razorpay.serve(
+        port=0, key_id=KEY_ID, key_secret=KEY_SECRET, latency=args.razorpay_latency_ms / 1000
+    )
+    webinar_date = (datetime.now() + timedelta(days=30)).strftime('%B %d, %Y')
+    database = memdb.install(args.db_latency_ms / 1000, settings={
+        'webinar_date': webinar_date,
+        'webinar_time': '9:00 AM - 12:00 PM IST',
+        'webinar_title': 'The Needles Webinar',
+    })
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        'RAZORPAY_KEY_ID': KEY_ID,
+        'RAZORPAY_KEY_SECRET': KEY_SECRET,
+        'RAZORPAY_API_BASE': f'http://127.0.0.1:{razorpay_server.server_address[1]}/v1',
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp_server.server_address[1]),
+        'SMTP_STARTTLS': 'False',
+        'SMTP_USERNAME': 'loadtest',
+        'SMTP_PASSWORD': 'loadtest',
+        'OTP_STORE': 'sql' if args.deployed else 'memory',
+        'RATE_LIMIT_ENABLED': str(args.deployed),
+        'RATE_LIMIT_STORE': 'memory',
+        'RATE_LIMIT_PROXY_COUNT': '1',
+        'RECONCILE_INTERVAL': '0',
+        'OTP_PURGE_INTERVAL': '0',
+        'WEBHOOK_WORKERS': '0',
+        'METRICS_DIR': '',
+        'LOG_LEVEL': 'WARNING',
+    })
+    from app import create_app
+
+    app = create_app()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-app', daemon=True).start()
+    razorpay_url = f'http://127.0.0.1:{razorpay_server.server_address[1]}'
+    return f'http://127.0.0.1:{server.server_port}', razorpay_url, sink, database
+
+
+def read_otp(message):
+    """The code from the OTP email's subject line"""
+    subject = str(make_header(decode_header(email.message_from_bytes(message)['Subject'] or '')))
+    match = OTP_PATTERN.search(subject)
+    return match.group(1) if match else None
+
+
+class Funnel:
+    """One virtual user's walk through the registration funnel"""
+
+    def __init__(self, base_url, razorpay_url, sink, otp_timeout):
+        self.base_url = base_url
+        self.razorpay_url = razorpay_url
+        self.sink = sink
+        self.otp_timeout = otp_timeout
+        self.local = threading.local()
+        self.shed = 0
+        self.shed_lock = threading.Lock()
+
+    @property
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def call(self, timings, step, method, path, expect=200, retries=3, **kwargs):
+        started = time.perf_counter()
+        while True:
+            response = self.session.request(method, self.base_url + path, timeout=30,
+                                            headers=self.local.headers, **kwargs)
+            # A shed request (503) is tried again after Retry-After, as a
+            # user would; the wait counts towards the step
+            if response.status_code != 503 or not retries:
+                break
+            with self.shed_lock:
+                self.shed += 1
+            retries -= 1
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        timings[step] = time.perf_counter() - started
+        if response.status_code != expect:
+            raise RuntimeError(f'{step}: HTTP {response.status_code} {response.text[:200]}')
+        return response.json()
+
+    def run(self, index):
+        """Returns ({step: seconds}, error or None)"""
+        timings = {}
+        address = f'loadtest-{index}-{uuid.uuid4().hex[:8]}@example.com'
+        phone = f'9{index:09d}'[-10:]
+        # As seen through the proxy: every user has its own address
+        self.local.headers = {'X-Forwarded-For': f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}'}
+        user = {
+            'firstName': 'Load', 'lastName': f'Test {index}', 'email': address,
+            'phone': phone, 'whatsapp': phone, 'city': 'Chennai',
+            'category': 'Boutique', 'experience': 'Beginner', 'amount': 100,
+        }
+        try:
+            status = self.call(timings, 'registration-status', 'GET', '/registration-status')
+            if not status.get('registration_open'):
+                raise RuntimeError('registration-status: registrations are closed')
+            self.call(timings, 'validate-contact', 'POST', '/validate-contact',
+                      json={'email': address, 'phone': phone, 'whatsapp': phone})
+            if self.call(timings, 'check-email', 'POST', '/check-email', json={'email': address})['exists']:
+                raise RuntimeError('check-email: fresh address reported as registered')
+
+            self.call(timings, 'send-otp', 'POST', '/send-otp', json={'email': address})
+            started = time.perf_counter()
+            message = self.sink.wait_for(address, timeout=self.otp_timeout)
+            timings['otp-delivery'] = time.perf_counter() - started
+            otp = read_otp(message) if message else None
+            if otp is None:
+                raise RuntimeError('otp-delivery: no OTP email arrived')
+            self.call(timings, 'verify-otp', 'POST', '/verify-otp', json={'email': address, 'otp': otp})
+
+            # The body createRazorpayOrder() in frontend/register.html sends
+            order = self.call(timings, 'create-order', 'POST', '/create-order', json={
+                'amount': 100, 'currency': 'INR', 'receipt': f'webinar_{index}',
+                'notes': {
+                    'webinar': 'Fashion Business Webinar - 10th December 2025',
+                    'event_type': 'webinar_registration',
+                    'customer_name': f"{user['firstName']} {user['lastName']}",
+                    'customer_email': address,
+                    'customer_phone': phone,
+                },
+            })
+            payment = self.session.post(f"{self.razorpay_url}/_fake/orders/{order['id']}/pay",
+                                        json={'status': 'captured'}, auth=(KEY_ID, KEY_SECRET), timeout=30)
+            payment.raise_for_status()
+            payment_id = payment.json()['id']
+            signature = hmac.new(KEY_SECRET.encode('utf-8'), f"{order['id']}|{payment_id}".encode('utf-8'),
+                                 hashlib.sha256).hexdigest()
+            self.call(timings, 'verify-payment', 'POST', '/verify-payment', json={
+                'razorpay_order_id': order['id'],
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+                'userData': user,
+            })
+        except Exception as e:
+            return timings, str(e)
+        return timings, None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, elapsed):
+    steps = {}
+    for step in STEPS:
+        values = sorted(timings[step] for timings, _ in results if step in timings)
+        if not values:
+            continue
+        steps[step] = {
+            'count': len(values),
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+        }
+    errors = [error for _, error in results if error]
+    return {
+        'users': len(results),
+        'completed': len(results) - len(errors),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'elapsed_s': round(elapsed, 2),
+        'registrations_per_s': round((len(results) - len(errors)) / elapsed, 1),
+        'steps': steps,
+    }
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(name, report):
+    baselines = load_baselines()
+    baselines[name] = {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'registrations_per_s': report['registrations_per_s'],
+        'steps': report['steps'],
+    }
+    with open(BASELINES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(report, baseline, tolerance, slack_ms):
+    """Regressions against ``baseline`` as human-readable strings"""
+    regressions = []
+    if report['errors']:
+        regressions.append(f"{report['errors']} of {report['users']} registrations failed")
+    floor = baseline['registrations_per_s'] * (1 - tolerance)
+    if report['registrations_per_s'] < floor:
+        regressions.append(
+            f"throughput {report['registrations_per_s']}/s is below {floor:.1f}/s "
+            f"(baseline {baseline['registrations_per_s']}/s)"
+        )
+    for step, before in baseline['steps'].items():
+        now = report['steps'].get(step)
+        if now is None:
+            regressions.append(f'{step}: no successful requests')
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            ceiling = before[key] * (1 + tolerance) + slack_ms
+            if now[key] > ceiling:
+                regressions.append(f'{step} {key[:-3]} {now[key]}ms is above {ceiling:.1f}ms (baseline {before[key]}ms)')
+    return regressions
+
+
+def print_report(name, report, stand_ins):
+    print(f"Profile {name}: {report['completed']}/{report['users']} registrations in {report['elapsed_s']}s "
+          f"({report['registrations_per_s']}/s)")
+    print(f"{'step':<22}{'count':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for step, row in report['steps'].items():
+        print(f"{step:<22}{row['count']:>7}{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+    if report['shed_retries']:
+        print(f"  {report['shed_retries']} requests shed with 503 and retried")
+    for error in report['error_samples']:
+        print(f'  error: {error}')
+    print(f"stand-ins: {json.dumps(stand_ins)}")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    name = profile_name(args)
+
+    base_url, razorpay_url, sink, database = start_backend(args)
+    funnel = Funnel(base_url, razorpay_url, sink, args.otp_timeout)
+
+    # One throwaway registration so imports, pools and the settings cache are warm
+    _, error = funnel.run(args.users)
+    if error:
+        sys.exit(f'Warm-up registration failed: {error}')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(funnel.run, range(args.users)))
+    report = summarize(results, time.perf_counter() - started)
+    report['shed_retries'] = funnel.shed
+    stand_ins = {'smtp': sink.stats(), 'db': database.stats()}
+
+    if args.json:
+        print(json.dumps({'profile': name, **report, 'stand_ins': stand_ins}, indent=2))
+    else:
+        print_report(name, report, stand_ins)
+
+    if args.save_baseline:
+        if report['errors']:
+            sys.exit('Not saving a baseline from a run with errors')
+        save_baseline(name, report)
+        print(f'Baseline {name} saved to {BASELINES_PATH}')
+
+    if args.check:
+        baseline = load_baselines().get(name)
+        if baseline is None:
+            sys.exit(f'No baseline named {name}; record one with --save-baseline')
+        regressions = compare(report, baseline, args.tolerance, args.slack_ms)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        sys.exit(1 if regressions else 0)
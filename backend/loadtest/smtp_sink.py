@@ -0,0 +1,120 @@
+"""
+Local SMTP sink standing in for Amazon SES
+
+Speaks just enough SMTP for smtplib and the SMTP session pool: EHLO,
+AUTH PLAIN/LOGIN (any credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT.
+Messages are kept in a per-recipient inbox so a load test can wait for
+an OTP email and read the code out of it. ``latency`` delays every accepted
+message, roughly like SES's DATA round-trip.
+
+The backend must connect without STARTTLS (``SMTP_STARTTLS=False``).
+"""
+import socketserver
+import threading
+import time
+
+
+class SMTPSink:
+    """Counters and per-recipient inboxes shared by all connections"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.inboxes = {}
+        self.received = 0
+        self.sessions = 0
+        self.lock = threading.Lock()
+        self.arrived = threading.Condition(self.lock)
+
+    def deliver(self, sender, recipients, data):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.arrived:
+            self.received += 1
+            for recipient in recipients:
+                self.inboxes.setdefault(recipient.lower(), []).append(data)
+            self.arrived.notify_all()
+
+    def wait_for(self, recipient, count=1, timeout=10.0):
+        """Block until ``recipient`` has ``count`` messages; returns the newest or None"""
+        deadline = time.monotonic() + timeout
+        with self.arrived:
+            while True:
+                inbox = self.inboxes.get(recipient.lower(), [])
+                if len(inbox) >= count:
+                    return inbox[count - 1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.arrived.wait(remaining)
+
+    def stats(self):
+        with self.lock:
+            return {'messages': self.received, 'sessions': self.sessions}
+
+
+def make_handler(sink):
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            self.wfile.write(line.encode('ascii') + b'\r\n')
+
+        def handle(self):
+            with sink.lock:
+                sink.sessions += 1
+            self.reply('220 sink ESMTP ready')
+            sender, recipients = None, []
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+
+                if verb in ('EHLO', 'HELO'):
+                    self.wfile.write(b'250-sink\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 10485760\r\n')
+                elif verb == 'AUTH':
+                    parts = command.split()
+                    if len(parts) > 1 and parts[1].upper() == 'LOGIN':
+                        # Username and password prompts; both are accepted as-is
+                        if len(parts) == 2:
+                            self.reply('334 VXNlcm5hbWU6')
+                            self.rfile.readline()
+                        self.reply('334 UGFzc3dvcmQ6')
+                        self.rfile.readline()
+                    self.reply('235 Authentication successful')
+                elif verb == 'MAIL':
+                    sender, recipients = command[10:].strip(' <>'), []
+                    self.reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command[8:].strip(' <>'))
+                    self.reply('250 OK')
+                elif verb == 'DATA':
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                    chunks = []
+                    while True:
+                        chunk = self.rfile.readline()
+                        if not chunk or chunk == b'.\r\n':
+                            break
+                        chunks.append(chunk)
+                    sink.deliver(sender, recipients, b''.join(chunks))
+                    self.reply('250 OK queued')
+                elif verb == 'RSET':
+                    sender, recipients = None, []
+                    self.reply('250 OK')
+                elif verb == 'NOOP':
+                    self.reply('250 OK')
+                elif verb == 'QUIT':
+                    self.reply('221 Bye')
+                    return
+                else:
+                    self.reply('502 Command not implemented')
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=0, **options):
+    """Start the sink in a background thread; returns (server, sink)"""
+    sink = SMTPSink(**options)
+    server = socketserver.ThreadingTCPServer((host, port), make_handler(sink))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='smtp-sink', daemon=True).start()
+    return server, sink
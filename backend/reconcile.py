@@ -0,0 +1,64 @@
+"""
+Payment reconciliation against Razorpay
+Run this to list (and optionally fix) payments that disagree with Razorpay
+
+    python reconcile.py --hours 24            # report only
+    python reconcile.py --hours 24 --apply    # also apply the safe fixes
+    python reconcile.py --from 2025-12-01 --to 2025-12-03 --json
+"""
+import argparse
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.reconciliation import MISMATCH_KINDS, reconcile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Reconcile payments against Razorpay')
+    parser.add_argument('--hours', type=int, default=24, help='window ending now (default: 24)')
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, help='window start (ISO date/time)')
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, help='window end (ISO date/time)')
+    parser.add_argument('--apply', action='store_true', help='apply captured/failed fixes and recreate missing registrations')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    end = args.end or datetime.now()
+    start = args.start or end - timedelta(hours=args.hours)
+
+    app = create_app()
+
+    with app.app_context():
+        report = reconcile(start, end, apply=args.apply)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        sys.exit(0)
+
+    print('=== Payment Reconciliation ===\n')
+    print(f"Window:   {report['window']['from']} to {report['window']['to']}")
+    print(f"Razorpay: {report['remote']['orders']} orders, {report['remote']['payments']} payments\n")
+
+    for kind in MISMATCH_KINDS:
+        items = report['mismatches'][kind]
+        fixed = report['fixed'].get(kind)
+        suffix = f' ({fixed} fixed)' if fixed else ''
+        print(f'{kind}: {len(items)}{suffix}')
+        for item in items:
+            skipped = f"  (not fixed: {item['skipped']})" if item.get('skipped') else ''
+            print(f"  - order {item.get('order_id')}  payment {item.get('payment_id', '-')}  {item.get('email') or ''}{skipped}")
+
+    if report['unchecked']:
+        print(f"\n{report['unchecked']} local successes outside the window were not checked "
+              f"(raise RECONCILE_MAX_LOOKUPS to check more per run).")
+
+    if not args.apply and any(report['counts'][kind] for kind in report['fixed']):
+        print('\nRun again with --apply to fix the first three kinds.')
@@ -0,0 +1,83 @@
+"""
+/create-order with the payload the real checkout (frontend/register.html) sends
+
+Runs against the in-memory pyodbc stand-in from loadtest/; Razorpay's order
+API is replaced by a counter so the test can see how often it was called.
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'loadtest'))
+
+import memdb  # noqa: E402
+
+memdb.install()
+os.environ.update({
+    'RAZORPAY_KEY_ID': 'rzp_test_checkout',
+    'RAZORPAY_KEY_SECRET': 'checkout_key_secret',
+    'SMTP_USERNAME': 'test',
+    'SMTP_PASSWORD': 'test',
+    'METRICS_DIR': '',
+    'LOG_LEVEL': 'ERROR',
+})
+
+
+def checkout_payload(email):
+    """The body createRazorpayOrder() in register.html posts"""
+    return {
+        'amount': 100,
+        'currency': 'INR',
+        'receipt': 'webinar_1733800000000',
+        'notes': {
+            'webinar': 'Fashion Business Webinar - 10th December 2025',
+            'event_type': 'webinar_registration',
+            'customer_name': 'Asha Kumar',
+            'customer_email': email,
+            'customer_phone': '9876543210',
+        },
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app import create_app
+    from app.routes import payment
+
+    created = []
+
+    def create_razorpay_order(amount, currency='INR', receipt=None, notes=None):
+        created.append(notes)
+        return {'id': f'order_test{len(created)}', 'amount': amount, 'currency': currency,
+                'receipt': receipt, 'notes': notes, 'status': 'created'}
+
+    monkeypatch.setattr(payment, 'create_razorpay_order', create_razorpay_order)
+    database = memdb.install()
+    app = create_app()
+    client = app.test_client()
+    client.database = database
+    client.created = created
+    return client
+
+
+def test_checkout_payload_reuses_the_pending_order(client):
+    first = client.post('/create-order', json=checkout_payload('asha@example.com'))
+    second = client.post('/create-order', json=checkout_payload('asha@example.com'))
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.get_json()['id'] == first.get_json()['id']
+    assert len(client.created) == 1
+
+
+def test_checkout_payload_is_refused_for_a_registered_email(client):
+    client.database.registrations['taken@example.com'] = {'id': 1, 'full_name': 'Taken', 'phone': '9876543210'}
+
+    response = client.post('/create-order', json=checkout_payload('taken@example.com'))
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Email already registered'
+    assert client.created == []
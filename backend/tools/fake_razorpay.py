@@ -0,0 +1,204 @@
+"""
+Local stand-in for the Razorpay orders/payments API
+
+Run it and point the backend at it:
+
+    python tools/fake_razorpay.py --port 9010
+    RAZORPAY_API_BASE=http://127.0.0.1:9010/v1 python run.py
+
+Orders, payments and their paged listings (``from``/``to``/``count``/``skip``)
+are supported. ``POST /_fake/orders/<id>/pay`` with ``{"status": "captured"}``
+or ``"failed"`` simulates a checkout. ``--latency`` adds a delay to every
+response and ``--fail-rate`` makes a fraction of requests return 503, for
+exercising timeouts, retries and the circuit breaker. Requests must carry the Basic auth of ``--key-id`` /
+``--key-secret`` when those are given.
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeRazorpay:
+    """In-memory orders and payments"""
+
+    def __init__(self, key_id=None, key_secret=None, latency=0.0, fail_rate=0.0):
+        self.auth = None
+        if key_id:
+            token = base64.b64encode(f'{key_id}:{key_secret or ""}'.encode('utf-8')).decode('ascii')
+            self.auth = f'Basic {token}'
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.orders = {}
+        self.payments = {}
+        self.lock = threading.Lock()
+
+    def create_order(self, body):
+        amount = body.get('amount')
+        if not isinstance(amount, int) or amount < 100:
+            return 400, _error('BAD_REQUEST_ERROR', 'The amount must be atleast INR 1.00')
+        order = {
+            'id': f'order_{uuid.uuid4().hex[:14]}',
+            'entity': 'order',
+            'amount': amount,
+            'amount_paid': 0,
+            'amount_due': amount,
+            'currency': body.get('currency', 'INR'),
+            'receipt': body.get('receipt'),
+            'status': 'created',
+            'attempts': 0,
+            'notes': body.get('notes') or {},
+            'created_at': int(time.time()),
+        }
+        with self.lock:
+            self.orders[order['id']] = order
+        return 200, order
+
+    def get(self, collection, entity_id, label):
+        with self.lock:
+            entity = collection.get(entity_id)
+        if entity is None:
+            return 400, _error('BAD_REQUEST_ERROR', f'The id provided does not exist ({label})')
+        return 200, entity
+
+    def list(self, collection, query):
+        """Paged listing with Razorpay's from/to/count/skip parameters"""
+        def number(name, default):
+            try:
+                return int(query.get(name, [default])[0])
+            except ValueError:
+                return default
+
+        start, end = number('from', 0), number('to', 2 ** 31)
+        count, skip = min(number('count', 10), 100), number('skip', 0)
+        with self.lock:
+            items = [e for e in collection.values() if start <= e['created_at'] <= end]
+        # Newest first, like the real API
+        items.sort(key=lambda e: e['created_at'], reverse=True)
+        page = items[skip:skip + count]
+        return 200, {'entity': 'collection', 'count': len(page), 'items': page}
+
+    def pay(self, order_id, status='captured'):
+        """Simulate a payment against an order (used by local scripts)"""
+        with self.lock:
+            order = self.orders[order_id]
+            payment = {
+                'id': f'pay_{uuid.uuid4().hex[:14]}',
+                'entity': 'payment',
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': status,
+                'order_id': order_id,
+                'method': 'upi',
+                'email': order['notes'].get('customer_email') or order['notes'].get('email'),
+                'contact': order['notes'].get('customer_phone'),
+                'notes': {},
+                'created_at': int(time.time()),
+            }
+            self.payments[payment['id']] = payment
+            if status == 'captured':
+                order.update(status='paid', amount_paid=order['amount'], amount_due=0)
+            order['attempts'] += 1
+        return payment
+
+
+def _error(code, description):
+    return {'error': {'code': code, 'description': description}}
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+
+            if api.latency:
+                time.sleep(api.latency)
+            if api.fail_rate and random.random() < api.fail_rate:
+                return self._reply(503, _error('SERVER_ERROR', 'Service unavailable'))
+            if api.auth and self.headers.get('Authorization') != api.auth:
+                return self._reply(401, _error('BAD_REQUEST_ERROR', 'Authentication failed'))
+
+            path, _, query = self.path.partition('?')
+            parts = path.strip('/').split('/')
+            if method == 'POST' and len(parts) == 4 and parts[:2] == ['_fake', 'orders'] and parts[3] == 'pay':
+                if parts[2] not in api.orders:
+                    return self._reply(400, _error('BAD_REQUEST_ERROR', 'The id provided does not exist (order)'))
+                status = json.loads(raw or b'{}').get('status', 'captured')
+                return self._reply(200, api.pay(parts[2], status))
+            if parts[:1] != ['v1']:
+                return self._reply(404, _error('BAD_REQUEST_ERROR', 'The requested URL was not found on the server.'))
+            parts = parts[1:]
+
+            if method == 'POST' and parts == ['orders']:
+                try:
+                    body = json.loads(raw or b'{}')
+                except ValueError:
+                    return self._reply(400, _error('BAD_REQUEST_ERROR', 'Invalid JSON'))
+                return self._reply(*api.create_order(body))
+            if method == 'GET' and parts in (['orders'], ['payments']):
+                return self._reply(*api.list(getattr(api, parts[0]), parse_qs(query)))
+            if method == 'GET' and len(parts) == 2 and parts[0] == 'orders':
+                return self._reply(*api.get(api.orders, parts[1], 'order'))
+            if method == 'GET' and len(parts) == 2 and parts[0] == 'payments':
+                return self._reply(*api.get(api.payments, parts[1], 'payment'))
+            return self._reply(404, _error('BAD_REQUEST_ERROR', 'The requested URL was not found on the server.'))
+
+        def do_GET(self):
+            self._route('GET')
+
+        def do_POST(self):
+            self._route('POST')
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=9010, **options):
+    """Start the stub in a background thread; returns (server, api)"""
+    api = FakeRazorpay(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-razorpay', daemon=True).start()
+    return server, api
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Razorpay API stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9010)
+    parser.add_argument('--key-id')
+    parser.add_argument('--key-secret')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    api = FakeRazorpay(args.key_id, args.key_secret, args.latency, args.fail_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f'Fake Razorpay listening on http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()